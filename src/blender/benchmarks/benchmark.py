@@ -0,0 +1,381 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Measures the watchdog's save-to-FBX latency and the converter's throughput
+# using fake_blender.py instead of Blender, so it runs on any Linux machine.
+#
+# The watchdog benchmark starts blendyard_watchdog.py on a synthetic tree of
+# .blend files, saves them at random the way Blender does (writing file@ then
+# renaming it), optionally touches many files at once like a branch switch,
+# and reports:
+#   latency     time from a save until an export that started after it ended
+#   lost        saves that were never followed by an export
+#   duplicates  exports of content that had already been exported
+#
+# The convert benchmark runs blendtofbx.py --source-dir on a synthetic tree,
+# then runs it a second time when every file is up to date.
+#
+# Examples, run from the root of blendyard:
+#   python src/blender/benchmarks/benchmark.py watchdog --files 200 --duration 30 --rate 5 --burst 100
+#   python src/blender/benchmarks/benchmark.py convert --files 2000 --jobs 8 --batch-size 16
+#
+# Settings can be changed for a run with --set, the value is JSON:
+#   --set watchdog.export_workers=4 --set general.export_server=1
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCHMARK_FOLDER, "..", "..", ".."))
+FAKE_BLENDER = os.path.join(BENCHMARK_FOLDER, "fake_blender.py")
+WATCHDOG_SCRIPT = os.path.join(REPO_ROOT, "src", "blender", "watchdog", "blendyard_watchdog.py")
+CONVERTER_SCRIPT = os.path.join(REPO_ROOT, "src", "blender", "converters", "blendtofbx.py")
+
+sys.path.append(os.path.join(REPO_ROOT, "src", "blender", "utilities"))
+
+import blendyard_utilities
+
+# Writes a settings file using the fake Blender and the benchmark's folders,
+# overrides are "section.key=json value" strings
+def WriteSettings(workFolder, sourceFolder, targetFolder, overrides):
+
+    settings = blendyard_utilities.ReadSettings(None)
+
+    settings["general"]["blender_exe"] = FAKE_BLENDER
+    settings["general"]["trace_file"] = ""
+    settings["models"]["source_folder"] = sourceFolder
+    settings["models"]["target_folder"] = targetFolder
+    settings["watchdog"]["watched_folder"] = sourceFolder
+    settings["watchdog"]["verbose"] = 0
+
+    for override in overrides:
+        key, value = override.split("=", 1)
+        section, name = key.split(".", 1)
+        settings.setdefault(section, {})[name] = json.loads(value)
+
+    settingsFile = os.path.join(workFolder, "settings.json")
+    with open(settingsFile, "w") as write_file:
+        json.dump(settings, write_file, indent=4)
+
+    return settingsFile
+
+# Environment for the processes running the fake Blender
+def FakeBlenderEnvironment(args, logFile):
+
+    environment = dict(os.environ)
+    environment["BLENDYARD_FAKE_STARTUP"] = str(args.startup)
+    environment["BLENDYARD_FAKE_LOAD"] = str(args.load)
+    environment["BLENDYARD_FAKE_EXPORT"] = str(args.export)
+    environment["BLENDYARD_FAKE_LOG"] = logFile
+
+    return environment
+
+# Creates count .blend files spread over nested folders
+def CreateTree(sourceFolder, count, size):
+
+    files = []
+
+    for index in range(count):
+        folder = os.path.join(sourceFolder, "set%02d"%(index % 20), "group%02d"%((index // 20) % 10))
+        os.makedirs(folder, exist_ok=True)
+
+        filePath = os.path.join(folder, "asset%05d.blend"%index)
+        WriteBlend(filePath, 0, size)
+        files.append(filePath)
+
+    return files
+
+def WriteBlend(filePath, version, size):
+
+    content = ("BLENDER-v300 %s version %d\n"%(filePath, version)).encode("utf-8")
+
+    with open(filePath, "wb") as write_file:
+        write_file.write(content + b"\0" * max(0, size - len(content)))
+
+# Saves a file the way Blender does, writing file@ then renaming it
+def SaveBlend(filePath, version, size):
+
+    WriteBlend(filePath + "@", version, size)
+    os.replace(filePath + "@", filePath)
+
+    return time.time()
+
+def ReadExportLog(logFile):
+
+    exports = []
+
+    if os.path.exists(logFile):
+        with open(logFile, "r") as read_file:
+            for line in read_file:
+                if len(line.strip()) > 0:
+                    exports.append(json.loads(line))
+
+    return exports
+
+# Waits until no export has been logged for `quiet` seconds
+def WaitForQuiet(logFile, quiet, timeout):
+
+    deadline = time.time() + timeout
+    lastSize = -1
+    lastChange = time.time()
+
+    while time.time() < deadline:
+        size = os.path.getsize(logFile) if os.path.exists(logFile) else 0
+
+        if size != lastSize:
+            lastSize = size
+            lastChange = time.time()
+        elif time.time() - lastChange >= quiet:
+            return True
+
+        time.sleep(0.1)
+
+    return False
+
+def Percentiles(values):
+
+    if len(values) == 0:
+        return { "count": 0 }
+
+    values = sorted(values)
+
+    def percentile(fraction):
+        return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+    return {
+        "count": len(values),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": values[-1]
+    }
+
+# Matches saves with the exports that followed them
+def AnalyzeSaves(saves, exports):
+
+    exportsByFile = {}
+    for export in exports:
+        exportsByFile.setdefault(export["source"], []).append(export)
+
+    latencies = []
+    lost = []
+
+    for save in saves:
+        # An export reflects the save if it read the file after it was saved
+        following = [export["end"] for export in exportsByFile.get(save["source"], []) if export["start"] >= save["time"]]
+
+        if len(following) == 0:
+            lost.append(save["source"])
+        else:
+            latencies.append(min(following) - save["time"])
+
+    exported = {}
+    for export in exports:
+        key = (export["source"], export["version"])
+        exported[key] = exported.get(key, 0) + 1
+
+    duplicates = sum(count - 1 for count in exported.values())
+
+    return latencies, lost, duplicates
+
+def PrintResults(title, results):
+
+    print("--------------------------------------------------------")
+    print(title)
+    print("--------------------------------------------------------")
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print("%-22s %s"%(key, "  ".join("%s=%s"%(name, "%.3f"%number if isinstance(number, float) else number) for name, number in value.items())))
+        elif isinstance(value, float):
+            print("%-22s %.3f"%(key, value))
+        else:
+            print("%-22s %s"%(key, value))
+
+    print("")
+
+def RunWatchdogBenchmark(args, workFolder):
+
+    sourceFolder = os.path.join(workFolder, "source")
+    targetFolder = os.path.join(workFolder, "target")
+    logFile = os.path.join(workFolder, "exports.jsonl")
+
+    files = CreateTree(sourceFolder, args.files, args.size)
+    settingsFile = WriteSettings(workFolder, sourceFolder, targetFolder, args.set)
+
+    with open(os.path.join(workFolder, "watchdog.log"), "w") as watchdogLog:
+        watchdog = subprocess.Popen([sys.executable, "-u", WATCHDOG_SCRIPT, "--settings", settingsFile],
+                                    cwd=REPO_ROOT,
+                                    env=FakeBlenderEnvironment(args, logFile),
+                                    stdout=watchdogLog,
+                                    stderr=subprocess.STDOUT)
+
+        try:
+            # Let the watchdog start and finish anything it does on startup
+            time.sleep(args.warmup)
+            WaitForQuiet(logFile, 2.0, args.timeout)
+
+            stormStartTime = time.time()
+            warmupExports = len(ReadExportLog(logFile))
+
+            rng = random.Random(args.seed)
+            versions = dict.fromkeys(files, 0)
+            saves = []
+            burstDone = args.burst == 0
+
+            # Artists saving random files
+            while time.time() - stormStartTime < args.duration:
+                if not burstDone and time.time() - stormStartTime >= args.duration / 2:
+                    # A branch switch rewrites many files at once
+                    for filePath in rng.sample(files, min(args.burst, len(files))):
+                        versions[filePath] += 1
+                        saves.append({ "source": os.path.abspath(filePath), "time": SaveBlend(filePath, versions[filePath], args.size) })
+                    burstDone = True
+
+                filePath = rng.choice(files)
+                versions[filePath] += 1
+                saves.append({ "source": os.path.abspath(filePath), "time": SaveBlend(filePath, versions[filePath], args.size) })
+
+                time.sleep(rng.expovariate(args.rate))
+
+            stormEndTime = time.time()
+            WaitForQuiet(logFile, args.settle, args.timeout)
+        finally:
+            watchdog.send_signal(signal.SIGINT)
+            try:
+                watchdog.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                watchdog.kill()
+
+    exports = ReadExportLog(logFile)[warmupExports:]
+    latencies, lost, duplicates = AnalyzeSaves(saves, exports)
+
+    lastExportTime = max([export["end"] for export in exports], default=stormEndTime)
+
+    return {
+        "files": args.files,
+        "saves": len(saves),
+        "exports": len(exports),
+        "exports_per_minute": 60.0 * len(exports) / max(lastExportTime - stormStartTime, 0.001),
+        "latency": Percentiles(latencies),
+        "lost": len(lost),
+        "lost_files": len(set(lost)),
+        "duplicates": duplicates,
+        "drain_time": lastExportTime - stormEndTime
+    }
+
+def RunConvertBenchmark(args, workFolder):
+
+    sourceFolder = os.path.join(workFolder, "source")
+    targetFolder = os.path.join(workFolder, "target")
+    logFile = os.path.join(workFolder, "exports.jsonl")
+
+    files = CreateTree(sourceFolder, args.files, args.size)
+    settingsFile = WriteSettings(workFolder, sourceFolder, targetFolder, args.set)
+
+    commandLine = [sys.executable, CONVERTER_SCRIPT, "--settings", settingsFile, "--source-dir", sourceFolder,
+                   "--jobs", str(args.jobs), "--batch-size", str(args.batch_size)]
+
+    runs = []
+
+    for run in ["full", "up to date"]:
+        with open(os.path.join(workFolder, "convert_%d.log"%len(runs)), "w") as convertLog:
+            startTime = time.time()
+            process = subprocess.run(commandLine, cwd=REPO_ROOT, env=FakeBlenderEnvironment(args, logFile), stdout=convertLog, stderr=subprocess.STDOUT)
+            runs.append({ "name": run, "time": time.time() - startTime, "exit_code": process.returncode })
+
+    exports = ReadExportLog(logFile)
+
+    exported = {}
+    for export in exports:
+        exported[export["source"]] = exported.get(export["source"], 0) + 1
+
+    missing = [filePath for filePath in files if not os.path.exists(blendyard_utilities.TargetFileForSource(filePath, sourceFolder, targetFolder))]
+
+    return {
+        "files": args.files,
+        "jobs": args.jobs,
+        "batch_size": args.batch_size,
+        "full_time": runs[0]["time"],
+        "exports_per_minute": 60.0 * args.files / max(runs[0]["time"], 0.001),
+        "up_to_date_time": runs[1]["time"],
+        "exports": len(exports),
+        "duplicates": sum(count - 1 for count in exported.values()),
+        "lost": len(missing),
+        "exit_codes": [run["exit_code"] for run in runs]
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the watchdog and the converter with a fake Blender')
+    parser.add_argument('scenario', choices=['watchdog', 'convert'])
+    parser.add_argument('--files', help='number of .blend files to create', type=int, default=200)
+    parser.add_argument('--size', help='size of each .blend file in bytes', type=int, default=4096)
+    parser.add_argument('--startup', help='seconds the fake Blender takes to start', type=float, default=0.5)
+    parser.add_argument('--load', help='seconds the fake Blender takes to load a file', type=float, default=0.05)
+    parser.add_argument('--export', help='seconds the fake Blender takes to export a file', type=float, default=0.1)
+    parser.add_argument('--set', help='override a setting, e.g. watchdog.export_workers=4', action='append', default=[])
+    parser.add_argument('--duration', help='watchdog: seconds to keep saving files', type=float, default=20)
+    parser.add_argument('--rate', help='watchdog: average number of saves per second', type=float, default=2)
+    parser.add_argument('--burst', help='watchdog: number of files touched at once halfway through', type=int, default=0)
+    parser.add_argument('--warmup', help='watchdog: seconds to wait for the watchdog to start', type=float, default=3)
+    parser.add_argument('--settle', help='watchdog: seconds without exports before the run is over', type=float, default=5)
+    parser.add_argument('--timeout', help='watchdog: maximum seconds to wait for exports', type=float, default=600)
+    parser.add_argument('--seed', help='watchdog: random seed for the saves', type=int, default=1)
+    parser.add_argument('--jobs', help='convert: value of --jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', help='convert: value of --batch-size', type=int, default=1)
+    parser.add_argument('--json', help='file to write the results into')
+    parser.add_argument('--keep', help='keep the generated files', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    workFolder = tempfile.mkdtemp(prefix="blendyard_benchmark_")
+
+    try:
+        if args.scenario == 'watchdog':
+            results = RunWatchdogBenchmark(args, workFolder)
+        else:
+            results = RunConvertBenchmark(args, workFolder)
+    finally:
+        if args.keep:
+            print("Generated files kept in %s"%workFolder)
+        else:
+            shutil.rmtree(workFolder, ignore_errors=True)
+
+    PrintResults("Benchmark: %s"%args.scenario, results)
+
+    if args.json != None:
+        with open(args.json, "w") as write_file:
+            json.dump({ "scenario": args.scenario, "arguments": vars(args), "results": results }, write_file, indent=4)
+
+if __name__ == '__main__':
+    main()
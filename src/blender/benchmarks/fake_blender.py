@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Stands in for the Blender executable so exports can be benchmarked on any
+# machine without Blender installed. Set blender_exe to this script.
+#
+# It understands the same command lines as Blender running batch_export.py:
+#   fake_blender.py -b [--python-expr EXPR] file.blend ... --python batch_export.py -- target.fbx [--timings FILE]
+#   fake_blender.py -b --python batch_export.py -- --server
+#   fake_blender.py -b --python batch_export.py -- --batch jobs.json
+# and answers with the same result lines and timings as batch_export.py.
+#
+# The time taken is set with environment variables, in seconds:
+#   BLENDYARD_FAKE_STARTUP      starting Blender (default 0.5)
+#   BLENDYARD_FAKE_LOAD         loading a .blend file (default 0.05)
+#   BLENDYARD_FAKE_EXPORT       cleaning up and writing the .fbx (default 0.1)
+#
+# When BLENDYARD_FAKE_LOG is set, every export is appended to that file as a
+# JSON line holding the source, the hash of the content that was exported
+# and when the export started and ended.
+
+import os
+import sys
+import json
+import time
+import hashlib
+
+SERVER_READY = "BLENDYARD_SERVER_READY"
+SERVER_RESULT = "BLENDYARD_RESULT "
+
+startupDelay = float(os.environ.get("BLENDYARD_FAKE_STARTUP", 0.5))
+loadDelay = float(os.environ.get("BLENDYARD_FAKE_LOAD", 0.05))
+exportDelay = float(os.environ.get("BLENDYARD_FAKE_EXPORT", 0.1))
+exportLog = os.environ.get("BLENDYARD_FAKE_LOG", "")
+
+# Appends a line to the export log, a single write to a file opened for
+# appending keeps lines from separate processes whole
+def logExport(record):
+    if len(exportLog) == 0:
+        return
+
+    descriptor = os.open(exportLog, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(descriptor, (json.dumps(record) + "\n").encode("utf-8"))
+    finally:
+        os.close(descriptor)
+
+# Pretends to load the source and writes an .fbx file derived from its content
+def export(source, target, loadTime):
+    startTime = time.time()
+
+    with open(source, "rb") as read_file:
+        content = read_file.read()
+
+    time.sleep(loadTime)
+    writeStartTime = time.time()
+    time.sleep(exportDelay)
+
+    if not os.path.exists(os.path.dirname(target)):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    version = hashlib.sha1(content).hexdigest()
+
+    with open(target, "w") as write_file:
+        write_file.write("FBX %s\n"%version)
+
+    endTime = time.time()
+
+    logExport({ "source": os.path.abspath(source), "version": version, "start": startTime, "end": endTime, "pid": os.getpid() })
+
+    return {
+        "timings": { "load": loadTime, "cleanup": 0.0, "write": endTime - writeStartTime },
+        "stats": { "objects": 1, "vertices": len(content), "faces": len(content) // 2 }
+    }
+
+# Answers a server or batch job the same way batch_export.py does
+def runJob(job, scriptStartTime):
+    startTime = time.time()
+    response = { "source": job["source"], "target": job["target"], "result": "ok", "script_start": scriptStartTime }
+
+    try:
+        response.update(export(job["source"], job["target"], loadDelay))
+    except OSError as e:
+        response["result"] = "failed"
+        response["error"] = str(e)
+
+    response["duration"] = time.time() - startTime
+
+    print(SERVER_RESULT + json.dumps(response))
+    sys.stdout.flush()
+
+def main():
+    arguments = sys.argv[1:]
+    separator = arguments.index("--") if "--" in arguments else len(arguments)
+    blenderArgs = arguments[:separator]
+    scriptArgs = arguments[separator + 1:]
+
+    sourceFiles = [argument for argument in blenderArgs if argument.endswith(".blend")]
+
+    # With a file on the command line Blender loads it before running the script
+    time.sleep(startupDelay)
+    loadStartTime = time.time()
+    if len(sourceFiles) > 0:
+        time.sleep(loadDelay)
+    scriptStartTime = time.time()
+
+    if "--server" in scriptArgs:
+        print(SERVER_READY)
+        sys.stdout.flush()
+
+        for line in sys.stdin:
+            if len(line.strip()) > 0:
+                runJob(json.loads(line), scriptStartTime)
+        return 0
+
+    if "--batch" in scriptArgs:
+        with open(scriptArgs[scriptArgs.index("--batch") + 1], "r") as read_file:
+            for job in json.load(read_file):
+                runJob(job, scriptStartTime)
+        return 0
+
+    if len(sourceFiles) == 0 or len(scriptArgs) == 0:
+        print("fake_blender: nothing to export")
+        return 1
+
+    source = sourceFiles[0]
+    target = os.path.join(os.path.dirname(scriptArgs[0]), os.path.basename(source).replace(".blend", ".fbx"))
+
+    exportStats = export(source, target, 0)
+    exportStats["timings"]["load"] = scriptStartTime - loadStartTime
+    exportStats["script_start"] = scriptStartTime
+    exportStats["load_start"] = loadStartTime
+
+    if "--timings" in scriptArgs:
+        with open(scriptArgs[scriptArgs.index("--timings") + 1], "w") as write_file:
+            json.dump(exportStats, write_file)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
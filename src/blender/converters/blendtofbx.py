@@ -25,10 +25,19 @@ SOFTWARE.
 # This script will export a single, specified .blend file into a .fbx file
 # it will use the settings.json to determine the destination folder to export to
 # unless the CLI argument is used
+#
+# When --source-dir is used, every .blend file found under that folder (or
+# under the source_folder from settings.json if no folder is given) is exported,
+# running up to --jobs Blender processes at the same time, as long as the
+# memory they are expected to need fits in the memory budget (see
+# blendyard_scheduler.py). A summary of every export is displayed once they
+# have all completed. With --batch-size each Blender process exports up to
+# that many files one after the other.
 
 import sys
 import os
 import json
+import time
 import shutil
 import subprocess
 import argparse
@@ -36,22 +45,44 @@ import argparse
 sys.path.append(os.path.abspath('src/blender/utilities'))
 
 import blendyard_utilities
+import blendyard_server
+import blendyard_manifest
+import blendyard_dependencies
+import blendyard_trace
+import blendyard_scheduler
 
 parser = argparse.ArgumentParser(description='Convert a specified .blend files to FBX.')
-parser.add_argument('--file', help='path to the blender file to convert', required=True)
+parser.add_argument('--file', help='path to the blender file to convert')
+parser.add_argument('--settings', help='The .json file that holds the configuration for exporting Blender files to FBX')
+parser.add_argument('--source-dir', help='convert every .blend file in this folder, uses the source_folder from the settings when no folder is given', nargs='?', const='')
+parser.add_argument('--jobs', help='number of Blender exports to run at the same time with --source-dir', type=int, default=os.cpu_count())
+parser.add_argument('--batch-size', help='number of files each Blender process exports with --source-dir', type=int, default=1)
+parser.add_argument('--trace', help='path of a .jsonl file to record the duration of each export phase into, see blendyard_trace.py')
+parser.add_argument('--summary', help='path of a .json file to write the per-file export summary into')
+parser.add_argument('--profile', help='name of the export profile to use from the exporter profiles in the settings')
 parser.add_argument('--destination', help='destination path for the produced .FBX file')
+parser.add_argument('--force', help='export files even if they have not changed since their last export', action='store_true', default=False)
 parser.add_argument('--verbose', help='Displays additional information', action='store_true', default=False)
 
 args = parser.parse_args()
 
-if args.file == None:
+if args.file == None and args.source_dir == None:
     print(parser.print_help())
     exit()
 
-print(args.file)
-if args.file.endswith('.blend') != True:
-    print("a .blend file must be provided")
-    exit()    
+if args.file != None:
+    print(args.file)
+    if args.file.endswith('.blend') != True:
+        print("a .blend file must be provided")
+        exit()    
+
+if args.jobs < 1:
+    print("--jobs must be at least 1")
+    exit()
+
+if args.batch_size < 1:
+    print("--batch-size must be at least 1")
+    exit()
 
 overridePath = None
 if args.destination != None:
@@ -61,6 +92,123 @@ settings = []
 
 filePath = args.file
 
+exportScript = os.path.join("src/blender/exporters", "batch_export.py")
+
+# Arguments shared by every InvokeBlenderExporter call, set in main()
+exportArgs = {}
+
+# Exports a single file and measures how long it took, this runs on one of
+# the scheduler's threads. Each thread spends its time waiting on its own
+# Blender process
+def ExportFile(source_folder, sourceFile, verbose):
+
+    startTime = time.time()
+
+    try:
+        result = blendyard_utilities.InvokeBlenderExporter( source_path=source_folder,
+                                                            source_file=sourceFile,
+                                                            verbose=verbose,
+                                                            capture_output=True,
+                                                            **exportArgs
+                                                            )
+    except OSError as e:
+        print("Could not run Blender for %s: %s"%(sourceFile, e))
+        result = blendyard_utilities.EXPORT_FAILED
+
+    return {
+        "file": sourceFile,
+        "result": result,
+        "duration": time.time() - startTime
+    }
+
+# Exports several files with a single Blender process
+def ExportChunk(source_folder, sourceFiles, verbose):
+
+    try:
+        results = blendyard_utilities.InvokeBlenderBatchExporter(   source_path=source_folder,
+                                                                    source_files=sourceFiles,
+                                                                    verbose=verbose,
+                                                                    capture_output=True,
+                                                                    **exportArgs
+                                                                    )
+    except OSError as e:
+        print("Could not run Blender for %d files: %s"%(len(sourceFiles), e))
+        results = {}
+
+    entries = []
+
+    for sourceFile in sourceFiles:
+        result = results.get(sourceFile, { "result": blendyard_utilities.EXPORT_FAILED, "duration": 0 })
+        entries.append({
+            "file": sourceFile,
+            "result": result["result"],
+            "duration": result["duration"]
+        })
+
+    return entries
+
+# Displays the result of every export and optionally saves them as JSON
+def WriteSummary(results, totalTime, summaryFile):
+
+    print("--------------------------------------------------------")
+    print("FBX Convert Summary")
+    print("--------------------------------------------------------")
+
+    for entry in results:
+        print("%-8s %8.2fs  %s"%(entry["result"].upper(), entry["duration"], entry["file"]))
+
+    succeeded = len([entry for entry in results if entry["result"] == blendyard_utilities.EXPORT_OK])
+    skipped = len([entry for entry in results if entry["result"] == blendyard_utilities.EXPORT_SKIPPED])
+    failed = len(results) - succeeded - skipped
+
+    print("--------------------------------------------------------")
+    print("%d exported, %d up to date, %d failed, %.2fs total"%(succeeded, skipped, failed, totalTime))
+    print("--------------------------------------------------------\n")
+
+    if summaryFile != None:
+        with open(summaryFile, "w") as write_file:
+            json.dump({
+                "total_time": totalTime,
+                "exported": succeeded,
+                "skipped": skipped,
+                "failed": failed,
+                "files": results
+            }, write_file, indent=4)
+
+# Exports every .blend file under the source folder, the scheduler starts the
+# exports needing the most memory first and fills the memory left with
+# smaller ones
+def ConvertFolder(source_folder, verbose):
+
+    blendFiles = blendyard_utilities.FindBlendFiles(source_folder)
+    scheduler = exportArgs["scheduler"]
+
+    print("Found %d .blend files in %s"%(len(blendFiles), source_folder))
+    print("Running up to %d exports at a time within %d MB of memory\n"%(scheduler.max_jobs, scheduler.budget // blendyard_scheduler.MEGABYTE))
+
+    startTime = time.time()
+    results = []
+
+    if args.batch_size > 1:
+        # Smaller chunks than requested when there are not enough files
+        # to keep every job busy
+        chunkSize = max(1, min(args.batch_size, (len(blendFiles) + args.jobs - 1) // args.jobs))
+        chunks = [blendFiles[index:index + chunkSize] for index in range(0, len(blendFiles), chunkSize)]
+
+        for entries in scheduler.Run(chunks, scheduler.EstimateBatch, lambda chunk: ExportChunk(source_folder, chunk, verbose)):
+            results.extend(entries or [])
+    else:
+        results.extend(scheduler.Run(blendFiles, scheduler.Estimate, lambda blendFile: ExportFile(source_folder, blendFile, verbose)))
+
+    # Exports that raised an exception have no result
+    results = [entry for entry in results if entry != None]
+
+    results.sort(key=lambda entry: entry["file"])
+
+    WriteSummary(results, time.time() - startTime, args.summary)
+
+    return results
+
 def main():
 
     verbose = args.verbose 
@@ -69,7 +217,7 @@ def main():
     print("FBX Convert")
     print("--------------------------------------------------------\n")
 
-    settings = blendyard_utilities.ReadSettings(None)
+    settings = blendyard_utilities.ReadSettings(args.settings)
     converter_bin = settings["general"]["blender_exe"]
     source_folder = settings["models"]["source_folder"]
     target_folder = settings["models"]["target_folder"]
@@ -77,19 +225,52 @@ def main():
     if overridePath != None:
         target_folder = overridePath
 
+    if args.source_dir != None and len(args.source_dir) > 0:
+        source_folder = args.source_dir
+
     if verbose == True:
         print("Converter: %s"%converter_bin)
         print("Target: %s"%target_folder)
         print("File: %s"%filePath)
 
-    if filePath.endswith(".blend"):
-        blendyard_utilities.InvokeBlenderExporter( converter=converter_bin,
-                                                    source_path=source_folder,
-                                                    source_file=filePath,
-                                                    destination=target_folder,
-                                                    script=os.path.join("src/blender/exporters", "batch_export.py"),
-                                                    verbose=True
-                                                    )
+    exportOptions = blendyard_utilities.ExportOptions(settings, args.profile)
+
+    # Files linking a library that changed since their last export are exported again
+    dependencyIndex = blendyard_dependencies.DependencyIndex(target_folder, verbose)
+
+    exportArgs.update({
+        "converter": converter_bin,
+        "destination": target_folder,
+        "script": exportScript,
+        "server": blendyard_server.CreateExportServer(settings, exportScript, verbose),
+        "reload": settings.get("exporter", {}).get("reload_file", 0) != 0,
+        "options": exportOptions,
+        "manifest": blendyard_manifest.ExportManifest(target_folder, exportScript, exportOptions, dependencyIndex),
+        "force": args.force,
+        "trace": blendyard_trace.CreateExportTrace(settings, args.trace),
+        "scheduler": blendyard_scheduler.CreateExportScheduler(settings, target_folder, args.jobs, verbose)
+    })
+
+    try:
+        if args.source_dir != None:
+            results = ConvertFolder(source_folder, verbose)
+
+            if len([entry for entry in results if entry["result"] == blendyard_utilities.EXPORT_FAILED]) > 0:
+                sys.exit(1)
+
+        elif filePath.endswith(".blend"):
+            blendyard_utilities.InvokeBlenderExporter( source_path=source_folder,
+                                                        source_file=filePath,
+                                                        verbose=True,
+                                                        **exportArgs
+                                                        )
+    finally:
+        exportArgs["manifest"].Save()
+        exportArgs["scheduler"].Save()
+        dependencyIndex.Save()
+
+        if exportArgs["server"] != None:
+            exportArgs["server"].Stop()
 
 if __name__== "__main__":
     main()
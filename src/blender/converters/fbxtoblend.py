@@ -0,0 +1,171 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# This script imports every .fbx file found under a folder and saves each
+# one as a .blend file, replicating the folder structure in the destination
+# folder (the source_folder from settings.json when no destination is given).
+#
+# Up to --jobs Blender processes run at the same time, each one imports up to
+# --batch-size files one after the other. Files whose .blend file is newer
+# than the .fbx file are skipped unless --force is used. A summary of every
+# import is displayed once they have all completed.
+
+import sys
+import os
+import json
+import time
+import argparse
+import concurrent.futures
+
+sys.path.append(os.path.abspath('src/blender/utilities'))
+
+import blendyard_utilities
+
+parser = argparse.ArgumentParser(description='Import the .fbx files of a folder into .blend files.')
+parser.add_argument('--source-dir', help='folder holding the .fbx files to import', required=True)
+parser.add_argument('--destination', help='folder to save the .blend files into, uses the source_folder from the settings when not given')
+parser.add_argument('--settings', help='The .json file that holds the configuration for exporting Blender files to FBX')
+parser.add_argument('--jobs', help='number of Blender processes to run at the same time', type=int, default=os.cpu_count())
+parser.add_argument('--batch-size', help='number of files each Blender process imports', type=int, default=8)
+parser.add_argument('--options', help="options passed to Blender's FBX importer as a JSON object, for example {\"global_scale\": 100}", default="{}")
+parser.add_argument('--summary', help='path of a .json file to write the per-file import summary into')
+parser.add_argument('--force', help='import files even if their .blend file is newer', action='store_true', default=False)
+parser.add_argument('--verbose', help='Displays additional information', action='store_true', default=False)
+
+args = parser.parse_args()
+
+if args.jobs < 1:
+    print("--jobs must be at least 1")
+    exit()
+
+if args.batch_size < 1:
+    print("--batch-size must be at least 1")
+    exit()
+
+importScript = os.path.join("src/blender/importers", "batch_import.py")
+
+# Arguments shared by every InvokeBlenderImporter call, set in main()
+importArgs = {}
+
+# Imports several files with a single Blender process, this runs on one of
+# the pool's threads
+def ImportChunk(sourceFiles):
+
+    try:
+        results = blendyard_utilities.InvokeBlenderImporter(source_files=sourceFiles, **importArgs)
+    except OSError as e:
+        print("Could not run Blender for %d files: %s"%(len(sourceFiles), e))
+        results = {}
+
+    entries = []
+
+    for sourceFile in sourceFiles:
+        result = results.get(sourceFile, { "result": blendyard_utilities.EXPORT_FAILED, "duration": 0 })
+        entries.append({
+            "file": sourceFile,
+            "result": result["result"],
+            "duration": result["duration"]
+        })
+
+    return entries
+
+# Displays the result of every import and optionally saves them as JSON
+def WriteSummary(results, totalTime, summaryFile):
+
+    print("--------------------------------------------------------")
+    print("FBX Import Summary")
+    print("--------------------------------------------------------")
+
+    for entry in results:
+        print("%-8s %8.2fs  %s"%(entry["result"].upper(), entry["duration"], entry["file"]))
+
+    succeeded = len([entry for entry in results if entry["result"] == blendyard_utilities.EXPORT_OK])
+    skipped = len([entry for entry in results if entry["result"] == blendyard_utilities.EXPORT_SKIPPED])
+    failed = len(results) - succeeded - skipped
+
+    print("--------------------------------------------------------")
+    print("%d imported, %d up to date, %d failed, %.2fs total"%(succeeded, skipped, failed, totalTime))
+    print("--------------------------------------------------------\n")
+
+    if summaryFile != None:
+        with open(summaryFile, "w") as write_file:
+            json.dump({
+                "total_time": totalTime,
+                "imported": succeeded,
+                "skipped": skipped,
+                "failed": failed,
+                "files": results
+            }, write_file, indent=4)
+
+def main():
+
+    print("--------------------------------------------------------")
+    print("FBX Import")
+    print("--------------------------------------------------------\n")
+
+    settings = blendyard_utilities.ReadSettings(args.settings)
+
+    destination = settings["models"]["source_folder"]
+    if args.destination != None:
+        destination = args.destination
+
+    importArgs.update({
+        "source_path": args.source_dir,
+        "destination": destination,
+        "converter": settings["general"]["blender_exe"],
+        "script": importScript,
+        "verbose": args.verbose,
+        "capture_output": True,
+        "force": args.force,
+        "options": json.loads(args.options)
+    })
+
+    fbxFiles = sorted(filePath for filePath, statbuf in blendyard_utilities.ScanFiles(args.source_dir, ".fbx", ignore_case=True))
+
+    print("Found %d .fbx files in %s"%(len(fbxFiles), args.source_dir))
+    print("Running %d imports at a time\n"%args.jobs)
+
+    startTime = time.time()
+    results = []
+
+    # Smaller chunks than requested when there are not enough files to keep
+    # every job busy
+    chunkSize = max(1, min(args.batch_size, (len(fbxFiles) + args.jobs - 1) // args.jobs))
+    chunks = [fbxFiles[index:index + chunkSize] for index in range(0, len(fbxFiles), chunkSize)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(ImportChunk, chunk) for chunk in chunks]
+
+        for future in concurrent.futures.as_completed(futures):
+            results.extend(future.result())
+
+    results.sort(key=lambda entry: entry["file"])
+
+    WriteSummary(results, time.time() - startTime, args.summary)
+
+    if len([entry for entry in results if entry["result"] == blendyard_utilities.EXPORT_FAILED]) > 0:
+        sys.exit(1)
+
+if __name__== "__main__":
+    main()
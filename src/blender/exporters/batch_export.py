@@ -26,31 +26,989 @@ SOFTWARE.
 # This is a Blender python script. 
 # When executed it will select all the objects in the scene
 # and export them in a way that makes the compatible with Amazon Lumberyard.
+#
+# When invoked with --server instead of a destination, the script keeps
+# Blender running and reads export jobs from stdin, one JSON object per line:
+#   {"source": "path/to/file.blend", "target": "path/to/file.fbx", "options": {}}
+# The result of each job is written to stdout as a single line starting
+# with SERVER_RESULT so the caller can tell it apart from Blender's output.
+# The server exits when stdin is closed.
+#
+# Several files can also be exported by a single Blender process, either by
+# passing --batch with a JSON file holding a list of jobs (in the same format
+# as the server's) or by repeating --pair SOURCE TARGET. Each file is opened in
+# turn, which replaces the previously loaded scene, and its result is written
+# to stdout the same way the server does.
+#
+# Blender has already loaded the .blend file given on its command line when
+# this script runs, so the export works on that scene directly. Passing
+# --reload opens the file again and exports from the load_post handler
+# instead, which is also used as a fallback if the direct export fails.
+#
+# When the "split" export option is "collections", each top-level collection
+# and each object that is not in a collection is exported to its own .fbx
+# file, in a folder named after the destination .fbx file. The fingerprint of
+# each of them is kept in SPLIT_FINGERPRINTS in that folder, only the ones
+# whose content changed since the last export are written again.
+#
+# Each .fbx file is written to a temporary file next to it first and only
+# replaces the existing file when their content differs, see writeIfChanged,
+# so O3DE's Asset Processor does not process a file that did not change.
+#
+# The "textures" export option copies the images used by the exported
+# materials next to the .fbx file, see exportTextures.
+#
+# The "optimize" export option prepares the meshes for a real-time engine,
+# see optimizeMeshes, and can write lower detail copies of the .fbx file
+# next to it as _lod1, _lod2 and so on, see writeFBX.
+#
+# Passing --timings FILE writes how long loading, cleaning up and writing the
+# file took, along with vertex and face counts and the peak memory Blender
+# used, to FILE as JSON. The server and batch modes include the same
+# information in each result.
 
 import bpy
+import bmesh
 import os
 import sys
+import json
+import time
+import array
+import struct
+import shutil
+import hashlib
+import ctypes
+import argparse
+import collections
+import traceback
 
 from bpy.app.handlers import persistent
 
+SERVER_READY = "BLENDYARD_SERVER_READY"
+SERVER_RESULT = "BLENDYARD_RESULT "
+
+# Must match SPLIT_FINGERPRINTS in blendyard_utilities.py
+SPLIT_FINGERPRINTS = ".blendyard_collections.json"
+
+scriptStartTime = time.time()
+
+# Set by the caller with --python-expr before Blender loads the .blend file
+# given on its command line, so the load time can be measured
+loadStartTime = float(os.environ.get("BLENDYARD_LOAD_START", 0))
+
 basedir = os.path.dirname(bpy.data.filepath)
-view_layer = bpy.context.view_layer
 
 # When invoking this script, the destination folder needs
 # to be passed in as a command line argument, you need to use
 # Blender's -- command line option which does the following:
 # -- "End option processing, following arguments passed unchanged. Access via Python's 'sys.argv'"
-destinationPath = sys.argv[6]
+scriptArgs = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+argParser = argparse.ArgumentParser(prog="batch_export.py")
+argParser.add_argument("destination", nargs="?", help="path of the .fbx file to export to")
+argParser.add_argument("--server", help="read export jobs from stdin", action="store_true")
+argParser.add_argument("--reload", help="open the .blend file again and export from the load handler", action="store_true")
+argParser.add_argument("--options", help="export options as a JSON object", default="{}")
+argParser.add_argument("--batch", help="JSON file with a list of export jobs to run")
+argParser.add_argument("--pair", help="a .blend file and the .fbx file to export it to, may be repeated", nargs=2, action="append", metavar=("SOURCE", "TARGET"))
+argParser.add_argument("--timings", help="JSON file to write the export timings into")
+scriptOptions = argParser.parse_args(scriptArgs)
+
+destinationPath = scriptOptions.destination
+exportOptions = json.loads(scriptOptions.options)
+
+# The options used for bpy.ops.export_scene.fbx, individual options can
+# be overridden through the "fbx" entry of the export options
+FBX_OPTIONS = {
+    "check_existing": True,
+    "axis_forward": 'Y',
+    "axis_up": 'Z',
+    "use_selection": True,
+    "global_scale": 1.0,
+    "apply_unit_scale": True,
+    "bake_space_transform": True,
+    "object_types": {'MESH'},
+    "use_mesh_modifiers": False,
+    "use_mesh_modifiers_render": False,
+    "mesh_smooth_type": 'EDGE',
+    "use_mesh_edges": True,
+    "use_tspace": True,
+    "use_custom_props": False,
+    "add_leaf_bones": True,
+    "primary_bone_axis": 'Y',
+    "secondary_bone_axis": 'X',
+    "use_armature_deform_only": False,
+    "armature_nodetype": 'NULL',
+    "path_mode": 'AUTO',
+    "embed_textures": False,
+    "batch_mode": 'OFF',
+    "use_batch_own_dir": True,
+    # The metadata holds the time of the export, without it exporting the
+    # same scene twice gives the same file
+    "use_metadata": False
+    # "filter_glob": "*.fbx",
+    # "version": 'BIN7400',
+    # "ui_tab": 'MAIN',
+    # "bake_anim": True,
+    # "bake_anim_use_all_bones": True,
+    # "bake_anim_use_nla_strips": True,
+    # "bake_anim_use_all_actions": True,
+    # "bake_anim_force_startend_keying": True,
+    # "bake_anim_step": 1.0,
+    # "bake_anim_simplify_factor": 1.0,
+    # "use_anim": True,
+    # "use_anim_action_all": True,
+    # "use_default_take": True,
+    # "use_anim_optimize": True,
+    # "anim_optimize_precision": 6.0,
+}
+
+# Included in the collection fingerprints so changing this script exports
+# every collection again
+with open(os.path.abspath(__file__), "rb") as read_file:
+    scriptHash = hashlib.sha1(read_file.read()).digest()
+
+# Returns the FBX options with the overrides from the export options applied
+def getFBXOptions(options):
+    fbxOptions = dict(FBX_OPTIONS)
+
+    for key, value in options.get("fbx", {}).items():
+        # JSON has no sets, enum flags are passed as lists
+        if isinstance(value, list):
+            value = set(value)
+        fbxOptions[key] = value
+
+    return fbxOptions
+
+# Threshold used to dissolve zero area faces and zero length edges
+DEGENERATE_THRESHOLD = 0.0001
+
+# Returns the meshes used by the objects, a mesh shared by several objects
+# (linked duplicates) is only returned once. Meshes linked from another
+# library can't be edited and are left out
+def getUniqueMeshes(objects):
+    meshes = []
+    seen = set()
+
+    for object in objects:
+        if object.type != 'MESH' or object.data.library != None:
+            continue
+
+        if object.data.as_pointer() in seen:
+            continue
+
+        seen.add(object.data.as_pointer())
+        meshes.append(object.data)
+
+    return meshes
+
+# Cleans up each mesh once with bmesh, does the same as the edit mode
+# operators in cleanupMeshesOperators without leaving Object mode
+def cleanupMeshesBMesh(objects):
+    meshes = getUniqueMeshes(objects)
+
+    for mesh in meshes:
+        bm = bmesh.new()
+        bm.from_mesh(mesh)
+
+        # Delete loose edges and vertices, deleting the edges also removes
+        # the vertices only they were using
+        looseEdges = [edge for edge in bm.edges if len(edge.link_faces) == 0]
+        bmesh.ops.delete(bm, geom=looseEdges, context='EDGES')
+
+        looseVerts = [vert for vert in bm.verts if len(vert.link_edges) == 0]
+        bmesh.ops.delete(bm, geom=looseVerts, context='VERTS')
+
+        # Dissolve zero area faces and zero length edges
+        bmesh.ops.dissolve_degenerate(bm, dist=DEGENERATE_THRESHOLD, edges=bm.edges[:])
+
+        # Make face normals point outside the mesh
+        bmesh.ops.recalc_face_normals(bm, faces=bm.faces[:])
+
+        bm.to_mesh(mesh)
+        bm.free()
+        mesh.update()
+
+    return len(meshes)
+
+# Cleans up all the selected meshes at once using the edit mode operators
+def cleanupMeshesOperators(objects):
+    meshObjects = [object for object in objects if object.type == 'MESH']
+    if len(meshObjects) == 0:
+        return 0
+
+    # Edit mode is entered through the active object, it must be a mesh
+    active = bpy.context.view_layer.objects.active
+    if active == None or active.type != 'MESH':
+        bpy.context.view_layer.objects.active = meshObjects[0]
+
+    # Every selected mesh enters Edit mode together, so each operator
+    # only needs to run once
+    bpy.ops.object.mode_set(mode='EDIT')
+    bpy.ops.mesh.select_all(action='SELECT')
+
+    # Cleanup some of the geometry to avoid artifacts
+    bpy.ops.mesh.delete_loose(use_verts=True, use_edges=True, use_faces=False) # Delete loose vertices, edges or faces
+    bpy.ops.mesh.dissolve_degenerate(threshold=DEGENERATE_THRESHOLD) # Dissolve zero area faces and zero length edges
+    bpy.ops.mesh.normals_make_consistent(inside=False) # Make face and vertex normals point either outside or inside the mesh
+
+    # TODO: Currently I found no benefit to doing any operations on the normals
+    #bpy.ops.mesh.set_normals_from_faces()
+    #bpy.ops.mesh.split_normals()
+    #bpy.ops.mesh.average_normals(average_type='FACE_AREA')
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    return len(getUniqueMeshes(objects))
+
+# The ways of cleaning up meshes, chosen with the "cleanup" export option
+CLEANUP_METHODS = {
+    "bmesh": cleanupMeshesBMesh,
+    "operators": cleanupMeshesOperators,
+    "none": lambda objects: 0
+}
+
+# Returns the number of triangles of a mesh once its faces are triangulated
+def countTriangles(mesh):
+    loopTotals = array.array('i', [0]) * len(mesh.polygons)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+    return sum(loopTotals) - 2 * len(loopTotals)
+
+# Returns the triangle count of the meshes of the objects as exported,
+# an object sharing its mesh with another is counted as well
+def countObjectTriangles(objects):
+    return sum(countTriangles(object.data) for object in objects if object.type == 'MESH')
+
+# Number of vertices kept in the simulated post-transform cache
+VERTEX_CACHE_SIZE = 32
+
+# Returns the order in which to draw the faces so that their vertices are
+# found in the GPU's post-transform cache as often as possible, using
+# Tom Forsyth's linear-speed vertex cache optimization. faces holds the
+# vertex indices of each face
+def vertexCacheOrder(faces, vertexCount):
+    vertexFaces = [[] for index in range(vertexCount)]
+    for faceIndex, face in enumerate(faces):
+        for vertex in face:
+            vertexFaces[vertex].append(faceIndex)
+
+    cachePosition = [-1] * vertexCount
+
+    def vertexScore(vertex):
+        remaining = len(vertexFaces[vertex])
+        if remaining == 0:
+            return -1.0
+
+        score = 0.0
+        position = cachePosition[vertex]
+        if position >= 0:
+            if position < 3:
+                # The vertices of the last face, favoring them too much
+                # gives strips that leave holes behind
+                score = 0.75
+            else:
+                score = (1.0 - (position - 3) / (VERTEX_CACHE_SIZE - 3)) ** 1.5
+
+        # Vertices with few faces left are finished first
+        return score + 2.0 * remaining ** -0.5
+
+    vertexScores = [vertexScore(vertex) for vertex in range(vertexCount)]
+    faceScores = [sum(vertexScores[vertex] for vertex in face) for face in faces]
+    emitted = [False] * len(faces)
+
+    order = []
+    cache = []
+    nextFace = 0
+    bestFace = max(range(len(faces)), key=lambda faceIndex: faceScores[faceIndex], default=-1)
+
+    while len(order) < len(faces):
+        # No face uses the cached vertices, take the next face not drawn yet
+        if bestFace < 0:
+            while emitted[nextFace]:
+                nextFace += 1
+            bestFace = nextFace
+
+        face = faces[bestFace]
+        order.append(bestFace)
+        emitted[bestFace] = True
+
+        for vertex in face:
+            vertexFaces[vertex].remove(bestFace)
+
+        newCache = list(face) + [vertex for vertex in cache if vertex not in face]
+        for vertex in newCache[VERTEX_CACHE_SIZE:]:
+            cachePosition[vertex] = -1
+        cache = newCache[:VERTEX_CACHE_SIZE]
+
+        touchedFaces = set()
+        for position, vertex in enumerate(cache):
+            cachePosition[vertex] = position
+        for vertex in newCache:
+            vertexScores[vertex] = vertexScore(vertex)
+            touchedFaces.update(vertexFaces[vertex])
+
+        bestFace = -1
+        bestScore = -1.0
+        for faceIndex in touchedFaces:
+            faceScores[faceIndex] = sum(vertexScores[vertex] for vertex in faces[faceIndex])
+            if faceScores[faceIndex] > bestScore:
+                bestFace = faceIndex
+                bestScore = faceScores[faceIndex]
+
+    return order
+
+# Optimizes each mesh once for a real-time engine with bmesh, the steps are
+# chosen with the "optimize" export option:
+#   merge_distance  merges vertices closer than this distance, 0 to disable
+#   triangulate     splits quads and n-gons into triangles
+#   vertex_cache    reorders the faces and vertices for the GPU's vertex cache
+def optimizeMeshes(objects, optimize):
+    meshes = getUniqueMeshes(objects)
+
+    for mesh in meshes:
+        bm = bmesh.new()
+        bm.from_mesh(mesh)
+
+        if optimize.get("merge_distance", 0) > 0:
+            bmesh.ops.remove_doubles(bm, verts=bm.verts[:], dist=optimize["merge_distance"])
+
+        if optimize.get("triangulate", False) == True:
+            bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method='BEAUTY', ngon_method='BEAUTY')
+
+        if optimize.get("vertex_cache", False) == True and len(bm.faces) > 0:
+            bm.verts.index_update()
+            bm.faces.index_update()
+
+            order = vertexCacheOrder([[vertex.index for vertex in face.verts] for face in bm.faces], len(bm.verts))
+
+            faceRank = [0] * len(order)
+            for rank, faceIndex in enumerate(order):
+                faceRank[faceIndex] = rank
+
+            # Vertices are stored in the order the faces first use them
+            faces = list(bm.faces)
+            vertexRank = [len(bm.verts)] * len(bm.verts)
+            rank = 0
+            for faceIndex in order:
+                for vertex in faces[faceIndex].verts:
+                    if vertexRank[vertex.index] == len(bm.verts):
+                        vertexRank[vertex.index] = rank
+                        rank += 1
+
+            bm.faces.sort(key=lambda face: faceRank[face.index])
+            bm.verts.sort(key=lambda vertex: vertexRank[vertex.index])
+
+        bm.to_mesh(mesh)
+        bm.free()
+        mesh.update()
+
+    return len(meshes)
+
+# Returns the SHA-1 digest of a file's content
+def hashFile(fileName):
+    sha = hashlib.sha1()
+
+    with open(fileName, "rb") as read_file:
+        for block in iter(lambda: read_file.read(1 << 20), b""):
+            sha.update(block)
+
+    return sha.digest()
+
+# Exports to a temporary file next to the .fbx file, in the same folder so
+# texture paths are relative to the right place and the file can be renamed
+# over the existing one. The existing file is only replaced when the content
+# differs. Returns whether the file was written. Another export of the same
+# file may be running, such as a superseded one, each process writes its own
+# temporary file
+def writeIfChanged(fileName, fbxOptions):
+    temporaryFile = "%s.%d.blendyard.tmp"%(fileName, os.getpid())
+
+    try:
+        bpy.ops.export_scene.fbx(filepath=temporaryFile, **fbxOptions)
+
+        if (os.path.exists(fileName) and os.path.getsize(fileName) == os.path.getsize(temporaryFile) and
+            hashFile(fileName) == hashFile(temporaryFile)):
+            print("Unchanged: %s"%fileName)
+            return False
+
+        os.replace(temporaryFile, fileName)
+    finally:
+        if os.path.exists(temporaryFile):
+            os.remove(temporaryFile)
+
+    print("Exported: %s"%fileName)
+    return True
+
+# Returns the images used by the materials of the mesh objects, including the
+# ones used inside node groups
+def getImages(objects):
+    images = {}
+    visited = set()
+
+    def visitNodeTree(nodeTree):
+        if nodeTree.as_pointer() in visited:
+            return
+        visited.add(nodeTree.as_pointer())
+
+        for node in nodeTree.nodes:
+            if node.type == 'TEX_IMAGE' and node.image != None:
+                images[node.image.as_pointer()] = node.image
+            elif node.type == 'GROUP' and node.node_tree != None:
+                visitNodeTree(node.node_tree)
+
+    for object in objects:
+        if object.type != 'MESH':
+            continue
+
+        for slot in object.material_slots:
+            if slot.material != None and slot.material.use_nodes == True and slot.material.node_tree != None:
+                visitNodeTree(slot.material.node_tree)
+
+    return list(images.values())
+
+# Returns the hex SHA-1 of an image file, the hashes are kept in the texture
+# cache's TEXTURE_INDEX with the size and modification time of each file so
+# large images are only read again when they change
+def hashImage(index, imagePath):
+    statbuf = os.stat(imagePath)
+    key = os.path.normcase(os.path.abspath(imagePath))
+
+    entry = index["files"].get(key)
+    if entry != None and entry[0] == statbuf.st_size and entry[1] == statbuf.st_mtime_ns:
+        return entry[2]
+
+    digest = hashFile(imagePath).hex()
+    index["files"][key] = [statbuf.st_size, statbuf.st_mtime_ns, digest]
+    index["dirty"] = True
+
+    return digest
+
+TEXTURE_INDEX = "index.json"
+
+# Stores the file, or the bytes of a packed image, in the cache under its hash
+# unless it is already there. Returns the path in the cache and whether it
+# was added
+def addToTextureCache(cache, digest, extension, sourcePath, content):
+    cachePath = os.path.join(cache, digest[:2], digest + extension.lower())
+    if os.path.exists(cachePath):
+        return cachePath, False
+
+    os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+
+    temporaryFile = cachePath + ".%d.tmp"%os.getpid()
+    if content != None:
+        with open(temporaryFile, "wb") as write_file:
+            write_file.write(content)
+    else:
+        shutil.copyfile(sourcePath, temporaryFile)
+    os.replace(temporaryFile, cachePath)
+
+    return cachePath, True
+
+# Returns whether the destination holds the content of the cached file
+def hasTexture(cachePath, digest, destination):
+    try:
+        if os.path.samefile(cachePath, destination):
+            return True
+
+        # Copied when a hardlink could not be made
+        return os.path.getsize(cachePath) == os.path.getsize(destination) and hashFile(destination).hex() == digest
+    except OSError:
+        return False
+
+# Places the cached file at the destination, as a hardlink when possible so
+# the same image used in several folders is stored once on disk. Returns
+# False when the destination already holds the same content. Exports running
+# at the same time may place the same texture, each one uses its own
+# temporary file
+def placeTexture(cachePath, digest, destination):
+    if os.path.exists(destination) and hasTexture(cachePath, digest, destination):
+        return False
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    temporaryFile = destination + ".%d.tmp"%os.getpid()
+    if os.path.exists(temporaryFile):
+        os.remove(temporaryFile)
+
+    try:
+        try:
+            os.link(cachePath, temporaryFile)
+        except OSError:
+            # Another volume, or a file system without hardlinks
+            shutil.copyfile(cachePath, temporaryFile)
+
+        os.replace(temporaryFile, destination)
+    except OSError:
+        # Windows does not replace a file another process is replacing or
+        # reading, which is fine when it placed the same texture
+        if hasTexture(cachePath, digest, destination):
+            return False
+        raise
+    finally:
+        if os.path.exists(temporaryFile):
+            os.remove(temporaryFile)
+
+    return True
+
+# Copies the images used by the exported materials into the "folder" of the
+# "textures" export option, next to the .fbx file, through a cache shared
+# between exports where each image is stored once under the hash of its
+# content. Only images whose content changed are placed again. The images
+# are pointed at their copy so the .fbx file references them with relative
+# paths. Returns the statistics and the original path of each image
+def exportTextures(objects, exportFolder, textures):
+    cache = textures["cache"]
+    folder = os.path.join(exportFolder, textures.get("folder", "textures"))
+
+    index = { "files": {}, "dirty": False }
+    indexFile = os.path.join(cache, TEXTURE_INDEX)
+    if os.path.exists(indexFile):
+        try:
+            with open(indexFile, "r") as read_file:
+                index["files"] = json.load(read_file)
+        except ValueError:
+            pass
+
+    stats = { "textures": 0, "textures_cached": 0, "textures_placed": 0 }
+    originals = []
+    names = {}
+
+    for image in getImages(objects):
+        if image.source != 'FILE':
+            continue
+
+        content = None
+        sourcePath = None
+
+        if image.packed_file != None:
+            content = bytes(image.packed_file.data)
+            digest = hashlib.sha1(content).hexdigest()
+            name = bpy.path.basename(image.filepath) or image.name
+            if os.path.splitext(name)[1] == "":
+                name += "." + image.file_format.lower()
+        else:
+            sourcePath = bpy.path.abspath(image.filepath, library=image.library)
+            if not os.path.isfile(sourcePath):
+                print("Missing texture: %s"%sourcePath)
+                continue
+
+            digest = hashImage(index, sourcePath)
+            name = os.path.basename(sourcePath)
+
+        # Different images with the same name
+        if names.get(name, digest) != digest:
+            stem, extension = os.path.splitext(name)
+            name = "%s_%s%s"%(stem, digest[:8], extension)
+        names[name] = digest
+
+        cachePath, cached = addToTextureCache(cache, digest, os.path.splitext(name)[1], sourcePath, content)
+        destination = os.path.join(folder, name)
+
+        stats["textures"] += 1
+        if cached == True:
+            stats["textures_cached"] += 1
+        if placeTexture(cachePath, digest, destination) == True:
+            stats["textures_placed"] += 1
+            print("Texture: %s"%destination)
+
+        originals.append((image, image.filepath))
+        image.filepath = destination
+
+    if index["dirty"] == True:
+        os.makedirs(cache, exist_ok=True)
+        temporaryFile = indexFile + ".%d.tmp"%os.getpid()
+        with open(temporaryFile, "w") as write_file:
+            json.dump(index["files"], write_file)
+        os.replace(temporaryFile, indexFile)
+
+    return stats, originals
+
+# Removes the levels of detail of an .fbx file starting with the given level
+def removeLevelsOfDetail(fileName, firstLevel):
+    level = firstLevel
+    while os.path.exists("%s_lod%d.fbx"%(os.path.splitext(fileName)[0], level)):
+        os.remove("%s_lod%d.fbx"%(os.path.splitext(fileName)[0], level))
+        level += 1
+
+# Writes the selected objects to the .fbx file and, for each decimate ratio in
+# lods, a lower detail copy next to it named _lod1, _lod2 and so on. Returns
+# whether the .fbx file changed and the triangle count of each level of detail
+def writeFBX(fileName, fbxOptions, objects, lods):
+    written = writeIfChanged(fileName, fbxOptions)
+
+    meshObjects = [object for object in objects if object.type == 'MESH']
+    baseName = os.path.splitext(fileName)[0]
+    lodTriangles = []
+
+    # The levels of detail are exported with a decimate modifier added after
+    # the other modifiers. When the export leaves the modifiers out, the
+    # others are disabled while exporting so the levels match the .fbx file
+    keepModifiers = fbxOptions.get("use_mesh_modifiers") == True
+    lodOptions = dict(fbxOptions)
+    lodOptions["use_mesh_modifiers"] = True
+    if keepModifiers == False:
+        lodOptions["use_mesh_modifiers_render"] = False
+
+    for level, ratio in enumerate(lods, 1):
+        lodFile = "%s_lod%d.fbx"%(baseName, level)
+        disabled = []
+        added = []
+
+        try:
+            for object in meshObjects:
+                for modifier in object.modifiers:
+                    if keepModifiers == False and modifier.show_viewport == True:
+                        modifier.show_viewport = False
+                        disabled.append(modifier)
+
+                decimate = object.modifiers.new("blendyard_lod%d"%level, 'DECIMATE')
+                decimate.ratio = ratio
+                added.append((object, decimate))
+
+            writeIfChanged(lodFile, lodOptions)
+
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            triangles = 0
+            for object in meshObjects:
+                evaluated = object.evaluated_get(depsgraph)
+                triangles += countTriangles(evaluated.to_mesh())
+                evaluated.to_mesh_clear()
+            lodTriangles.append(triangles)
+        finally:
+            for object, decimate in added:
+                object.modifiers.remove(decimate)
+            for modifier in disabled:
+                modifier.show_viewport = True
+
+    # Levels of detail left over from an export with more levels
+    removeLevelsOfDetail(fileName, len(lods) + 1)
+
+    return written, lodTriangles
+
+# Adds the values of a property of every item of a collection, such as the
+# positions of the vertices of a mesh, to the hash
+def hashItems(sha, items, attribute, size, typecode):
+    values = array.array(typecode, [0]) * (len(items) * size)
+    items.foreach_get(attribute, values)
+    sha.update(values.tobytes())
+
+# Properties of the nodes that only change how the node editor displays them
+NODE_UI_PROPERTIES = {"location", "width", "width_hidden", "height", "dimensions", "select", "show_options",
+    "show_preview", "show_texture", "hide", "label", "use_custom_color", "color", "parent"}
+
+# Adds the value of a property to the hash, IDs are added by name
+def hashValue(sha, value):
+    if isinstance(value, bpy.types.ID):
+        value = "%s:%s"%(type(value).__name__, value.name_full)
+    elif isinstance(value, set):
+        # Enum flags
+        value = tuple(sorted(value))
+    elif hasattr(value, "__len__") and not isinstance(value, str):
+        value = tuple(value)
+    elif isinstance(value, bpy.types.bpy_struct):
+        # Structs other than IDs are not compared
+        value = type(value).__name__
+
+    sha.update(("|%r"%(value,)).encode("utf-8"))
+
+# Adds the values of the editable properties of a struct, such as a node or
+# a material, to the hash
+def hashProperties(sha, rnaStruct, ignored=()):
+    for property in rnaStruct.bl_rna.properties:
+        if property.identifier in ignored or property.identifier == "rna_type" or property.is_readonly or property.type == 'COLLECTION':
+            continue
+
+        sha.update(property.identifier.encode("utf-8"))
+        hashValue(sha, getattr(rnaStruct, property.identifier))
+
+# Adds a node tree to the hash: every node with its settings, the values of
+# its inputs that are not linked and the node groups it uses, and the links
+# between the nodes. Images are added with the size and modification time of
+# their file
+def hashNodeTree(sha, nodeTree, visited):
+    if nodeTree.name_full in visited:
+        sha.update(("|tree:%s"%nodeTree.name_full).encode("utf-8"))
+        return
+    visited.add(nodeTree.name_full)
+
+    for node in sorted(nodeTree.nodes, key=lambda node: node.name):
+        sha.update(("|node:%s|%s"%(node.name, node.bl_idname)).encode("utf-8"))
+        hashProperties(sha, node, NODE_UI_PROPERTIES)
+
+        for socket in node.inputs:
+            if socket.is_linked == False and hasattr(socket, "default_value"):
+                sha.update(socket.identifier.encode("utf-8"))
+                hashValue(sha, socket.default_value)
+
+        if node.type == 'GROUP' and node.node_tree != None:
+            hashNodeTree(sha, node.node_tree, visited)
+
+        if node.type == 'TEX_IMAGE' and node.image != None:
+            image = node.image
+            sha.update(("|%s|%s|%s"%(image.filepath, image.source, image.colorspace_settings.name)).encode("utf-8"))
+
+            if image.packed_file != None:
+                sha.update(struct.pack("<q", image.packed_file.size))
+            else:
+                imagePath = bpy.path.abspath(image.filepath, library=image.library)
+                if os.path.isfile(imagePath):
+                    statbuf = os.stat(imagePath)
+                    sha.update(struct.pack("<qq", statbuf.st_size, statbuf.st_mtime_ns))
+
+    for link in nodeTree.links:
+        sha.update(("|link:%s.%s>%s.%s|%s"%(link.from_node.name, link.from_socket.identifier,
+            link.to_node.name, link.to_socket.identifier, link.is_muted)).encode("utf-8"))
+
+# Adds what the FBX exporter writes for a mesh: the geometry, smoothing,
+# attributes (UVs and color attributes among them), custom normals, vertex
+# group weights and shape keys
+def hashMesh(sha, object, mesh):
+    hashItems(sha, mesh.vertices, "co", 3, 'f')
+    hashItems(sha, mesh.loops, "vertex_index", 1, 'i')
+    hashItems(sha, mesh.polygons, "loop_total", 1, 'i')
+    hashItems(sha, mesh.polygons, "material_index", 1, 'i')
+    hashItems(sha, mesh.polygons, "use_smooth", 1, 'b')
+    hashItems(sha, mesh.edges, "use_edge_sharp", 1, 'b')
+
+    for layer in mesh.uv_layers:
+        sha.update(layer.name.encode("utf-8"))
+        hashItems(sha, layer.data, "uv", 2, 'f')
+
+    # Attributes of type INT8, STRING or with future types fall back to
+    # comparing their values one by one
+    for attribute in sorted(mesh.attributes, key=lambda attribute: attribute.name):
+        sha.update(("|%s|%s|%s"%(attribute.name, attribute.domain, attribute.data_type)).encode("utf-8"))
+
+        if attribute.data_type in ('FLOAT_COLOR', 'BYTE_COLOR'):
+            hashItems(sha, attribute.data, "color", 4, 'f')
+        elif attribute.data_type in ('FLOAT_VECTOR', 'FLOAT2'):
+            hashItems(sha, attribute.data, "vector", 3 if attribute.data_type == 'FLOAT_VECTOR' else 2, 'f')
+        elif attribute.data_type == 'FLOAT':
+            hashItems(sha, attribute.data, "value", 1, 'f')
+        elif attribute.data_type == 'INT':
+            hashItems(sha, attribute.data, "value", 1, 'i')
+        elif attribute.data_type == 'BOOLEAN':
+            hashItems(sha, attribute.data, "value", 1, 'b')
+        else:
+            for item in attribute.data:
+                hashValue(sha, getattr(item, "value", None))
+
+    # Blender 2.8x keeps the colors in vertex_colors, not in the attributes
+    if hasattr(mesh, "vertex_colors") and not hasattr(mesh, "color_attributes"):
+        for layer in mesh.vertex_colors:
+            sha.update(layer.name.encode("utf-8"))
+            hashItems(sha, layer.data, "color", 4, 'f')
+
+    if mesh.has_custom_normals == True:
+        if hasattr(mesh, "corner_normals"):
+            hashItems(sha, mesh.corner_normals, "vector", 3, 'f')
+        else:
+            mesh.calc_normals_split()
+            hashItems(sha, mesh.loops, "normal", 3, 'f')
+
+    if len(object.vertex_groups) > 0:
+        sha.update("|".join(group.name for group in object.vertex_groups).encode("utf-8"))
+        for vertex in mesh.vertices:
+            sha.update(struct.pack("<i", len(vertex.groups)))
+            for element in vertex.groups:
+                sha.update(struct.pack("<if", element.group, element.weight))
+
+    if mesh.shape_keys != None:
+        for keyBlock in mesh.shape_keys.key_blocks:
+            sha.update(("|%s|%s|%s"%(keyBlock.name, keyBlock.relative_key.name, keyBlock.value)).encode("utf-8"))
+            hashItems(sha, keyBlock.data, "co", 3, 'f')
+
+# Returns a hash of everything the FBX exporter writes for the objects, used
+# to tell which collections changed since they were last exported. With
+# use_mesh_modifiers the meshes are hashed as the modifiers leave them.
+# Returns None when the objects can't be hashed, the part is then exported
+def fingerprintObjects(objects, options, fbxOptions):
+    sha = hashlib.sha1()
+    sha.update(scriptHash)
+    sha.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+
+    # The unit scale is applied by apply_unit_scale
+    sha.update(struct.pack("<f", bpy.context.scene.unit_settings.scale_length))
+
+    depsgraph = None
+    if fbxOptions.get("use_mesh_modifiers") == True:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    visited = set()
+
+    try:
+        for object in sorted(objects, key=lambda object: object.name):
+            if object.type not in fbxOptions["object_types"]:
+                continue
+
+            sha.update(("%s|%s|%s"%(object.name, object.type, object.parent.name if object.parent else "")).encode("utf-8"))
+            for row in object.matrix_world:
+                sha.update(struct.pack("<4f", *row))
+
+            for slot in object.material_slots:
+                material = slot.material
+                if material == None:
+                    sha.update(b"|")
+                    continue
+
+                sha.update(("|%s"%material.name).encode("utf-8"))
+                hashProperties(sha, material)
+
+                if material.use_nodes == True and material.node_tree != None:
+                    hashNodeTree(sha, material.node_tree, visited)
+
+            if object.type == 'MESH':
+                if depsgraph != None:
+                    evaluated = object.evaluated_get(depsgraph)
+                    try:
+                        hashMesh(sha, object, evaluated.to_mesh())
+                    finally:
+                        evaluated.to_mesh_clear()
+                else:
+                    hashMesh(sha, object, object.data)
+
+            elif object.type == 'ARMATURE':
+                sha.update("|".join("%s<%s"%(bone.name, bone.parent.name if bone.parent else "") for bone in object.data.bones).encode("utf-8"))
+                hashItems(sha, object.data.bones, "head_local", 3, 'f')
+                hashItems(sha, object.data.bones, "tail_local", 3, 'f')
+                for bone in object.data.bones:
+                    for row in bone.matrix_local:
+                        sha.update(struct.pack("<4f", *row))
+
+            elif object.data != None:
+                # Cameras, lights and other types included in object_types
+                hashProperties(sha, object.data)
+
+            if object.animation_data != None and object.animation_data.action != None:
+                for fcurve in object.animation_data.action.fcurves:
+                    sha.update(("%s[%d]"%(fcurve.data_path, fcurve.array_index)).encode("utf-8"))
+                    hashItems(sha, fcurve.keyframe_points, "co", 2, 'f')
+    except (AttributeError, TypeError, ValueError, RuntimeError) as e:
+        print("Could not fingerprint %s, exporting it: %s"%(", ".join(object.name for object in objects), e))
+        return None
+
+    return sha.hexdigest()
+
+# Returns the object with its children, their children and so on
+def getDescendants(object):
+    objects = [object]
+    for child in object.children:
+        objects.extend(getDescendants(child))
+    return objects
+
+# Returns the parts of the scene exported to their own .fbx file: each
+# top-level collection, with the collections it contains, and each object
+# that is not in a collection, with its children. Parts whose names give the
+# same file name, such as "Rock.001" and "Rock_001" or "Rock" and "rock" on
+# Windows, get the start of the hash of their name appended
+def getSplitParts():
+    scene = bpy.context.scene
+    parts = []
+
+    for collection in scene.collection.children:
+        parts.append((bpy.path.clean_name(collection.name), collection.name, list(collection.all_objects)))
+
+    collectionNames = set(name for name, fullName, objects in parts)
+
+    for object in scene.collection.objects:
+        if object.parent != None:
+            continue
+
+        name = bpy.path.clean_name(object.name)
+        if name in collectionNames:
+            name = name + "_object"
+
+        parts.append((name, "object:" + object.name, getDescendants(object)))
+
+    counts = collections.Counter(name.lower() for name, fullName, objects in parts)
+
+    unique = {}
+    for name, fullName, objects in parts:
+        if counts[name.lower()] > 1:
+            name = "%s_%s"%(name, hashlib.sha1(fullName.encode("utf-8")).hexdigest()[:8])
+        unique[name] = objects
+
+    return unique
+
+# Exports each part of the scene to its own .fbx file in a folder named after
+# fileName, parts whose fingerprint did not change are not written again and
+# the files of parts that no longer exist are removed
+def exportSplit(fileName, options, fbxOptions, lods):
+    folder = os.path.splitext(fileName)[0]
+    fingerprintsFile = os.path.join(folder, SPLIT_FINGERPRINTS)
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    previous = {}
+    if os.path.exists(fingerprintsFile):
+        try:
+            with open(fingerprintsFile, "r") as read_file:
+                previous = json.load(read_file)
+        except ValueError:
+            previous = {}
+
+    # Only the objects of each part are selected when it is exported
+    fbxOptions = dict(fbxOptions)
+    fbxOptions["use_selection"] = True
+
+    fingerprints = {}
+    written = 0
+    unchanged = 0
+
+    for name, objects in getSplitParts().items():
+        partFile = os.path.join(folder, name + ".fbx")
+        fingerprints[name] = fingerprintObjects(objects, options, fbxOptions)
+
+        if fingerprints[name] != None and previous.get(name) == fingerprints[name] and os.path.exists(partFile):
+            continue
+
+        bpy.ops.object.select_all(action='DESELECT')
+        for object in objects:
+            # Objects hidden in the view layer can't be selected
+            if object.visible_get():
+                object.select_set(True)
+
+        if writeFBX(partFile, fbxOptions, bpy.context.selected_objects, lods)[0] == True:
+            written += 1
+        else:
+            unchanged += 1
+
+    for name in previous:
+        partFile = os.path.join(folder, name + ".fbx")
+        if name not in fingerprints and os.path.exists(partFile):
+            os.remove(partFile)
+            print("Removed: %s"%partFile)
+
+            removeLevelsOfDetail(partFile, 1)
+
+    # Always written, the caller checks this file to tell the export succeeded
+    temporaryFile = fingerprintsFile + ".tmp"
+    with open(temporaryFile, "w") as write_file:
+        json.dump(fingerprints, write_file, indent=1, sort_keys=True)
+    os.replace(temporaryFile, fingerprintsFile)
+
+    return { "parts": len(fingerprints), "parts_written": written, "parts_unchanged": unchanged }
 
 # Once the .blend file is loaded, this function will select
-# all the objects in Object mode, set Edit mode
+# all the objects in Object mode, cleanup their meshes
 # then export the scene as an FBX file that is compatible
 # with Lumberyard. 
 # 
 # Currently it only exports the MESH.
 #
-def doExport(fileName):
+# The options are the export options passed by the caller, see getFBXOptions
+# and CLEANUP_METHODS
+#
+# Returns the time spent cleaning up the meshes and writing the FBX file,
+# the number of objects, vertices and faces exported, and whether the .fbx
+# file was left as it was because its content did not change.
+#
+def doExport(fileName, options):
     
+    cleanupStartTime = time.time()
+
     if bpy.ops.object.mode_set.poll():
         bpy.ops.object.mode_set(mode='OBJECT')
 
@@ -58,85 +1016,268 @@ def doExport(fileName):
     bpy.ops.object.select_all(action='SELECT')
 
     selection = bpy.context.selected_objects
-    bpy.ops.object.mode_set(mode='EDIT')
 
-    for object in selection:
-        bpy.ops.mesh.select_all(action='SELECT')
-
-        # Cleanup some of the geometry to avoid artifacts
-        bpy.ops.mesh.delete_loose(use_verts=True, use_edges=True, use_faces=False) # Delete loose vertices, edges or faces
-        bpy.ops.mesh.dissolve_degenerate(threshold=0.0001) # Dissolve zero area faces and zero length edges
-        bpy.ops.mesh.normals_make_consistent(inside=False) # Make face and vertex normals point either outside or inside the mesh
-
-        # TODO: Currently I found no benefit to doing any operations on the normals
-        #bpy.ops.mesh.set_normals_from_faces()
-        #bpy.ops.mesh.split_normals()
-        #bpy.ops.mesh.average_normals(average_type='FACE_AREA')
-
-    bpy.ops.export_scene.fbx(   filepath=fileName, 
-                                check_existing=True, 
-                                axis_forward='Y', 
-                                axis_up='Z', 
-                                use_selection=True, 
-                                global_scale=1.0, 
-                                apply_unit_scale=True, 
-                                bake_space_transform=True, 
-                                object_types={'MESH'}, 
-                                use_mesh_modifiers=False, 
-                                use_mesh_modifiers_render=False, 
-                                mesh_smooth_type='EDGE', 
-                                use_mesh_edges=True, 
-                                use_tspace=True, 
-                                use_custom_props=False, 
-                                add_leaf_bones=True, 
-                                primary_bone_axis='Y', 
-                                secondary_bone_axis='X', 
-                                use_armature_deform_only=False, 
-                                armature_nodetype='NULL', 
-                                path_mode='AUTO', 
-                                embed_textures=False, 
-                                batch_mode='OFF', 
-                                use_batch_own_dir=True, 
-                                use_metadata=True 
-                                # filter_glob="*.fbx", 
-                                # version='BIN7400', 
-                                # ui_tab='MAIN', 
-                                # bake_anim=True, 
-                                # bake_anim_use_all_bones=True, 
-                                # bake_anim_use_nla_strips=True, 
-                                # bake_anim_use_all_actions=True, 
-                                # bake_anim_force_startend_keying=True, 
-                                # bake_anim_step=1.0, 
-                                # bake_anim_simplify_factor=1.0, 
-                                # use_anim=True, 
-                                # use_anim_action_all=True, 
-                                # use_default_take=True, 
-                                # use_anim_optimize=True, 
-                                # anim_optimize_precision=6.0, 
-                                )
+    cleanup = options.get("cleanup", "bmesh")
+    if cleanup not in CLEANUP_METHODS:
+        print("Unknown cleanup method %s, using bmesh"%cleanup)
+        cleanup = "bmesh"
+
+    cleanedMeshes = CLEANUP_METHODS[cleanup](selection)
+
+    optimize = options.get("optimize", {})
+    optimizeStats = {}
+
+    if len(optimize) > 0:
+        trianglesBefore = countObjectTriangles(selection)
+        optimizeMeshes(selection, optimize)
+        trianglesAfter = countObjectTriangles(selection)
+
+        optimizeStats = { "triangles_before": trianglesBefore, "triangles_after": trianglesAfter }
+        print("Triangles: %d before optimizing, %d after"%(trianglesBefore, trianglesAfter))
+
+    lods = optimize.get("lods", [])
+
+    writeStartTime = time.time()
+
+    split = options.get("split", "none") == "collections"
+    fbxOptions = getFBXOptions(options)
+
+    textures = options.get("textures", {})
+    textureStats = {}
+    originalPaths = []
+
+    if textures.get("mode", "none") == "copy":
+        exportFolder = os.path.splitext(fileName)[0] if split == True else os.path.dirname(fileName)
+        textureStats, originalPaths = exportTextures(selection, exportFolder, textures)
+        fbxOptions["path_mode"] = 'RELATIVE'
+
+    # The fingerprints of a split export are always written
+    unchanged = False
+
+    splitStats = {}
+    try:
+        if split == True:
+            splitStats = exportSplit(fileName, options, fbxOptions, lods)
+        else:
+            written, lodTriangles = writeFBX(fileName, fbxOptions, selection, lods)
+            unchanged = not written
+
+            if len(lodTriangles) > 0:
+                optimizeStats["lod_triangles"] = lodTriangles
+                print("Triangles of each level of detail: %s"%", ".join(str(count) for count in lodTriangles))
+    finally:
+        for image, filepath in originalPaths:
+            image.filepath = filepath
+
+    writeEndTime = time.time()
                                 
-    view_layer.objects.active = None
+    bpy.context.view_layer.objects.active = None
+
+    meshes = [object.data for object in selection if object.type == 'MESH']
+
+    exportStats = {
+        "timings": {
+            "cleanup": writeStartTime - cleanupStartTime,
+            "write": writeEndTime - writeStartTime
+        },
+        "stats": {
+            "objects": len(selection),
+            "meshes": cleanedMeshes,
+            "vertices": sum(len(mesh.vertices) for mesh in meshes),
+            "faces": sum(len(mesh.polygons) for mesh in meshes)
+        },
+        # The .fbx file kept its previous content and modification time
+        "unchanged": unchanged
+    }
+
+    exportStats["peak_memory"] = peakMemory()
+
+    exportStats["stats"].update(splitStats)
+    exportStats["stats"].update(optimizeStats)
+    exportStats["stats"].update(textureStats)
+
+    return exportStats
+
+# Returns the most memory Blender used since resetPeakMemory() was called, or
+# since it started where that can't be reset, in bytes. None when unknown
+def peakMemory():
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/status", "r") as read_file:
+                for line in read_file:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+
+        elif os.name == "nt":
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", ctypes.c_ulong),
+                            ("PageFaultCount", ctypes.c_ulong),
+                            ("PeakWorkingSetSize", ctypes.c_size_t),
+                            ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t),
+                            ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+            kernel32.K32GetProcessMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]
+
+            if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+
+        else:
+            import resource
+
+            # Bytes on macOS
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    return None
+
+# Starts measuring the peak memory again, so each job of the server and batch
+# modes reports its own. Only Linux can do this, elsewhere the peak since
+# Blender started is reported, which is never less than the job's own
+def resetPeakMemory():
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/clear_refs", "w") as write_file:
+                write_file.write("5")
+        except OSError:
+            pass
+
+# Writes the result of doExport and the load time to the --timings file
+def writeTimings(exportStats, loadTime):
+    if scriptOptions.timings == None:
+        return
 
-    print ("Exported: %s"%fileName)
+    exportStats["timings"]["load"] = loadTime
+    exportStats["script_start"] = scriptStartTime
+    exportStats["load_start"] = loadStartTime
+
+    with open(scriptOptions.timings, "w") as write_file:
+        json.dump(exportStats, write_file)
+
+# Exports the scene that is currently loaded next to the destination
+# passed on the command line
+def exportLoadedFile(loadTime):
+    startTime = time.time()
+
+    # The caller chose the path, see TargetFileForSource in blendyard_utilities.py
+    targetFile = destinationPath
+
+    targetPath = os.path.dirname(targetFile)
+    if not os.path.exists(targetPath):
+        os.makedirs(targetPath)
+
+    print("Starting export: %s"%targetFile)
+    exportStats = doExport(targetFile, exportOptions)
+
+    print("Export time: %.2fs"%(time.time() - startTime))
+
+    writeTimings(exportStats, loadTime)
+
+reloadStartTime = 0
 
 # The load handler will trigger the export
 @persistent
 def load_handler(dummy):
     print("Load Handler:", bpy.data.filepath)
 
-    path, filename = os.path.split(bpy.data.filepath)
+    exportLoadedFile(time.time() - reloadStartTime)
 
-    targetPath = os.path.dirname(destinationPath)
-    targetFile = os.path.join(targetPath, filename.replace(".blend", ".fbx"))
+# Opens the .blend file a second time so that load_handler runs the export
+def reloadAndExport():
+    global reloadStartTime
 
-    if not os.path.exists(targetPath):
-        os.mkdir(targetPath)
+    startTime = time.time()
+    reloadStartTime = startTime
 
-    print("Starting export: %s"%targetFile)
-    doExport(targetFile)
+    # Install the load handler
+    bpy.app.handlers.load_post.append(load_handler)
+
+    # Open the .blend file
+    bpy.ops.wm.open_mainfile(filepath=bpy.data.filepath)
+
+    print("Reload and export time: %.2fs"%(time.time() - startTime))
+
+# Opens the job's source file, replacing the scene that was loaded before,
+# exports it and writes the result to stdout
+def runJob(job):
+    startTime = time.time()
+    response = { "source": job["source"], "target": job["target"], "result": "ok", "script_start": scriptStartTime }
+
+    try:
+        resetPeakMemory()
+
+        bpy.ops.wm.open_mainfile(filepath=job["source"])
+        loadTime = time.time() - startTime
+
+        targetPath = os.path.dirname(job["target"])
+        if not os.path.exists(targetPath):
+            os.makedirs(targetPath)
+
+        print("Starting export: %s"%job["target"])
+        exportStats = doExport(job["target"], job.get("options", exportOptions))
+
+        exportStats["timings"]["load"] = loadTime
+        response.update(exportStats)
+    except Exception:
+        traceback.print_exc()
+        response["result"] = "failed"
+        response["error"] = traceback.format_exc(limit=1)
+
+    response["duration"] = time.time() - startTime
+
+    print(SERVER_RESULT + json.dumps(response))
+    sys.stdout.flush()
+
+# Loads the source file of each job received on stdin and exports it,
+# Blender stays loaded between jobs
+def runServer():
+    print(SERVER_READY)
+    sys.stdout.flush()
+
+    for line in sys.stdin:
+        if len(line.strip()) == 0:
+            continue
+
+        runJob(json.loads(line))
+
+# Exports every job from --batch and --pair one after the other
+def runBatch():
+    jobs = []
+
+    if scriptOptions.batch != None:
+        with open(scriptOptions.batch, "r") as read_file:
+            jobs.extend(json.load(read_file))
+
+    for source, target in scriptOptions.pair or []:
+        jobs.append({ "source": source, "target": target })
+
+    startTime = time.time()
+
+    for job in jobs:
+        runJob(job)
 
-# Install the load handler
-bpy.app.handlers.load_post.append(load_handler)
+    print("Exported %d files in %.2fs"%(len(jobs), time.time() - startTime))
 
-# Open the .blend file
-bpy.ops.wm.open_mainfile(filepath=bpy.data.filepath)
\ No newline at end of file
+if scriptOptions.server:
+    runServer()
+elif scriptOptions.batch != None or scriptOptions.pair != None:
+    runBatch()
+elif scriptOptions.reload:
+    reloadAndExport()
+else:
+    try:
+        exportLoadedFile(scriptStartTime - loadStartTime if loadStartTime > 0 else None)
+    except RuntimeError:
+        traceback.print_exc()
+        print("Direct export failed, reloading %s"%bpy.data.filepath)
+        reloadAndExport()
@@ -0,0 +1,252 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Runs exports for an export farm (see blendyard_farm.py) on this machine.
+#
+# The worker connects to the farm, once for each export it runs at a time,
+# and exports the files it receives with this machine's Blender from the
+# settings. The .blend files are read from the shared source folder, --map
+# replaces the start of the paths sent by the farm with this machine's path
+# for that folder, for example:
+#
+#   python src\blender\farm\blendyard_worker.py --farm buildhost:7620 --jobs 4 --map "D:\Assets=/mnt/assets"
+#
+# The worker reconnects whenever it loses the farm, run it from the root of
+# blendyard.
+
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath('src/blender/utilities'))
+
+import blendyard_utilities
+import blendyard_server
+import blendyard_process
+import blendyard_farm
+
+parser = argparse.ArgumentParser(description='Export .blend files to FBX for an export farm.')
+parser.add_argument('--farm', help='host:port of the export farm', required=True)
+parser.add_argument('--jobs', help='number of exports to run at the same time', type=int, default=1)
+parser.add_argument('--map', help='FARM_PATH=LOCAL_PATH, replaces the start of the source paths sent by the farm, can be repeated', action='append', default=[])
+parser.add_argument('--name', help='name of this worker in the farm messages', default=socket.gethostname())
+parser.add_argument('--settings', help='The .json file that holds the configuration for exporting Blender files to FBX')
+parser.add_argument('--verbose', help='Displays additional information', action='store_true', default=False)
+
+args = parser.parse_args()
+
+settings = blendyard_utilities.ReadSettings(args.settings)
+
+exportScript = os.path.join("src/blender/exporters", "batch_export.py")
+
+# The farm takes the place of the export server on the machine sending the
+# jobs, the worker uses its own export server when enabled in its settings
+exportServer = None
+if settings["general"].get("export_server", 0) != 0:
+    exportServer = blendyard_server.BlenderExportServerPool(converter=settings["general"]["blender_exe"],
+                                                            script=exportScript,
+                                                            max_jobs=settings["general"].get("export_server_max_jobs", 25),
+                                                            timeout=settings["general"].get("export_server_timeout", None),
+                                                            verbose=args.verbose
+                                                            )
+
+# Images are stored once in this cache before being sent with the exports
+textureCache = os.path.join(tempfile.gettempdir(), "blendyard_farm_textures")
+
+# Path prefixes of the farm and their local replacement, the longest first
+pathMaps = []
+for pathMap in args.map:
+    farmPath, separator, localPath = pathMap.partition("=")
+    if separator == "":
+        print("--map must be FARM_PATH=LOCAL_PATH: %s"%pathMap)
+        exit()
+    pathMaps.append((farmPath.replace("\\", "/").rstrip("/"), localPath))
+
+pathMaps.sort(key=lambda pathMap: len(pathMap[0]), reverse=True)
+
+# Returns the local path of a file sent by the farm, the farm may run on
+# another operating system so both separators are accepted and Windows paths
+# are compared without case
+def LocalPath(farmPath):
+
+    path = farmPath.replace("\\", "/")
+
+    for prefix, localPath in pathMaps:
+        caseless = len(prefix) > 1 and prefix[1] == ":"
+        start = path[:len(prefix)]
+
+        if (start.lower() == prefix.lower() if caseless else start == prefix) and path[len(prefix):len(prefix) + 1] in ("", "/"):
+            return os.path.join(localPath, *path[len(prefix):].split("/"))
+
+    return os.path.normpath(path)
+
+# Exports a job into a temporary folder and returns the result message and
+# the files Blender wrote
+def RunJob(job, handle):
+
+    sourceFile = LocalPath(job["source"])
+    workFolder = tempfile.mkdtemp(prefix="blendyard_farm_")
+    startTime = time.time()
+
+    try:
+        if not os.path.isfile(sourceFile):
+            print("%s not found, check the --map option"%sourceFile)
+            return { "type": "result", "result": blendyard_utilities.EXPORT_FAILED, "worker": args.name, "output": "%s: %s not found"%(args.name, sourceFile) }, b""
+
+        # The texture cache of the farm is not reachable from here, and a
+        # cache in the temporary folder would be sent back with the export
+        options = dict(job["options"])
+        if options.get("textures", {}).get("mode", "none") != "none":
+            options["textures"] = dict(options["textures"], cache=textureCache)
+
+        result = blendyard_utilities.InvokeBlenderExporter( converter=settings["general"]["blender_exe"],
+                                                            source_path=os.path.dirname(sourceFile),
+                                                            source_file=sourceFile,
+                                                            destination=workFolder,
+                                                            script=exportScript,
+                                                            verbose=args.verbose,
+                                                            capture_output=True,
+                                                            server=exportServer,
+                                                            options=options,
+                                                            handle=handle
+                                                            )
+
+        message = { "type": "result", "result": result, "worker": args.name, "duration": time.time() - startTime }
+        payload = b""
+
+        if result == blendyard_utilities.EXPORT_OK:
+            message["files"], payload = blendyard_farm.PackFiles(workFolder)
+
+            # The file the farm checks to tell the export succeeded
+            target_file = blendyard_utilities.TargetFileForSource(sourceFile, os.path.dirname(sourceFile), workFolder)
+            exported_file = blendyard_utilities.ExportedFile(target_file, job["options"])
+            message["exported"] = os.path.relpath(exported_file, workFolder).replace(os.sep, "/")
+
+        return message, payload
+    finally:
+        shutil.rmtree(workFolder, ignore_errors=True)
+
+# Runs the jobs of one farm connection, a thread exports the file while this
+# one sends heartbeats and watches for a cancellation. Heartbeats are also
+# sent while waiting for a job so the farm knows this worker is still there
+def ServeJobs(connection, heartbeat):
+
+    while True:
+        received = connection.Receive(timeout=heartbeat)
+
+        if received == None:
+            connection.Send({ "type": "heartbeat" })
+            continue
+
+        message = received[0]
+        if message["type"] != "job":
+            continue
+
+        # Tells the farm the job arrived
+        connection.Send({ "type": "heartbeat" })
+
+        handle = blendyard_process.ExportHandle()
+        outcome = []
+
+        exportThread = threading.Thread(target=lambda: outcome.append(RunJob(message, handle)), daemon=True)
+        exportThread.start()
+
+        lastHeartbeat = time.time()
+
+        while exportThread.is_alive():
+            received = connection.Receive(timeout=min(0.5, heartbeat))
+
+            if received != None and received[0]["type"] == "cancel":
+                print("Cancelling the export of %s"%message["source"])
+                handle.Cancel()
+
+            if time.time() - lastHeartbeat >= heartbeat:
+                connection.Send({ "type": "heartbeat" })
+                lastHeartbeat = time.time()
+
+        if len(outcome) == 0:
+            outcome.append(({ "type": "result", "result": blendyard_utilities.EXPORT_FAILED, "worker": args.name }, b""))
+
+        connection.Send(*outcome[0])
+
+# Keeps one connection to the farm open, reconnecting when it is lost
+def RunWorker(host, port):
+
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+        except OSError as e:
+            if args.verbose == True:
+                print("Could not connect to the export farm %s:%d: %s"%(host, port, e))
+            time.sleep(5)
+            continue
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = blendyard_farm.FarmConnection(sock)
+
+        try:
+            connection.Send({ "type": "hello", "protocol": blendyard_farm.FARM_PROTOCOL, "name": args.name, "token": settings["general"].get("export_farm_token", "") })
+
+            welcome = connection.Receive(timeout=30)
+            if welcome == None or welcome[0]["type"] != "welcome":
+                raise ConnectionError("the farm did not accept this worker")
+
+            print("Connected to the export farm %s:%d"%(host, port))
+            ServeJobs(connection, welcome[0]["heartbeat"])
+        except (OSError, ValueError) as e:
+            print("Lost the export farm %s:%d: %s"%(host, port, e))
+        finally:
+            connection.Close()
+
+        time.sleep(1)
+
+def main():
+
+    host, separator, port = args.farm.rpartition(":")
+    if separator == "":
+        host, port = args.farm, str(blendyard_farm.FARM_PORT)
+
+    print("--------------------------------------------------------")
+    print("Export farm worker %s, %d jobs"%(args.name, args.jobs))
+    print("--------------------------------------------------------\n")
+
+    for index in range(args.jobs):
+        threading.Thread(target=RunWorker, args=(host, int(port)), daemon=True).start()
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+    if exportServer != None:
+        exportServer.Stop()
+
+if __name__== "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# This is a Blender python script.
+# When executed it imports .fbx files and saves each one as a .blend file, it
+# is run by blendyard_utilities.InvokeBlenderImporter.
+#
+# The files to import are passed with --batch, a JSON file holding a list of
+# jobs:
+#   [{"source": "path/to/file.fbx", "target": "path/to/file.blend"}]
+# Each job starts from an empty scene so nothing from the previous file ends
+# up in the next one. The result of each job is written to stdout as a single
+# line starting with SERVER_RESULT, the same way batch_export.py does.
+
+import bpy
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+
+# Must match SERVER_RESULT in blendyard_server.py
+SERVER_RESULT = "BLENDYARD_RESULT "
+
+scriptArgs = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+argParser = argparse.ArgumentParser(prog="batch_import.py")
+argParser.add_argument("--batch", help="JSON file with a list of import jobs to run", required=True)
+argParser.add_argument("--options", help="options passed to Blender's FBX importer as a JSON object", default="{}")
+scriptOptions = argParser.parse_args(scriptArgs)
+
+importOptions = json.loads(scriptOptions.options)
+
+def runJob(job):
+    startTime = time.time()
+    response = { "source": job["source"], "target": job["target"], "result": "ok" }
+
+    try:
+        bpy.ops.wm.read_homefile(use_empty=True)
+
+        bpy.ops.import_scene.fbx(filepath=job["source"], **importOptions)
+
+        targetPath = os.path.dirname(job["target"])
+        if not os.path.exists(targetPath):
+            os.makedirs(targetPath)
+
+        bpy.ops.wm.save_as_mainfile(filepath=job["target"])
+
+        response["objects"] = len(bpy.data.objects)
+        print("Imported: %s"%job["target"])
+    except Exception:
+        traceback.print_exc()
+        response["result"] = "failed"
+        response["error"] = traceback.format_exc(limit=1)
+
+    response["duration"] = time.time() - startTime
+
+    print(SERVER_RESULT + json.dumps(response))
+    sys.stdout.flush()
+
+with open(scriptOptions.batch, "r") as read_file:
+    jobs = json.load(read_file)
+
+batchStartTime = time.time()
+
+for job in jobs:
+    runJob(job)
+
+print("Imported %d files in %.2fs"%(len(jobs), time.time() - batchStartTime))
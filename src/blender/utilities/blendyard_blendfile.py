@@ -0,0 +1,555 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Reads .blend files without starting Blender.
+#
+# A .blend file starts with a header giving the pointer size, the byte order
+# and the version of Blender that saved it. It is followed by a list of
+# blocks, each with a header (code, size, SDNA index, count) and its data.
+# The DNA1 block near the end of the file describes the layout of every
+# struct, so fields can be found whichever version of Blender saved the file.
+#
+# Blender compresses .blend files with gzip before 3.0 and with zstd since,
+# reading zstd compressed files needs the zstandard package.
+
+import os
+import re
+import gzip
+import mmap
+import struct
+import hashlib
+import itertools
+import collections
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLEND_MAGIC = b"BLENDER"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Blocks that are not IDs have a four letter code
+BLOCK_DATA = "DATA"
+BLOCK_DNA = "DNA1"
+BLOCK_END = "ENDB"
+BLOCK_LIBRARY = "LI"
+
+# Placeholder written for each ID linked from a library
+BLOCK_LINKED_ID = "ID"
+
+# Codes of the IDs whose content ends up in the .fbx file: meshes, objects,
+# materials, armatures and actions, as well as shape keys, collections,
+# images, the node groups used by materials and the scenes. Screens,
+# windows, workspaces and the thumbnail are not exported, saving after
+# changing only those gives the same .fbx file
+EXPORTED_BLOCKS = ["ME", "OB", "MA", "AR", "AC", "KE", "GR", "IM", "NT", "SC"]
+
+# Most of a scene is tool settings, the current frame and render settings,
+# only its unit settings (the unit scale) and its master collection, which
+# holds the objects and collections that are exported, are compared
+BLOCK_SCENE = "SC"
+SCENE_FIELDS = ["unit"]
+SCENE_STRUCTS = ["Collection", "CollectionObject", "CollectionChild"]
+
+# Codes of the IDs exported when the object_types FBX option has the type
+OBJECT_TYPE_BLOCKS = {
+    "CAMERA": ["CA"],
+    "LIGHT": ["LA"],
+    "OTHER": ["CU", "MB", "CV"]
+}
+
+BlendBlock = collections.namedtuple("BlendBlock", ["code", "offset", "size", "sdna", "count", "address"])
+
+# Returns the codes of the IDs that end up in the .fbx file with the FBX
+# options of the export, see getFBXOptions in batch_export.py
+def ExportedBlocks(fbxOptions={}):
+
+    codes = list(EXPORTED_BLOCKS)
+
+    for objectType in fbxOptions.get("object_types", []):
+        codes.extend(OBJECT_TYPE_BLOCKS.get(objectType, []))
+
+    return codes
+
+# Returns the content of the file, decompressed when needed. Uncompressed
+# files are memory mapped so blocks that are not used are never read
+def _ReadContent(filePath):
+
+    with open(filePath, "rb") as read_file:
+        magic = read_file.read(4)
+        read_file.seek(0)
+
+        if magic.startswith(BLEND_MAGIC[:4]):
+            if os.fstat(read_file.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(read_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if magic.startswith(GZIP_MAGIC):
+            with gzip.GzipFile(fileobj=read_file) as gzip_file:
+                return gzip_file.read()
+
+        if magic == ZSTD_MAGIC:
+            if zstandard == None:
+                raise ValueError("%s is compressed with zstd, install the zstandard package to read it"%filePath)
+
+            reader = zstandard.ZstdDecompressor().stream_reader(read_file, read_across_frames=True)
+            return b"".join(iter(lambda: reader.read(1024 * 1024), b""))
+
+    raise ValueError("%s is not a .blend file"%filePath)
+
+# Returns the number of elements of a field from its name, "co[3]" has 3
+def _ArrayLength(fieldName):
+
+    length = 1
+    for dimension in re.findall(r"\[(\d+)\]", fieldName):
+        length *= int(dimension)
+
+    return length
+
+# Returns the name of a field without its pointer or array decorations
+def _BareName(fieldName):
+
+    return re.match(r"[\*\(]*(\w+)", fieldName).group(1)
+
+class BlendFile:
+
+    def __init__(self, filePath):
+        self.path = filePath
+        self.content = _ReadContent(filePath)
+
+        # Only read when all the blocks are needed, see Blocks()
+        self.blocks = None
+
+        try:
+            self._ReadHeader()
+            self._ReadDNA()
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            self.Close()
+            raise ValueError("%s is not a valid .blend file: %s"%(filePath, e))
+        except ValueError:
+            self.Close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.Close()
+
+    def Close(self):
+        if isinstance(self.content, mmap.mmap):
+            self.content.close()
+        self.content = b""
+
+    # Most files start with BLENDER_v###, 12 bytes, where _ is - for 8 byte
+    # pointers and v is V for big endian. The newer file format starts with
+    # BLENDER##-##v####, the header size, the file format version and the
+    # Blender version, it always uses 8 byte pointers and larger block headers
+    def _ReadHeader(self):
+        header = bytes(self.content[:17])
+
+        if not header.startswith(BLEND_MAGIC):
+            raise ValueError("%s is not a .blend file"%self.path)
+
+        if header[7:9].isdigit():
+            self.header_size = int(header[7:9])
+            self.pointer_size = 8
+            self.endian = "<" if header[12:13] == b"v" else ">"
+            self.version = int(header[13:17])
+
+            # code, SDNA index, address, size, count
+            self.block_header = struct.Struct(self.endian + "4siQqq")
+            self.block_fields = (0, 3, 1, 4, 2)
+        else:
+            self.header_size = 12
+            self.pointer_size = 8 if header[7:8] == b"-" else 4
+            self.endian = "<" if header[8:9] == b"v" else ">"
+            self.version = int(header[9:12])
+
+            # code, size, address, SDNA index, count
+            self.block_header = struct.Struct(self.endian + ("4siQii" if self.pointer_size == 8 else "4siIii"))
+            self.block_fields = (0, 1, 3, 4, 2)
+
+    # Returns the block whose header starts at the position, None when
+    # the header is not valid
+    def _BlockAt(self, position):
+        headerSize = self.block_header.size
+        if position < self.header_size or position + headerSize > len(self.content):
+            return None
+
+        fields = self.block_header.unpack_from(self.content, position)
+        codeField, sizeField, sdnaField, countField, addressField = self.block_fields
+
+        size = fields[sizeField]
+        if size < 0 or position + headerSize + size > len(self.content):
+            return None
+
+        try:
+            code = fields[codeField].rstrip(b"\0").decode("ascii")
+        except UnicodeDecodeError:
+            return None
+
+        return BlendBlock(code, position + headerSize, size, fields[sdnaField], fields[countField], fields[addressField])
+
+    # Returns every block of the file, only the block headers are read. The
+    # blocks that follow an ID block belong to that ID until the next ID block
+    def Blocks(self):
+        if self.blocks != None:
+            return self.blocks
+
+        blocks = []
+        position = self.header_size
+        while True:
+            block = self._BlockAt(position)
+            if block == None:
+                raise ValueError("%s is truncated or has an invalid block"%self.path)
+
+            if block.code == BLOCK_END:
+                break
+
+            blocks.append(block)
+            position = block.offset + block.size
+
+        self.blocks = blocks
+
+        return blocks
+
+    # Returns the blocks with the code, found by searching the content instead
+    # of walking every block header, which is much faster for large files.
+    # The structure of each block found is checked against the DNA
+    def FindBlocks(self, code, structName):
+        if self.blocks != None:
+            return [block for block in self.blocks if block.code == code]
+
+        blocks = []
+        marker = code.encode("ascii").ljust(4, b"\0")
+        structIndex = self.struct_indices.get(structName)
+
+        position = self.content.find(marker, self.header_size)
+        while position != -1:
+            block = self._BlockAt(position)
+
+            # Block headers are aligned to 4 bytes
+            if ((position - self.header_size) % 4 == 0 and block != None and block.code == code and
+                block.sdna == structIndex and block.size == self.StructSize(block.sdna) * block.count):
+                blocks.append(block)
+
+            position = self.content.find(marker, position + 1)
+
+        return blocks
+
+    # The DNA block is the last block before ENDB, its header is searched for
+    # from the end of the file
+    def _FindDNA(self):
+        marker = BLOCK_DNA.encode("ascii")
+
+        position = self.content.rfind(marker, self.header_size)
+        while position != -1:
+            block = self._BlockAt(position)
+            end = None if block == None else block.offset + block.size
+
+            if block != None and block.code == BLOCK_DNA and self.content[end:end + 4] == BLOCK_END.encode("ascii"):
+                return block
+
+            position = self.content.rfind(marker, self.header_size, position)
+
+        raise ValueError("%s has no DNA"%self.path)
+
+    def _ReadDNA(self):
+        dna = bytes(self.Data(self._FindDNA()))
+        position = 0
+
+        def readTag(tag):
+            nonlocal position
+            position = (position + 3) & ~3
+            if dna[position:position + 4] != tag:
+                raise ValueError("%s has an invalid DNA, %s expected"%(self.path, tag))
+            position += 4
+
+        def readInt():
+            nonlocal position
+            value = struct.unpack_from(self.endian + "i", dna, position)[0]
+            position += 4
+            return value
+
+        def readStrings(count):
+            nonlocal position
+            strings = []
+            for index in range(count):
+                end = dna.index(b"\0", position)
+                strings.append(dna[position:end].decode("ascii"))
+                position = end + 1
+            return strings
+
+        if dna[0:4] != b"SDNA":
+            raise ValueError("%s has an invalid DNA"%self.path)
+        position = 4
+
+        readTag(b"NAME")
+        self.names = readStrings(readInt())
+
+        readTag(b"TYPE")
+        self.types = readStrings(readInt())
+
+        readTag(b"TLEN")
+        self.type_lengths = struct.unpack_from(self.endian + "%dh"%len(self.types), dna, position)
+        position += 2 * len(self.types)
+
+        readTag(b"STRC")
+        structCount = readInt()
+
+        # For each struct index, its type index and its (type, name) fields
+        self.structs = []
+        self.struct_indices = {}
+        for index in range(structCount):
+            typeIndex, fieldCount = struct.unpack_from(self.endian + "hh", dna, position)
+            fields = struct.unpack_from(self.endian + "%dh"%(2 * fieldCount), dna, position + 4)
+            position += 4 + 4 * fieldCount
+
+            self.structs.append((typeIndex, [(fields[i], fields[i + 1]) for i in range(0, len(fields), 2)]))
+            self.struct_indices[self.types[typeIndex]] = index
+
+        self.layouts = {}
+        self.pointer_spans = {}
+        self.pointer_structs = {}
+
+    # Returns the data of a block without copying it
+    def Data(self, block):
+        return memoryview(self.content)[block.offset:block.offset + block.size]
+
+    def StructName(self, sdnaIndex):
+        return self.types[self.structs[sdnaIndex][0]]
+
+    def StructSize(self, sdnaIndex):
+        return self.type_lengths[self.structs[sdnaIndex][0]]
+
+    # Returns the fields of a struct as { name: (offset, size, type, full name) }
+    def Layout(self, structName):
+        if structName in self.layouts:
+            return self.layouts[structName]
+
+        if structName not in self.struct_indices:
+            raise ValueError("%s has no %s struct"%(self.path, structName))
+
+        layout = {}
+        offset = 0
+        for typeIndex, nameIndex in self.structs[self.struct_indices[structName]][1]:
+            fieldName = self.names[nameIndex]
+
+            if fieldName.startswith("*") or fieldName.startswith("(*"):
+                size = self.pointer_size * _ArrayLength(fieldName)
+            else:
+                size = self.type_lengths[typeIndex] * _ArrayLength(fieldName)
+
+            layout[_BareName(fieldName)] = (offset, size, self.types[typeIndex], fieldName)
+            offset += size
+
+        self.layouts[structName] = layout
+
+        return layout
+
+    # Returns the (offset, size) of every pointer in a struct, including the
+    # pointers of the structs it contains. Pointers are memory addresses that
+    # change every time a file is saved
+    def PointerSpans(self, sdnaIndex):
+        if sdnaIndex in self.pointer_spans:
+            return self.pointer_spans[sdnaIndex]
+
+        spans = []
+        for offset, size, typeName, fieldName in self.Layout(self.StructName(sdnaIndex)).values():
+            if fieldName.startswith("*") or fieldName.startswith("(*"):
+                spans.append((offset, size))
+            elif typeName in self.struct_indices:
+                innerIndex = self.struct_indices[typeName]
+                innerSize = self.StructSize(innerIndex)
+                for element in range(_ArrayLength(fieldName)):
+                    for innerOffset, innerSpan in self.PointerSpans(innerIndex):
+                        spans.append((offset + element * innerSize + innerOffset, innerSpan))
+
+        self.pointer_spans[sdnaIndex] = spans
+
+        return spans
+
+    # Returns a struct that unpacks only the pointers of a struct of the DNA
+    def PointerStruct(self, sdnaIndex):
+        if sdnaIndex in self.pointer_structs:
+            return self.pointer_structs[sdnaIndex]
+
+        format = self.endian
+        position = 0
+        for offset, size in sorted(self.PointerSpans(sdnaIndex)):
+            format += "%dx"%(offset - position) + ("Q" if self.pointer_size == 8 else "I") * (size // self.pointer_size)
+            position = offset + size
+        format += "%dx"%(self.StructSize(sdnaIndex) - position)
+
+        self.pointer_structs[sdnaIndex] = struct.Struct(format)
+
+        return self.pointer_structs[sdnaIndex]
+
+    # Returns a string field of a block, up to its first null character
+    def ReadString(self, block, structName, fieldName):
+        offset, size = self.Layout(structName)[fieldName][0:2]
+        value = bytes(self.Data(block)[offset:offset + size])
+
+        return value.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+    # Returns the name of an ID block, such as OBCube or MECube
+    def IDName(self, block):
+        return self.ReadString(block, "ID", "name")
+
+    # Returns the paths of the libraries linked by this file as they are
+    # stored, paths relative to the file start with //
+    def Libraries(self):
+        libraries = []
+
+        if "Library" not in self.struct_indices:
+            return libraries
+
+        # The path is called name before Blender 2.93
+        fieldName = "name" if "name" in self.Layout("Library") else "filepath"
+
+        for block in self.FindBlocks(BLOCK_LIBRARY, "Library"):
+            libraries.append(self.ReadString(block, "Library", fieldName))
+
+        return libraries
+
+    # Returns the absolute paths of the libraries linked by this file
+    def LibraryPaths(self):
+        return [ResolvePath(self.path, library) for library in self.Libraries()]
+
+    # Returns the ID blocks with the blocks that belong to them
+    def IDBlocks(self):
+        idBlocks = []
+
+        for block in self.Blocks():
+            if len(block.code) <= 2:
+                idBlocks.append((block, []))
+            elif block.code == BLOCK_DATA and len(idBlocks) > 0:
+                idBlocks[-1][1].append(block)
+
+        return idBlocks
+
+    # Returns the content of a block with its pointers set to zero, followed
+    # by the names of the IDs its pointers refer to. idNames maps the address
+    # of every ID block to its name, so pointing at another ID changes the
+    # content even though addresses change on every save
+    def _StableData(self, block, idNames):
+        data = self.Data(block)
+
+        if block.sdna <= 0 or block.sdna >= len(self.structs) or block.count <= 0:
+            return data
+
+        structSize = self.StructSize(block.sdna)
+        spans = self.PointerSpans(block.sdna)
+
+        # Raw arrays are written with an SDNA index that does not match their size
+        if len(spans) == 0 or structSize * block.count != block.size:
+            return data
+
+        pointerStruct = self.PointerStruct(block.sdna)
+        references = []
+
+        # Most blocks only point at their own data, not at other IDs
+        if not idNames.keys().isdisjoint(itertools.chain.from_iterable(pointerStruct.iter_unpack(data))):
+            for element, addresses in enumerate(pointerStruct.iter_unpack(data)):
+                for slot, address in enumerate(addresses):
+                    if address in idNames:
+                        references.append("%d.%d:%s"%(element, slot, idNames[address]))
+
+        stable = bytearray(data)
+        for offset, size in spans:
+            for byte in range(offset, offset + size):
+                stable[byte::structSize] = bytes(block.count)
+
+        stable.extend("\0".join(references).encode("utf-8"))
+
+        return stable
+
+    # Adds the SCENE_FIELDS of a scene and its SCENE_STRUCTS data blocks to
+    # the hash
+    def _HashScene(self, sha, idBlock, dataBlocks, idNames):
+        if "Scene" not in self.struct_indices or idBlock.sdna != self.struct_indices["Scene"]:
+            return
+
+        layout = self.Layout("Scene")
+        data = self.Data(idBlock)
+
+        for fieldName in SCENE_FIELDS:
+            if fieldName in layout:
+                offset, size = layout[fieldName][0:2]
+                sha.update(fieldName.encode("ascii"))
+                sha.update(data[offset:offset + size])
+
+        structIndices = set(self.struct_indices[name] for name in SCENE_STRUCTS if name in self.struct_indices)
+
+        for block in dataBlocks:
+            if block.sdna in structIndices and block.size == self.StructSize(block.sdna) * block.count:
+                sha.update(struct.pack("<4sii", block.code.encode("ascii"), block.sdna, block.count))
+                sha.update(self._StableData(block, idNames))
+
+    # Returns a hash of the content of each ID, ignoring memory addresses, so
+    # saving the same data twice gives the same fingerprints. codes limits the
+    # IDs to the given block codes, such as ["ME", "OB"]
+    def Fingerprints(self, codes=None):
+        fingerprints = {}
+
+        idBlocks = self.IDBlocks()
+        idNames = {}
+        for idBlock, dataBlocks in idBlocks:
+            idNames[idBlock.address] = idBlock.code + ":" + self.IDName(idBlock)
+
+        for idBlock, dataBlocks in idBlocks:
+            if codes != None and idBlock.code not in codes:
+                continue
+
+            sha = hashlib.sha1()
+
+            if idBlock.code == BLOCK_SCENE:
+                self._HashScene(sha, idBlock, dataBlocks, idNames)
+            else:
+                for block in [idBlock] + dataBlocks:
+                    sha.update(struct.pack("<4sii", block.code.encode("ascii"), block.sdna, block.count))
+                    sha.update(self._StableData(block, idNames))
+
+            name = self.IDName(idBlock)
+            if idBlock.code == BLOCK_LINKED_ID:
+                name = BLOCK_LINKED_ID + ":" + name
+
+            fingerprints[name] = sha.hexdigest()
+
+        return fingerprints
+
+# Returns the absolute path of a path stored in a .blend file, paths starting
+# with // are relative to the folder of the .blend file
+def ResolvePath(blendFile, path):
+
+    if path.startswith("//"):
+        path = os.path.join(os.path.dirname(os.path.abspath(blendFile)), path[2:])
+
+    # The file may have been saved on another platform
+    path = path.replace("\\", os.path.sep).replace("/", os.path.sep)
+
+    return os.path.normpath(os.path.abspath(path))
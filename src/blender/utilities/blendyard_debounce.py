@@ -0,0 +1,141 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Groups file change events so each saved file is exported once.
+#
+# Saving a file in Blender fires several events, and a branch switch or a
+# sync can touch hundreds of files at once. The DebounceScheduler holds the
+# events for each path until that path has been quiet for `window` seconds.
+# When at least `burst_size` paths are pending, the paths that are ready wait
+# for the other pending paths to become quiet too, so a burst of changes is
+# handed over as a single batch, but never longer than `max_delay` seconds
+# after their first event. Outside of bursts, a path is handed over as soon
+# as it is quiet so unrelated saves don't delay each other.
+
+import time
+import threading
+
+class DebounceScheduler:
+
+    def __init__(self, window, max_delay, callback, burst_size=10):
+        self.window = window
+        self.max_delay = max_delay
+        self.callback = callback
+        self.burst_size = burst_size
+
+        # path -> time of its last event
+        self.pending = {}
+        # path -> time of its first event since the last batch
+        self.first_seen = {}
+
+        # Number of events received, and how many of them were merged with
+        # an event of the same path that was still pending
+        self.events = 0
+        self.coalesced = 0
+        self.last_event = None
+
+        self.running = False
+        self.thread = None
+        self.condition = threading.Condition()
+
+    def Start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._Run, daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+        if self.thread != None:
+            self.thread.join()
+
+    # Records an event for the path, this only takes a lock so it is
+    # safe to call from the observer's event thread
+    def Touch(self, path):
+        now = time.time()
+
+        with self.condition:
+            self.events += 1
+            self.last_event = now
+            if path in self.pending:
+                self.coalesced += 1
+            self.pending[path] = now
+            self.first_seen.setdefault(path, now)
+            self.condition.notify()
+
+    def Stats(self):
+        with self.condition:
+            return {
+                "pending": len(self.pending),
+                "events": self.events,
+                "coalesced": self.coalesced,
+                "last_event": self.last_event
+            }
+
+    # Returns the paths that are ready to be handed over, or the time to
+    # wait before checking again
+    def _Collect(self, now):
+        ready = [path for path, lastEvent in self.pending.items() if now - lastEvent >= self.window]
+
+        if len(ready) > 0:
+            oldest = min(self.first_seen[path] for path in ready)
+
+            if len(ready) == len(self.pending) or len(self.pending) < self.burst_size or now - oldest >= self.max_delay:
+                for path in ready:
+                    del self.pending[path]
+                    del self.first_seen[path]
+
+                ready.sort()
+                return ready, None
+
+        # Check again once the next path becomes quiet or the ready ones
+        # have waited for too long
+        wait = min(lastEvent + self.window for lastEvent in self.pending.values() if now - lastEvent < self.window) - now
+
+        if len(ready) > 0:
+            wait = min(wait, oldest + self.max_delay - now)
+
+        return None, max(wait, 0.01)
+
+    def _Run(self):
+        while True:
+            with self.condition:
+                batch = None
+
+                while self.running and batch == None:
+                    if len(self.pending) == 0:
+                        self.condition.wait()
+                        continue
+
+                    batch, wait = self._Collect(time.time())
+
+                    if batch == None:
+                        self.condition.wait(wait)
+
+                if not self.running:
+                    return
+
+            self.callback(batch)
@@ -0,0 +1,228 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Keeps track of the libraries each .blend file links, so the files that
+# link a library can be exported again when the library is saved.
+#
+# The libraries are read from the .blend files without Blender (see
+# blendyard_blendfile.py) and cached in DEPENDENCY_FILE in the target folder
+# along with the size and modification time of each file, files that did
+# not change since are not read again.
+
+import os
+import json
+import threading
+
+import blendyard_utilities
+import blendyard_blendfile
+
+DEPENDENCY_FILE = ".blendyard_dependencies.json"
+DEPENDENCY_VERSION = 1
+
+# Returns the key of a file in the index, paths are not case sensitive on Windows
+def _Key(filePath):
+
+    return os.path.normcase(os.path.abspath(filePath))
+
+class DependencyIndex:
+
+    def __init__(self, folder, verbose=False):
+        self.folder = folder
+        self.path = os.path.join(folder, DEPENDENCY_FILE)
+        self.verbose = verbose
+
+        # For each file, its path, size, modification time and libraries
+        self.files = {}
+
+        # For each library, the keys of the files that link it
+        self.dependents = {}
+
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        self.Load()
+
+    def Load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as read_file:
+                index = json.load(read_file)
+        except (OSError, ValueError) as e:
+            print("Ignoring unreadable dependency index %s: %s"%(self.path, e))
+            return
+
+        if index.get("version") != DEPENDENCY_VERSION:
+            return
+
+        with self.lock:
+            for key, entry in index.get("files", {}).items():
+                self._Set(key, entry)
+
+    # Writes to a temporary file first so an interrupted save does not
+    # leave a corrupt index behind
+    def Save(self):
+        with self.lock:
+            if self.dirty == False:
+                return
+
+            index = { "version": DEPENDENCY_VERSION, "files": self.files }
+            self.dirty = False
+
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+
+            temporaryPath = self.path + ".tmp"
+            with open(temporaryPath, "w") as write_file:
+                json.dump(index, write_file, indent=1, sort_keys=True)
+
+            os.replace(temporaryPath, self.path)
+
+    # Replaces the entry of a file and its place in the reverse index,
+    # the lock must be held
+    def _Set(self, key, entry):
+        previous = self.files.pop(key, None)
+        if previous != None:
+            for library in previous["libraries"]:
+                dependents = self.dependents.get(_Key(library))
+                if dependents != None:
+                    dependents.discard(key)
+
+        if entry == None:
+            return
+
+        self.files[key] = entry
+        for library in entry["libraries"]:
+            self.dependents.setdefault(_Key(library), set()).add(key)
+
+    # Reads the libraries of a file unless its size and modification time
+    # match the index, returns its entry or None when the file does not exist
+    def Update(self, filePath, statbuf=None):
+        key = _Key(filePath)
+
+        if statbuf == None:
+            try:
+                statbuf = os.stat(filePath)
+            except OSError:
+                statbuf = None
+
+        with self.lock:
+            entry = self.files.get(key)
+
+            if statbuf == None:
+                if entry != None:
+                    self._Set(key, None)
+                    self.dirty = True
+                return None
+
+            if entry != None and entry["size"] == statbuf.st_size and entry["mtime"] == statbuf.st_mtime:
+                return entry
+
+        # Files that can't be read, such as files being written, are
+        # recorded without libraries and read again once they change
+        try:
+            with blendyard_blendfile.BlendFile(filePath) as blendFile:
+                libraries = blendFile.LibraryPaths()
+        except (OSError, ValueError) as e:
+            if self.verbose == True:
+                print("Could not read the libraries of %s: %s"%(filePath, e))
+            libraries = []
+
+        entry = { "path": os.path.abspath(filePath), "size": statbuf.st_size, "mtime": statbuf.st_mtime, "libraries": libraries }
+
+        with self.lock:
+            self._Set(key, entry)
+            self.dirty = True
+
+        return entry
+
+    # Updates the index for every .blend file in the folder and forgets the
+    # files that were removed, returns the number of files that were read.
+    # entries are the (path, os.stat() result) of the files in the folder
+    # when they were already listed, see blendyard_utilities.ScanBlendFiles()
+    def Scan(self, folder, entries=None):
+        folderKey = os.path.join(_Key(folder), "")
+        found = set()
+        read = 0
+
+        if entries == None:
+            entries = blendyard_utilities.ScanBlendFiles(folder)
+
+        for filePath, statbuf in entries:
+            key = _Key(filePath)
+            found.add(key)
+
+            with self.lock:
+                entry = self.files.get(key)
+
+            if entry == None or entry["size"] != statbuf.st_size or entry["mtime"] != statbuf.st_mtime:
+                self.Update(filePath, statbuf)
+                read += 1
+
+        with self.lock:
+            removed = [key for key in self.files if key.startswith(folderKey) and key not in found]
+            for key in removed:
+                self._Set(key, None)
+                self.dirty = True
+
+        return read
+
+    # Returns the libraries linked by the file, directly or through other
+    # libraries, the entries of files that changed are read again
+    def Libraries(self, filePath):
+        libraries = []
+        visited = set([_Key(filePath)])
+        pending = [filePath]
+
+        while len(pending) > 0:
+            entry = self.Update(pending.pop())
+            if entry == None:
+                continue
+
+            for library in entry["libraries"]:
+                if _Key(library) not in visited:
+                    visited.add(_Key(library))
+                    libraries.append(library)
+                    pending.append(library)
+
+        return libraries
+
+    # Returns the files that link the library, directly or through other
+    # libraries. Only the index is used, no file is read
+    def Dependents(self, libraryPath):
+        dependents = []
+
+        with self.lock:
+            visited = set([_Key(libraryPath)])
+            pending = [_Key(libraryPath)]
+
+            while len(pending) > 0:
+                for key in self.dependents.get(pending.pop(), ()):
+                    if key not in visited:
+                        visited.add(key)
+                        dependents.append(self.files[key]["path"])
+                        pending.append(key)
+
+        return dependents
@@ -0,0 +1,472 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Spreads exports over several machines.
+#
+# A BlenderExportFarm listens on a TCP port and takes the place of the export
+# server (see blendyard_server.py): InvokeBlenderExporter() hands it each
+# export and it waits for a worker to run it. Workers (see
+# src/blender/farm/blendyard_worker.py) connect to it, one connection per
+# export they can run at a time, and receive one job at a time. A worker
+# exports the .blend file with its own Blender into a temporary folder and
+# sends back every file the export wrote, which the farm writes next to the
+# target file.
+#
+# The .blend files are read by the workers from a shared folder, the source
+# path of each job is remapped to the worker's own path for that folder.
+#
+# Workers send a heartbeat every `heartbeat` seconds. A worker that
+# disconnects or stays silent for three heartbeats is dropped and its job is
+# sent to another worker, up to `retries` times. A job only counts as tried
+# once the worker it was sent to answered.
+#
+# Without a token the farm only accepts workers running on the same machine,
+# set export_farm_token to accept workers from other machines.
+#
+# Messages are a JSON header followed by an optional binary payload, both
+# preceded by their length.
+
+import os
+import hmac
+import json
+import time
+import queue
+import socket
+import struct
+import threading
+
+FARM_PORT = 7620
+FARM_PROTOCOL = 1
+
+# Header and payload lengths preceding every message
+FRAME = struct.Struct(">II")
+
+# Larger messages are refused, a worker that has not said hello yet can only
+# send a header
+MAX_HEADER = 1 << 20
+MAX_PAYLOAD = 1 << 31
+
+# How long (in seconds) exports wait for a worker to connect when the farm
+# has none, workers retry connecting every 5 seconds
+WORKER_GRACE = 15.0
+
+# Written in the folder of an export split into collections, must match
+# SPLIT_FINGERPRINTS in batch_export.py
+SPLIT_FINGERPRINTS = ".blendyard_collections.json"
+
+# One end of a connection between the farm and a worker, only one thread
+# reads from it
+class FarmConnection:
+
+    def __init__(self, sock, max_payload=MAX_PAYLOAD):
+        self.sock = sock
+        self.max_payload = max_payload
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+
+    def Send(self, message, payload=b""):
+        header = json.dumps(message).encode("utf-8")
+
+        with self.lock:
+            self.sock.sendall(FRAME.pack(len(header), len(payload)) + header)
+            if len(payload) > 0:
+                self.sock.sendall(payload)
+
+    # Returns the next (message, payload), or None when nothing arrived
+    # within timeout seconds, a message cut by a timeout is kept for the
+    # next call. Raises ConnectionError when the other end disconnected and
+    # ValueError when the message is larger than allowed
+    def Receive(self, timeout=None):
+        deadline = None if timeout == None else time.time() + timeout
+
+        while True:
+            if len(self.buffer) >= FRAME.size:
+                headerSize, payloadSize = FRAME.unpack_from(self.buffer)
+                frameSize = FRAME.size + headerSize + payloadSize
+
+                if headerSize > MAX_HEADER or payloadSize > self.max_payload:
+                    raise ValueError("message of %d bytes is too large"%(headerSize + payloadSize))
+
+                if len(self.buffer) >= frameSize:
+                    message = json.loads(bytes(self.buffer[FRAME.size:FRAME.size + headerSize]).decode("utf-8"))
+                    payload = bytes(self.buffer[FRAME.size + headerSize:frameSize])
+                    del self.buffer[:frameSize]
+                    return message, payload
+
+            if deadline == None:
+                self.sock.settimeout(None)
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.sock.settimeout(remaining)
+
+            try:
+                data = self.sock.recv(1 << 20)
+            except socket.timeout:
+                return None
+
+            if len(data) == 0:
+                raise ConnectionError("connection closed")
+
+            self.buffer.extend(data)
+
+    def Close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+# Returns the files of an export as a message listing their names and sizes
+# and a payload holding their content, names are relative to the folder and
+# use / as separator
+def PackFiles(folder):
+
+    files = []
+    contents = []
+
+    for root, folders, names in os.walk(folder):
+        for name in sorted(names):
+            filePath = os.path.join(root, name)
+
+            with open(filePath, "rb") as read_file:
+                content = read_file.read()
+
+            files.append({ "name": os.path.relpath(filePath, folder).replace(os.sep, "/"), "size": len(content) })
+            contents.append(content)
+
+    return files, b"".join(contents)
+
+# Returns the path in the folder of a file name sent by a worker, raises
+# ValueError for names that would end up outside of the folder
+def UnpackedPath(folder, name):
+
+    parts = name.split("/")
+    if "\\" in name or ":" in name or name.startswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError("invalid file name %s"%name)
+
+    filePath = os.path.join(folder, *parts)
+
+    # Links in the folder may lead elsewhere
+    realFolder = os.path.realpath(folder)
+    if os.path.isabs(os.path.join(*parts)) or os.path.commonpath([realFolder, os.path.realpath(filePath)]) != realFolder:
+        raise ValueError("invalid file name %s"%name)
+
+    return filePath
+
+# Writes the files sent by a worker into the folder, each file is written to a
+# temporary file first so readers never see part of it. Files that already
+# have the same content are left untouched, their names are returned
+def UnpackFiles(folder, files, payload):
+
+    offset = 0
+    unchanged = []
+
+    # Nothing is written when any of the names is invalid
+    filePaths = [UnpackedPath(folder, entry["name"]) for entry in files]
+
+    for entry, filePath in zip(files, filePaths):
+        content = payload[offset:offset + entry["size"]]
+        offset += entry["size"]
+
+        if os.path.isfile(filePath) and os.path.getsize(filePath) == len(content):
+            with open(filePath, "rb") as read_file:
+                if read_file.read() == content:
+                    unchanged.append(entry["name"])
+                    continue
+
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+
+        # Results for the same target may be written by several threads,
+        # when an export was superseded, each one uses its own file
+        temporaryPath = "%s.%d.%d.blendyard.tmp"%(filePath, os.getpid(), threading.get_ident())
+        try:
+            with open(temporaryPath, "wb") as write_file:
+                write_file.write(content)
+
+            os.replace(temporaryPath, filePath)
+        finally:
+            if os.path.exists(temporaryPath):
+                os.remove(temporaryPath)
+
+    return unchanged
+
+# A worker exports into an empty folder and sends every file of the export,
+# the .fbx files of collections that no longer exist are removed from the
+# folders of split exports. Returns the names of the removed files
+def RemoveStaleParts(folder, files):
+
+    sent = set(entry["name"] for entry in files)
+    removed = []
+
+    for name in sent:
+        if name.split("/")[-1] != SPLIT_FINGERPRINTS:
+            continue
+
+        partsFolder = os.path.dirname(name)
+        localFolder = UnpackedPath(folder, partsFolder) if partsFolder != "" else folder
+
+        for fileName in os.listdir(localFolder):
+            partName = fileName if partsFolder == "" else partsFolder + "/" + fileName
+
+            if fileName.lower().endswith(".fbx") and partName not in sent and os.path.isfile(os.path.join(localFolder, fileName)):
+                os.remove(os.path.join(localFolder, fileName))
+                removed.append(partName)
+
+    return removed
+
+# An export waiting for, or running on, a worker
+class FarmJob:
+
+    def __init__(self, sourceFile, targetFile, options):
+        self.message = { "type": "job", "source": os.path.abspath(sourceFile), "options": options }
+        self.target = targetFile
+        self.attempts = 0
+        self.response = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def Complete(self, response):
+        self.response = response
+        self.done.set()
+
+class BlenderExportFarm:
+
+    # Listens on every interface when a token is set, and only on this
+    # machine otherwise, unless host is given
+    def __init__(self, port=FARM_PORT, host=None, retries=2, heartbeat=5.0, token="", timeout=None, verbose=False):
+        self.port = port
+        self.timeout = timeout
+        self.host = host
+        if self.host == None:
+            self.host = "" if len(token) > 0 else "127.0.0.1"
+        self.retries = retries
+        self.heartbeat = heartbeat
+        self.token = token
+        self.verbose = verbose
+
+        self.jobs = queue.Queue()
+        self.listener = None
+        self.connections = []
+        self.running = False
+        self.lock = threading.Lock()
+
+    def Start(self):
+        self.listener = socket.create_server((self.host, self.port))
+        self.running = True
+        self.last_worker = time.time()
+
+        threading.Thread(target=self._Accept, daemon=True).start()
+
+        print("Export farm listening on port %d"%self.listener.getsockname()[1])
+
+        if len(self.token) == 0 and self.host in ("", "0.0.0.0", "::"):
+            print("Export farm has no export_farm_token, any machine on the network can connect as a worker")
+        elif len(self.token) == 0:
+            print("Export farm only accepts workers from %s, set export_farm_token to accept workers from other machines"%self.host)
+
+    def Stop(self):
+        self.running = False
+
+        if self.listener != None:
+            self.listener.close()
+            self.listener = None
+
+        with self.lock:
+            connections = list(self.connections)
+
+        for connection in connections:
+            connection.Close()
+
+    def _Accept(self):
+        while self.running:
+            try:
+                sock, address = self.listener.accept()
+            except OSError:
+                return
+
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._Serve, args=(FarmConnection(sock, max_payload=0), address), daemon=True).start()
+
+    # Sends jobs to one worker connection until it disconnects
+    def _Serve(self, connection, address):
+        try:
+            hello = connection.Receive(timeout=self.heartbeat * 3)
+        except (OSError, ValueError):
+            hello = None
+
+        if (hello == None or hello[0].get("type") != "hello" or hello[0].get("protocol") != FARM_PROTOCOL or
+            not hmac.compare_digest(str(hello[0].get("token", "")).encode("utf-8"), self.token.encode("utf-8"))):
+            print("Export farm rejected a worker from %s"%address[0])
+            connection.Close()
+            return
+
+        worker = "%s (%s)"%(hello[0].get("name", ""), address[0])
+        connection.max_payload = MAX_PAYLOAD
+
+        try:
+            connection.Send({ "type": "welcome", "heartbeat": self.heartbeat })
+        except OSError:
+            connection.Close()
+            return
+
+        with self.lock:
+            self.connections.append(connection)
+
+        if self.verbose == True:
+            print("Export farm worker connected: %s"%worker)
+
+        job = None
+        lastMessage = time.time()
+
+        try:
+            while self.running:
+                try:
+                    job = self.jobs.get(timeout=min(1.0, self.heartbeat))
+                except queue.Empty:
+                    job = None
+
+                # Idle workers send heartbeats too, a worker that is gone is
+                # found out before a job is sent to it
+                while connection.Receive(timeout=0.01) != None:
+                    lastMessage = time.time()
+
+                if time.time() - lastMessage > self.heartbeat * 3:
+                    raise TimeoutError("no heartbeat for %.0f seconds"%(time.time() - lastMessage))
+
+                if job == None:
+                    continue
+
+                # Cancelled while it was waiting for a worker
+                if job.cancelled == True:
+                    job.Complete(None)
+                    job = None
+                    continue
+
+                connection.Send(job.message)
+
+                response = self._WaitForResult(connection, job)
+                job.Complete(response)
+                job = None
+                lastMessage = time.time()
+        except (OSError, ValueError) as e:
+            print("Export farm lost worker %s: %s"%(worker, e))
+        finally:
+            with self.lock:
+                if connection in self.connections:
+                    self.connections.remove(connection)
+                self.last_worker = time.time()
+
+            connection.Close()
+
+            if job != None:
+                self._Retry(job)
+
+    # Waits for the worker to send the result of the job, forwards a
+    # cancellation and writes the files of a successful export
+    def _WaitForResult(self, connection, job):
+        lastMessage = time.time()
+        cancelSent = False
+        answered = False
+
+        while True:
+            if job.cancelled == True and cancelSent == False:
+                connection.Send({ "type": "cancel" })
+                cancelSent = True
+
+            received = connection.Receive(timeout=min(1.0, self.heartbeat))
+
+            if received == None:
+                if time.time() - lastMessage > self.heartbeat * 3:
+                    raise TimeoutError("no heartbeat for %.0f seconds"%(time.time() - lastMessage))
+                continue
+
+            message, payload = received
+            lastMessage = time.time()
+
+            # The worker answered, losing it from now on uses up a retry
+            if answered == False:
+                job.attempts += 1
+                answered = True
+
+            if message["type"] != "result":
+                continue
+
+            unchanged = []
+            if message["result"] == "ok":
+                unchanged = UnpackFiles(os.path.dirname(job.target), message["files"], payload)
+
+                for name in RemoveStaleParts(os.path.dirname(job.target), message["files"]):
+                    print("Removed: %s"%os.path.join(os.path.dirname(job.target), name))
+            elif message.get("output"):
+                print(message["output"])
+
+            # The file the exporter checks was not written, see
+            # blendyard_utilities.ExportWritten()
+            return {
+                "result": message["result"],
+                "worker": message.get("worker", ""),
+                "duration": message.get("duration", 0),
+                "unchanged": message.get("exported") in unchanged
+            }
+
+    # A job whose worker was lost goes back to the queue unless it was
+    # already tried too many times
+    def _Retry(self, job):
+        if job.cancelled == False and job.attempts <= self.retries:
+            print("Export farm retrying %s"%job.message["source"])
+            self.jobs.put(job)
+        else:
+            job.Complete(None)
+
+    # Exports a single file on a worker, takes the same arguments as
+    # BlenderExportServer.Export(). Returns the result reported by the
+    # worker, or None when no worker could export it, it was cancelled, it
+    # took longer than the timeout or the farm has had no worker for
+    # WORKER_GRACE seconds
+    def Export(self, sourceFile, targetFile, options={}, handle=None):
+        job = FarmJob(sourceFile, targetFile, options)
+        self.jobs.put(job)
+        startTime = time.time()
+
+        while not job.done.wait(0.5):
+            if handle != None and handle.IsCancelled():
+                job.cancelled = True
+
+            with self.lock:
+                noWorkers = len(self.connections) == 0 and time.time() - self.last_worker > WORKER_GRACE
+
+            if noWorkers == True:
+                print("Export farm has no worker, %s was not exported"%sourceFile)
+            elif self.timeout != None and self.timeout > 0 and time.time() - startTime > self.timeout:
+                print("Export farm timed out exporting %s after %.0f seconds"%(sourceFile, time.time() - startTime))
+            else:
+                continue
+
+            # A worker exporting it is told to stop, and it is dropped if it
+            # is still waiting for a worker
+            job.cancelled = True
+            return None
+
+        return job.response
@@ -0,0 +1,261 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Keeps track of the .blend files that were exported, so files whose content
+# and export settings have not changed since their last export are skipped.
+#
+# The manifest is saved as MANIFEST_FILE in the target folder, for each
+# exported .fbx file it records the content hash of its source .blend file,
+# the hash of the exporter script and the hash of the export options.
+# The size and modification time of the source are recorded as well so
+# unchanged files don't need to be hashed again.
+#
+# A hash of the data blocks that are exported (see ExportedBlocks() in
+# blendyard_blendfile.py) is recorded too. When only the viewport, the UI
+# layout or the thumbnail changed, the source is hashed differently but
+# that hash is the same and the export is skipped.
+#
+# When a DependencyIndex is given (see blendyard_dependencies.py) the size and
+# modification time of the libraries linked by the source are recorded too,
+# so saving a library exports the files that link it again.
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+import blendyard_blendfile
+
+MANIFEST_FILE = ".blendyard_manifest.json"
+MANIFEST_VERSION = 1
+
+# The manifest is written at most this often (in seconds) while exporting,
+# Save() must be called once all the exports are done
+SAVE_INTERVAL = 5
+
+# Returns the SHA1 of the file's content as a hex string
+def HashFile(filePath):
+
+    sha = hashlib.sha1()
+
+    with open(filePath, "rb") as read_file:
+        for chunk in iter(lambda: read_file.read(1024 * 1024), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+# Returns a hash of the fingerprints of the exported data blocks of a .blend
+# file, None when the file can't be read without Blender
+def HashExportedData(filePath, codes=blendyard_blendfile.EXPORTED_BLOCKS):
+
+    try:
+        with blendyard_blendfile.BlendFile(filePath) as blendFile:
+            fingerprints = blendFile.Fingerprints(codes)
+    except (OSError, ValueError):
+        return None
+
+    return hashlib.sha1(json.dumps(fingerprints, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Returns a hash of the export options that does not depend on key order
+def HashOptions(options):
+
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+class ExportManifest:
+
+    def __init__(self, folder, script, options, dependencies=None):
+        self.folder = folder
+        self.dependencies = dependencies
+        self.path = os.path.join(folder, MANIFEST_FILE)
+        self.script_hash = HashFile(script)
+        self.options_hash = HashOptions(options)
+        self.exported_blocks = blendyard_blendfile.ExportedBlocks(options.get("fbx", {}))
+
+        self.files = {}
+        self.dirty = False
+        self.last_save = time.time()
+        self.lock = threading.Lock()
+
+        self.Load()
+
+    def Load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as read_file:
+                manifest = json.load(read_file)
+        except (OSError, ValueError) as e:
+            print("Ignoring unreadable export manifest %s: %s"%(self.path, e))
+            return
+
+        if manifest.get("version") == MANIFEST_VERSION:
+            self.files = manifest.get("files", {})
+
+    # Writes to a temporary file first so an interrupted save does not
+    # leave a corrupt manifest behind
+    def Save(self):
+        with self.lock:
+            if self.dirty == False:
+                return
+
+            manifest = { "version": MANIFEST_VERSION, "files": self.files }
+            self.dirty = False
+            self.last_save = time.time()
+
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+
+            temporaryPath = self.path + ".tmp"
+            with open(temporaryPath, "w") as write_file:
+                json.dump(manifest, write_file, indent=1, sort_keys=True)
+
+            os.replace(temporaryPath, self.path)
+
+    def _Key(self, targetFile):
+        return os.path.relpath(targetFile, self.folder).replace(os.path.sep, "/")
+
+    # Returns the fingerprint of the source file, the content is only hashed
+    # when its size or modification time differ from the last export and
+    # its data blocks only when the content changed
+    def Fingerprint(self, sourceFile, targetFile):
+        statbuf = os.stat(sourceFile)
+
+        with self.lock:
+            entry = self.files.get(self._Key(targetFile))
+
+        if entry != None and entry["size"] == statbuf.st_size and entry["mtime"] == statbuf.st_mtime:
+            contentHash = entry["hash"]
+        else:
+            contentHash = HashFile(sourceFile)
+
+        if entry != None and entry["hash"] == contentHash:
+            exportedHash = entry.get("exported")
+        else:
+            exportedHash = HashExportedData(sourceFile, self.exported_blocks)
+
+        fingerprint = { "hash": contentHash, "size": statbuf.st_size, "mtime": statbuf.st_mtime }
+
+        if exportedHash != None:
+            fingerprint["exported"] = exportedHash
+
+        if self.dependencies != None:
+            libraries = self._HashLibraries(sourceFile)
+            if libraries != None:
+                fingerprint["libraries"] = libraries
+
+        return fingerprint
+
+    # Returns a hash of the size and modification time of every library the
+    # source links, None when it links no library
+    def _HashLibraries(self, sourceFile):
+        libraries = self.dependencies.Libraries(sourceFile)
+        if len(libraries) == 0:
+            return None
+
+        states = []
+        for library in sorted(libraries):
+            try:
+                statbuf = os.stat(library)
+                states.append([library, statbuf.st_size, statbuf.st_mtime])
+            except OSError:
+                states.append([library, None, None])
+
+        return hashlib.sha1(json.dumps(states).encode("utf-8")).hexdigest()
+
+    # Quick check used when the watchdog starts, only the source, its target
+    # and its libraries are looked up, no file is read. True when the target
+    # is missing, the source or its libraries changed since the last export
+    # or the exporter script or options changed. Without a manifest entry
+    # the target is stale when it is older than the source
+    def IsStale(self, sourceFile, targetFile, statbuf):
+        try:
+            targetStatbuf = os.stat(targetFile)
+        except OSError:
+            return True
+
+        with self.lock:
+            entry = self.files.get(self._Key(targetFile))
+
+        if entry == None:
+            return targetStatbuf.st_mtime < statbuf.st_mtime
+
+        if (entry["size"] != statbuf.st_size or
+            entry["mtime"] != statbuf.st_mtime or
+            entry["script"] != self.script_hash or
+            entry["options"] != self.options_hash):
+            return True
+
+        if self.dependencies != None and entry.get("libraries") != self._HashLibraries(sourceFile):
+            return True
+
+        return False
+
+    # Returns why the export can be skipped, None when the file must be
+    # exported. The target must exist and have been exported with the same
+    # exporter script, options and libraries, from the same content or from
+    # content whose exported data blocks are the same
+    def SkipReason(self, sourceFile, targetFile, fingerprint):
+        if not os.path.exists(targetFile):
+            return None
+
+        with self.lock:
+            entry = self.files.get(self._Key(targetFile))
+
+        if entry == None:
+            return None
+
+        if (entry.get("libraries") != fingerprint.get("libraries") or
+            entry["script"] != self.script_hash or
+            entry["options"] != self.options_hash):
+            return None
+
+        if entry["hash"] == fingerprint["hash"]:
+            return "Up to date"
+
+        if entry.get("exported") != None and entry.get("exported") == fingerprint.get("exported"):
+            return "Only data that is not exported changed (viewport, UI, thumbnail)"
+
+        return None
+
+    # True when the target exists and is up to date, see SkipReason()
+    def IsUpToDate(self, sourceFile, targetFile, fingerprint):
+        return self.SkipReason(sourceFile, targetFile, fingerprint) != None
+
+    # Records a successful or skipped export, the fingerprint must be taken
+    # before exporting so changes made during the export are not missed
+    def Record(self, sourceFile, targetFile, fingerprint):
+        entry = dict(fingerprint)
+        entry["source"] = os.path.abspath(sourceFile)
+        entry["script"] = self.script_hash
+        entry["options"] = self.options_hash
+
+        with self.lock:
+            self.files[self._Key(targetFile)] = entry
+            self.dirty = True
+            saveNow = time.time() - self.last_save > SAVE_INTERVAL
+
+        if saveNow:
+            self.Save()
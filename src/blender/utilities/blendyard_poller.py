@@ -0,0 +1,240 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Finds changed .blend files by polling, for folders that don't deliver file
+# system events, such as SMB or NFS shares and container volumes.
+#
+# Only the .blend files are kept in the index, as the modification time and
+# size of each file grouped by folder. Each folder is listed with a single
+# os.scandir() call. A full scan of the tree runs every `min_interval`
+# seconds after a change and slows down to `max_interval` seconds while
+# nothing changes. Folders in which a file changed in the last `hot_period`
+# seconds are also listed every `min_interval` seconds in between, so saving
+# the same file again is picked up quickly without scanning the whole tree.
+#
+# The time between full scans is never less than the CPU time of the last
+# scan divided by `cpu_percent`, so large trees are scanned less often
+# instead of using more CPU.
+
+import os
+import time
+import threading
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+class BlendFilePoller:
+
+    def __init__(self, folder, callback, min_interval=1.0, max_interval=30.0, cpu_percent=1.0, hot_period=60.0):
+        # The folders in the index are normalized absolute paths, whether
+        # they come from polling or from the entries given to Start()
+        self.folder = os.path.normpath(os.path.abspath(folder))
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cpu_percent = cpu_percent
+        self.hot_period = hot_period
+
+        # folder -> { file name -> (modification time in ns, size) }
+        self.index = {}
+
+        # folder -> time a file last changed in it
+        self.hot = {}
+
+        self.interval = min_interval
+        self.running = False
+        self.thread = None
+        self.condition = threading.Condition()
+
+    # Builds the index and starts polling. entries are the (path, os.stat()
+    # result) of the .blend files when the folder was just listed, see
+    # blendyard_utilities.ScanBlendFiles(), otherwise the folder is scanned
+    def Start(self, entries=None):
+        if entries == None:
+            self._ScanTree(report=False)
+        else:
+            for filePath, statbuf in entries:
+                folder, name = os.path.split(os.path.normpath(os.path.abspath(filePath)))
+                self.index.setdefault(folder, {})[name] = (statbuf.st_mtime_ns, statbuf.st_size)
+
+            self.index.setdefault(self.folder, {})
+
+        self.running = True
+        self.thread = threading.Thread(target=self._Run, daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+        if self.thread != None:
+            self.thread.join()
+
+    # Returns the number of .blend files in the index
+    def FileCount(self):
+        return sum(len(files) for files in self.index.values())
+
+    # Lists a single folder and reports the files that were created,
+    # modified or deleted since it was last listed. Returns the sub folders
+    # and whether anything changed
+    def _ScanFolder(self, folder, report):
+        files = {}
+        folders = []
+
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(entry.path)
+                        elif entry.name.endswith(".blend") and entry.is_file():
+                            statbuf = entry.stat()
+                            files[entry.name] = (statbuf.st_mtime_ns, statbuf.st_size)
+                    except OSError:
+                        # The file was removed while scanning
+                        continue
+        except OSError:
+            # The folder was removed, or the share is not reachable. An
+            # unreachable share keeps its index so its files are not
+            # reported as created once it is back
+            if os.path.isdir(self.folder):
+                self._Forget(folder, report)
+            return [], False
+
+        previous = self.index.get(folder, {})
+        self.index[folder] = files
+
+        changes = []
+        for name, state in files.items():
+            previousState = previous.get(name)
+            if previousState == None:
+                changes.append((CREATED, name))
+            elif previousState != state:
+                changes.append((MODIFIED, name))
+
+        for name in previous:
+            if name not in files:
+                changes.append((DELETED, name))
+
+        if report == True:
+            for eventType, name in changes:
+                self.callback(eventType, os.path.join(folder, name))
+
+        return folders, len(changes) > 0
+
+    # Removes a folder that no longer exists, and its sub folders, from the index
+    def _Forget(self, folder, report):
+        prefix = os.path.join(folder, "")
+
+        for indexedFolder in [indexed for indexed in self.index if indexed == folder or indexed.startswith(prefix)]:
+            if report == True:
+                for name in self.index[indexedFolder]:
+                    self.callback(DELETED, os.path.join(indexedFolder, name))
+
+            del self.index[indexedFolder]
+            self.hot.pop(indexedFolder, None)
+
+    # Lists every folder of the tree, returns whether anything changed
+    def _ScanTree(self, report):
+        # The share is not reachable, its files are kept until it is back
+        if not os.path.isdir(self.folder):
+            return False
+
+        pending = [self.folder]
+        found = set()
+        changed = False
+
+        while len(pending) > 0:
+            folder = pending.pop()
+            found.add(folder)
+
+            folders, folderChanged = self._ScanFolder(folder, report)
+            pending.extend(folders)
+
+            if folderChanged == True:
+                changed = True
+
+                if report == True:
+                    self.hot[folder] = time.time()
+
+        # Folders removed since the last scan, their parent was listed
+        # without them
+        for folder in [indexed for indexed in self.index if indexed not in found]:
+            if folder in self.index:
+                self._Forget(folder, report)
+                changed = True
+
+        return changed
+
+    # Lists the folders in which a file changed recently
+    def _ScanHotFolders(self):
+        now = time.time()
+
+        for folder, lastChange in list(self.hot.items()):
+            if now - lastChange > self.hot_period:
+                del self.hot[folder]
+                continue
+
+            folders, folderChanged = self._ScanFolder(folder, True)
+            if folderChanged == True:
+                self.hot[folder] = now
+
+    def _Run(self):
+        nextFullScan = time.time() + self.interval
+        nextHotScan = nextFullScan
+
+        while True:
+            with self.condition:
+                wait = nextFullScan - time.time()
+                if len(self.hot) > 0:
+                    wait = min(wait, nextHotScan - time.time())
+
+                if self.running and wait > 0:
+                    self.condition.wait(wait)
+
+                if not self.running:
+                    return
+
+            cpuStart = time.thread_time()
+
+            if time.time() < nextFullScan:
+                self._ScanHotFolders()
+
+                # Many folders change at once when switching branches, the
+                # hot folders are then listed less often as well
+                cpuTime = time.thread_time() - cpuStart
+                nextHotScan = time.time() + max(self.min_interval, cpuTime * 100.0 / self.cpu_percent)
+                continue
+
+            if self._ScanTree(report=True) == True:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * 2, self.max_interval)
+
+            # Keeps the CPU time spent scanning under cpu_percent
+            cpuTime = time.thread_time() - cpuStart
+            nextFullScan = time.time() + max(self.interval, cpuTime * 100.0 / self.cpu_percent)
+            nextHotScan = time.time() + self.min_interval
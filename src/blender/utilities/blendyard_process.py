@@ -0,0 +1,114 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Lets the watchdog cancel an export that is still running when its file is
+# saved again, instead of waiting for Blender to export content that is
+# already out of date.
+#
+# Blender is started in its own process group so terminating it also
+# terminates any process it started.
+
+import os
+import time
+import signal
+import threading
+import subprocess
+
+# Keyword arguments for subprocess.Popen() that start a process in its own group
+if os.name == "nt":
+    PROCESS_GROUP = { "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP }
+else:
+    PROCESS_GROUP = { "start_new_session": True }
+
+# Terminates a process started with PROCESS_GROUP and every process in its group
+def TerminateProcessGroup(process):
+
+    if process.poll() != None:
+        return
+
+    try:
+        if os.name == "nt":
+            subprocess.call(["taskkill", "/F", "/T", "/PID", str(process.pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+    except OSError:
+        # The process exited in the meantime
+        pass
+
+# Shared between the thread running an export and the threads that may
+# cancel it. The exporters attach the Blender process while it runs and
+# tell which file it is exporting
+class ExportHandle:
+
+    def __init__(self):
+        self.process = None
+        self.current = None
+        self.current_start = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    # A handle cancelled before Blender started terminates it right away
+    def Attach(self, process):
+        with self.lock:
+            self.process = process
+            cancelled = self.cancelled
+
+        if cancelled == True:
+            TerminateProcessGroup(process)
+
+    def Detach(self):
+        with self.lock:
+            self.process = None
+
+    # Called when Blender starts exporting a file
+    def SetCurrent(self, sourceFile):
+        with self.lock:
+            self.current = sourceFile
+            self.current_start = time.time()
+
+    # Returns the file being exported and for how long, in seconds
+    def Current(self):
+        with self.lock:
+            if self.current == None:
+                return None, 0
+            return self.current, time.time() - self.current_start
+
+    # Terminates Blender, the exporters report the file it was exporting
+    # as cancelled rather than failed
+    def Cancel(self):
+        with self.lock:
+            self.cancelled = True
+            process = self.process
+
+        if process != None:
+            TerminateProcessGroup(process)
+
+    def IsCancelled(self):
+        with self.lock:
+            return self.cancelled
+
+    # Lets the handle be used for another Blender process after a cancellation
+    def Reset(self):
+        with self.lock:
+            self.cancelled = False
@@ -0,0 +1,201 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# A queue of files waiting to be exported, drained by a set of worker threads.
+#
+# A file is only queued once, queuing it again while it is waiting only
+# updates its timestamp. The file with the most recent timestamp (usually the
+# last saved one) is exported first. A file is never exported by two workers
+# at the same time, if it changes while being exported it waits in the queue
+# until the running export is done.
+#
+# Each worker takes up to batch_size files at once and hands them to the
+# export function as a list, so a burst of changes can be exported by a
+# few Blender processes instead of one per file.
+#
+# With a scheduler (see blendyard_scheduler.py), a worker waits until the
+# memory its files are expected to need is available before exporting them.
+
+import os
+import heapq
+import time
+import threading
+import itertools
+
+class ExportQueue:
+
+    def __init__(self, workers, export, batch_size=1, scheduler=None):
+        self.workers = workers
+        self.export = export
+        self.batch_size = batch_size
+        self.scheduler = scheduler
+
+        # Entries are (-timestamp, sequence, path), entries that no longer
+        # match self.pending are stale and skipped when popped. running holds
+        # the time each file being exported was taken by a worker
+        self.heap = []
+        self.pending = {}
+        self.running = {}
+        self.sequence = itertools.count()
+
+        # Number of files queued again while they were already waiting
+        self.deduplicated = 0
+
+        self.active = False
+        self.threads = []
+        self.condition = threading.Condition()
+
+    def Start(self):
+        self.active = True
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._Work, name="ExportWorker%d"%index, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # Stops the workers once their current export is done, files still
+    # waiting in the queue are not exported
+    def Stop(self):
+        with self.condition:
+            self.active = False
+            self.condition.notify_all()
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = []
+
+    # Queues a file, the timestamp defaults to the file's modification time
+    def Put(self, path, timestamp=None):
+        self.PutMany([path], timestamp)
+
+    # Queues several files at once so the workers pick them in order of
+    # their timestamps rather than in the order they were given
+    def PutMany(self, paths, timestamp=None):
+        entries = []
+
+        for path in paths:
+            pathTimestamp = timestamp
+            if pathTimestamp == None:
+                try:
+                    pathTimestamp = os.path.getmtime(path)
+                except OSError:
+                    pathTimestamp = time.time()
+
+            entries.append((-pathTimestamp, next(self.sequence), path))
+
+        with self.condition:
+            for entry in entries:
+                if entry[2] in self.pending:
+                    self.deduplicated += 1
+                self.pending[entry[2]] = entry
+                heapq.heappush(self.heap, entry)
+
+            self.condition.notify(len(entries))
+
+    def PendingCount(self):
+        with self.condition:
+            return len(self.pending)
+
+    def RunningCount(self):
+        with self.condition:
+            return len(self.running)
+
+    def IsIdle(self):
+        with self.condition:
+            return len(self.pending) == 0 and len(self.running) == 0
+
+    # Returns the number of files waiting and being exported, the timestamp
+    # of the oldest waiting file and when the oldest running export started
+    def Stats(self):
+        with self.condition:
+            return {
+                "pending": len(self.pending),
+                "running": len(self.running),
+                "deduplicated": self.deduplicated,
+                "oldest_pending": min([-entry[0] for entry in self.pending.values()], default=None),
+                "oldest_running": min(self.running.values(), default=None)
+            }
+
+    # Returns up to batch_size of the most recent files that are not being
+    # exported already, the waiting files are shared between the workers
+    # rather than all going to the first one. Must be called with the
+    # condition held
+    def _Pop(self):
+        deferred = []
+        paths = []
+        count = max(1, min(self.batch_size, (len(self.pending) + self.workers - 1) // self.workers))
+
+        while len(self.heap) > 0 and len(paths) < count:
+            entry = heapq.heappop(self.heap)
+
+            if self.pending.get(entry[2]) != entry:
+                continue
+
+            if entry[2] in self.running:
+                deferred.append(entry)
+                continue
+
+            paths.append(entry[2])
+            del self.pending[entry[2]]
+
+        for entry in deferred:
+            heapq.heappush(self.heap, entry)
+
+        return paths
+
+    def _Work(self):
+        while True:
+            with self.condition:
+                paths = []
+
+                while self.active:
+                    paths = self._Pop()
+                    if len(paths) > 0:
+                        break
+                    self.condition.wait()
+
+                if not self.active:
+                    return
+
+                self.running.update(dict.fromkeys(paths, time.time()))
+
+            cost = 0
+            if self.scheduler != None:
+                cost = self.scheduler.EstimateBatch(paths)
+                self.scheduler.Acquire(cost)
+
+            try:
+                self.export(paths)
+            except Exception as e:
+                print("Export of %s failed: %s"%(", ".join(paths), e))
+            finally:
+                if self.scheduler != None:
+                    self.scheduler.Release(cost)
+
+                with self.condition:
+                    for path in paths:
+                        del self.running[path]
+                    # A newer save of these files may be waiting for this export
+                    self.condition.notify_all()
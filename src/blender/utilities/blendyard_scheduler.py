@@ -0,0 +1,282 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Decides how many exports run at the same time from the memory they need.
+#
+# Each export reports the peak memory Blender used (see batch_export.py),
+# which is kept per file in MEMORY_FILE in the target folder. The memory an
+# export will need is estimated from that peak, scaled by how much the .blend
+# file grew since, or for files never exported from their size and the
+# memory other files needed for their size.
+#
+# Exports are admitted while the memory of the running exports stays within
+# the budget and fewer than max_jobs run. An export needing more than the
+# whole budget runs alone. An export that has waited for memory longer than
+# `reserve_after` seconds holds back the smaller exports admitted after it,
+# so it is not kept waiting by a steady stream of small ones.
+
+import os
+import sys
+import json
+import time
+import ctypes
+import threading
+
+MEMORY_FILE = ".blendyard_memory.json"
+
+MEGABYTE = 1024 * 1024
+
+# Memory used by Blender with an empty scene, and how many times its size a
+# .blend file takes in memory, used until some files have been exported
+BLENDER_BASE_MEMORY = 400 * MEGABYTE
+DEFAULT_SIZE_RATIO = 10.0
+
+# Returns the physical memory of the machine in bytes
+def PhysicalMemory():
+
+    if os.name == "nt":
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong),
+                        ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong),
+                        ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong),
+                        ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong),
+                        ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+        return status.ullTotalPhys
+
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+class ExportScheduler:
+
+    def __init__(self, folder, budget=None, max_jobs=None, reserve_after=30.0, verbose=False):
+        self.path = os.path.join(folder, MEMORY_FILE)
+        self.folder = folder
+        self.budget = budget if budget != None and budget > 0 else int(PhysicalMemory() * 0.75)
+        self.max_jobs = max_jobs if max_jobs != None and max_jobs > 0 else os.cpu_count()
+        self.reserve_after = reserve_after
+        self.verbose = verbose
+
+        # For each file, the peak memory of its last export and its size then
+        self.history = {}
+        self.dirty = False
+
+        self.used = 0
+        self.jobs = 0
+
+        # Time each waiting export started waiting, by ticket
+        self.waiting = {}
+        self.tickets = 0
+
+        self.condition = threading.Condition()
+
+        self.Load()
+
+    def Load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as read_file:
+                self.history = json.load(read_file)
+        except (OSError, ValueError) as e:
+            print("Ignoring unreadable memory history %s: %s"%(self.path, e))
+
+    def Save(self):
+        with self.condition:
+            if self.dirty == False:
+                return
+
+            history = dict(self.history)
+            self.dirty = False
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        temporaryPath = self.path + ".tmp"
+        with open(temporaryPath, "w") as write_file:
+            json.dump(history, write_file, indent=1, sort_keys=True)
+
+        os.replace(temporaryPath, self.path)
+
+    # Records the peak memory of an export, in bytes
+    def Record(self, filePath, peak):
+        try:
+            size = os.path.getsize(filePath)
+        except OSError:
+            return
+
+        with self.condition:
+            self.history[os.path.normcase(os.path.abspath(filePath))] = { "peak": peak, "size": size }
+            self.dirty = True
+
+    # Returns how many times their size the files exported so far took in
+    # memory, the median so a few unusual files don't skew it
+    def _SizeRatio(self):
+        ratios = sorted((entry["peak"] - BLENDER_BASE_MEMORY) / entry["size"] for entry in self.history.values() if entry["size"] > 0 and entry["peak"] > BLENDER_BASE_MEMORY)
+
+        if len(ratios) == 0:
+            return DEFAULT_SIZE_RATIO
+
+        return ratios[len(ratios) // 2]
+
+    # Returns the memory the export of a file is expected to need, in bytes
+    def Estimate(self, filePath):
+        try:
+            size = os.path.getsize(filePath)
+        except OSError:
+            size = 0
+
+        with self.condition:
+            entry = self.history.get(os.path.normcase(os.path.abspath(filePath)))
+
+            if entry != None:
+                if entry["size"] > 0 and size > entry["size"]:
+                    return int(entry["peak"] * size / entry["size"])
+                return entry["peak"]
+
+            return int(BLENDER_BASE_MEMORY + self._SizeRatio() * size)
+
+    # Returns the memory needed by one Blender process exporting the files
+    # one after the other
+    def EstimateBatch(self, filePaths):
+        return max([self.Estimate(filePath) for filePath in filePaths] + [0])
+
+    # Must be called with the condition held
+    def _Fits(self, cost):
+        if self.jobs >= self.max_jobs:
+            return False
+
+        # Too large for the budget, it runs once nothing else does
+        if self.jobs == 0:
+            return True
+
+        return self.used + cost <= self.budget
+
+    # Waits until an export needing cost bytes can start
+    def Acquire(self, cost):
+        with self.condition:
+            ticket = self.tickets
+            self.tickets += 1
+            self.waiting[ticket] = time.time()
+
+            while True:
+                # Exports that waited too long go first
+                now = time.time()
+                reserved = [other for other, since in self.waiting.items() if other < ticket and now - since > self.reserve_after]
+
+                if len(reserved) == 0 and self._Fits(cost):
+                    break
+
+                self.condition.wait(1.0)
+
+            del self.waiting[ticket]
+            self.used += cost
+            self.jobs += 1
+
+    def Release(self, cost):
+        with self.condition:
+            self.used -= cost
+            self.jobs -= 1
+            self.condition.notify_all()
+
+    # Returns the memory in use and the exports running or waiting for memory
+    def Stats(self):
+        with self.condition:
+            return {
+                "budget": self.budget,
+                "used": self.used,
+                "jobs": self.jobs,
+                "waiting": len(self.waiting)
+            }
+
+    # Runs every item on its own thread and returns their results. The
+    # largest items start first, and whenever the next one does not fit,
+    # smaller ones fill the memory left
+    def Run(self, items, cost, run):
+        costs = [(cost(item), index, item) for index, item in enumerate(items)]
+        costs.sort(key=lambda entry: (-entry[0], entry[1]))
+
+        results = []
+
+        def RunItem(itemCost, item):
+            try:
+                result = run(item)
+            except Exception as e:
+                print("Export failed: %s"%e)
+                result = None
+
+            with self.condition:
+                results.append(result)
+                self.used -= itemCost
+                self.jobs -= 1
+                self.condition.notify_all()
+
+        threads = []
+
+        with self.condition:
+            while len(costs) > 0:
+                entry = next((entry for entry in costs if self._Fits(entry[0])), None)
+
+                if entry == None:
+                    self.condition.wait()
+                    continue
+
+                costs.remove(entry)
+                self.used += entry[0]
+                self.jobs += 1
+
+                if self.verbose == True:
+                    print("Starting an export needing %d MB, %d MB of %d MB in use"%(entry[0] // MEGABYTE, self.used // MEGABYTE, self.budget // MEGABYTE))
+
+                thread = threading.Thread(target=RunItem, args=(entry[0], entry[2]), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        return results
+
+# Returns the scheduler for the exports to the target folder, limited by the
+# memory_budget_mb of the settings (75% of the machine's memory when 0)
+def CreateExportScheduler(settings, folder, max_jobs=None, verbose=False):
+
+    budget = settings["general"].get("memory_budget_mb", 0) * MEGABYTE
+
+    # The exports run on the farm's workers, not on this machine
+    if settings["general"].get("export_farm", 0) != 0:
+        budget = sys.maxsize
+
+    return ExportScheduler( folder=folder,
+                            budget=budget,
+                            max_jobs=max_jobs,
+                            verbose=verbose
+                            )
@@ -0,0 +1,275 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Keeps Blender running in the background between exports.
+#
+# Starting Blender and initializing its add-ons often takes longer than the
+# export itself, a BlenderExportServer starts batch_export.py in --server mode
+# once and sends it one export job at a time over stdin.
+#
+# To keep memory leaks in Blender from building up, the server is restarted
+# after a set number of jobs. It is also restarted after a crash or when a
+# job takes longer than the timeout.
+
+import os
+import json
+import time
+import queue
+import threading
+import subprocess
+import collections
+
+import blendyard_process
+import blendyard_farm
+
+# These must match the markers printed by batch_export.py
+SERVER_READY = "BLENDYARD_SERVER_READY"
+SERVER_RESULT = "BLENDYARD_RESULT "
+
+# Number of lines of Blender output kept to display when a job fails
+OUTPUT_HISTORY = 40
+
+class BlenderExportServer:
+
+    def __init__(self, converter, script, max_jobs=25, timeout=None, verbose=False):
+        self.converter = converter
+        self.script = script
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.verbose = verbose
+
+        self.process = None
+        self.lines = None
+        self.jobs = 0
+        self.output = collections.deque(maxlen=OUTPUT_HISTORY)
+        self.lock = threading.Lock()
+
+        # How long starting Blender took, reported with the first job
+        self.startup = None
+
+    # Reads Blender's output on a separate thread so waiting for a
+    # result can time out, None is queued once Blender exits
+    def _ReadOutput(self, process, lines):
+        for line in process.stdout:
+            lines.put(line.rstrip("\n"))
+        lines.put(None)
+
+    # Waits for a line starting with the marker, returns None when Blender
+    # exited or the timeout expired
+    def _WaitFor(self, marker):
+        while True:
+            try:
+                line = self.lines.get(timeout=self.timeout)
+            except queue.Empty:
+                print("Blender export server timed out")
+                return None
+
+            if line == None:
+                return None
+
+            if line.startswith(marker):
+                return line[len(marker):]
+
+            self.output.append(line)
+            if self.verbose == True:
+                print(line)
+
+    def Start(self):
+        scriptPath = os.path.join(os.getcwd(), self.script)
+
+        cmdLine = [
+        self.converter,
+        "-b",
+        "--python",
+        scriptPath,
+        "--",
+        "--server"
+        ]
+
+        if self.verbose == True:
+            print("Starting Blender export server: %s"%cmdLine)
+
+        spawnStartTime = time.time()
+
+        self.process = subprocess.Popen(cmdLine,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        universal_newlines=True,
+                                        errors="replace",
+                                        bufsize=1,
+                                        **blendyard_process.PROCESS_GROUP)
+        spawnEndTime = time.time()
+
+        self.lines = queue.Queue()
+        self.jobs = 0
+        self.output.clear()
+
+        reader = threading.Thread(target=self._ReadOutput, args=(self.process, self.lines), daemon=True)
+        reader.start()
+
+        if self._WaitFor(SERVER_READY) == None:
+            self._Kill()
+            raise RuntimeError("Blender export server failed to start:\n%s"%"\n".join(self.output))
+
+        self.startup = { "spawn": spawnEndTime - spawnStartTime, "boot": time.time() - spawnEndTime }
+
+    # Closing stdin lets the server finish its loop and exit cleanly
+    def Stop(self):
+        if self.process == None:
+            return
+
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            self._Kill()
+
+        self.process = None
+
+    def _Kill(self):
+        if self.process == None:
+            return
+
+        self.process.kill()
+        self.process.wait()
+        self.process = None
+
+    # Exports a single file, returns the result reported by batch_export.py
+    # or None if Blender could not be started or stopped during the export.
+    # Cancelling the handle (see blendyard_process.py) stops the server
+    def Export(self, sourceFile, targetFile, options={}, handle=None):
+        with self.lock:
+            if self.process == None or self.process.poll() != None:
+                try:
+                    self.Start()
+                except (OSError, RuntimeError) as e:
+                    print(e)
+                    return None
+
+            job = { "source": os.path.abspath(sourceFile), "target": os.path.abspath(targetFile), "options": options }
+
+            try:
+                self.process.stdin.write(json.dumps(job) + "\n")
+                self.process.stdin.flush()
+            except OSError:
+                self._Kill()
+                return None
+
+            if handle != None:
+                handle.Attach(self.process)
+
+            response = self._WaitFor(SERVER_RESULT)
+            self.jobs += 1
+
+            if handle != None:
+                handle.Detach()
+
+            if response == None:
+                if handle != None and handle.IsCancelled():
+                    print("Blender export server stopped, the export of %s was cancelled"%sourceFile)
+                else:
+                    print("Blender export server stopped while exporting %s:"%sourceFile)
+                    print("\n".join(self.output))
+                self._Kill()
+                return None
+
+            result = json.loads(response)
+
+            if result["result"] != "ok":
+                print("\n".join(self.output))
+
+            if self.startup != None:
+                result["startup"] = self.startup
+                self.startup = None
+
+            self.output.clear()
+
+            if self.jobs >= self.max_jobs:
+                self.Stop()
+
+            return result
+
+# A set of export servers shared between threads, each export borrows
+# an idle server or starts a new one, so the number of Blender processes
+# matches the number of exports running at the same time
+class BlenderExportServerPool:
+
+    def __init__(self, converter, script, max_jobs=25, timeout=None, verbose=False):
+        self.converter = converter
+        self.script = script
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.verbose = verbose
+
+        self.idle = []
+        self.servers = []
+        self.lock = threading.Lock()
+
+    def Export(self, sourceFile, targetFile, options={}, handle=None):
+        with self.lock:
+            if len(self.idle) > 0:
+                server = self.idle.pop()
+            else:
+                server = BlenderExportServer(self.converter, self.script, self.max_jobs, self.timeout, self.verbose)
+                self.servers.append(server)
+
+        try:
+            return server.Export(sourceFile, targetFile, options, handle)
+        finally:
+            with self.lock:
+                self.idle.append(server)
+
+    def Stop(self):
+        with self.lock:
+            for server in self.servers:
+                server.Stop()
+
+            self.idle = []
+            self.servers = []
+
+# Returns an export server pool when enabled in the settings, or an export
+# farm that hands the exports to workers on other machines, None otherwise
+def CreateExportServer(settings, script, verbose=False):
+
+    if settings["general"].get("export_farm", 0) != 0:
+        farm = blendyard_farm.BlenderExportFarm(port=settings["general"].get("export_farm_port", blendyard_farm.FARM_PORT),
+                                                retries=settings["general"].get("export_farm_retries", 2),
+                                                heartbeat=settings["general"].get("export_farm_heartbeat", 5.0),
+                                                token=settings["general"].get("export_farm_token", ""),
+                                                timeout=settings["general"].get("export_farm_timeout", 600),
+                                                verbose=verbose
+                                                )
+        farm.Start()
+        return farm
+
+    if settings["general"].get("export_server", 0) == 0:
+        return None
+
+    return BlenderExportServerPool( converter=settings["general"]["blender_exe"],
+                                    script=script,
+                                    max_jobs=settings["general"].get("export_server_max_jobs", 25),
+                                    timeout=settings["general"].get("export_server_timeout", None),
+                                    verbose=verbose
+                                    )
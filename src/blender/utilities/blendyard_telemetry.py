@@ -0,0 +1,301 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Serves the state of a running watchdog over HTTP on the local machine.
+#
+#   /metrics       Prometheus text format
+#   /metrics.json  the same values as JSON
+#
+# The watchdog's event handling is not slowed down by this: the debouncer,
+# the export queue and the scheduler already keep the counts, and they are
+# only read when a request comes in. The export results and latencies are
+# recorded by the export workers once an export is done.
+#
+# The latency of an export is the time from the save of the .blend file (its
+# modification time) to the .fbx file being written. Files saved before the
+# watchdog started, exported by the startup scan, are not counted in it.
+
+import os
+import json
+import time
+import threading
+import collections
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Upper bounds in seconds of the histogram buckets
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800]
+DURATION_BUCKETS = [0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600]
+
+# The event rate is measured over this many seconds
+RATE_WINDOW = 60.0
+
+RESULTS = ["ok", "failed", "skipped", "cancelled"]
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    # Must be called with the telemetry lock held
+    def Observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    # Returns the cumulative count of each bucket, the last one being +Inf
+    def Snapshot(self):
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+
+        return {
+            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], cumulative)),
+            "sum": self.sum,
+            "count": self.count
+        }
+
+class WatchdogTelemetry:
+
+    def __init__(self, queue, debouncer, scheduler=None, workers=None, address="127.0.0.1", port=0):
+        self.queue = queue
+        self.debouncer = debouncer
+        self.scheduler = scheduler
+        self.workers = workers
+        self.address = address
+        self.port = port
+
+        self.start_time = time.time()
+        self.results = dict.fromkeys(RESULTS, 0)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.last_export = None
+
+        # (time, event count) of the previous requests, to measure the rate
+        self.samples = collections.deque()
+
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def Start(self):
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+
+                if path == "/metrics":
+                    body = telemetry.Prometheus(telemetry.Snapshot())
+                    contentType = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(telemetry.Snapshot(), indent=1)
+                    contentType = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", contentType)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            # Requests are not printed to the watchdog's console
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.address, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+        self.thread = threading.Thread(target=self.server.serve_forever, name="Telemetry", daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        if self.server != None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    # Records the result of exporting a file, duration is the time Blender
+    # took when it was exported
+    def RecordExport(self, filePath, result, duration=None):
+        now = time.time()
+
+        saved = None
+        if result == "ok":
+            try:
+                saved = os.path.getmtime(filePath)
+            except OSError:
+                pass
+
+        with self.lock:
+            self.results[result] = self.results.get(result, 0) + 1
+
+            if result == "ok":
+                self.last_export = now
+
+                if duration != None:
+                    self.duration.Observe(duration)
+
+                # The clock of a network share may be ahead of this machine's
+                if saved != None and saved >= self.start_time:
+                    self.latency.Observe(max(0.0, now - saved))
+
+    # Events per minute over the last RATE_WINDOW seconds, or since the
+    # watchdog started. Must be called with the lock held
+    def _EventRate(self, now, events):
+        if len(self.samples) == 0 or now - self.samples[-1][0] >= 1.0:
+            self.samples.append((now, events))
+
+        # Keep the newest sample older than the window
+        while len(self.samples) > 1 and now - self.samples[1][0] >= RATE_WINDOW:
+            self.samples.popleft()
+
+        since, count = self.samples[0]
+        if now - since < 1.0:
+            since, count = self.start_time, 0
+
+        return 60.0 * (events - count) / max(now - since, 1.0)
+
+    def Snapshot(self):
+        now = time.time()
+
+        debounce = self.debouncer.Stats()
+        queue = self.queue.Stats()
+        memory = self.scheduler.Stats() if self.scheduler != None else None
+
+        with self.lock:
+            snapshot = {
+                "time": now,
+                "uptime": now - self.start_time,
+                "events": {
+                    "total": debounce["events"],
+                    "coalesced": debounce["coalesced"],
+                    "per_minute": self._EventRate(now, debounce["events"]),
+                    "last": debounce["last_event"]
+                },
+                "debounce": {
+                    "pending": debounce["pending"]
+                },
+                "queue": {
+                    "pending": queue["pending"],
+                    "deduplicated": queue["deduplicated"],
+                    "oldest_seconds": now - queue["oldest_pending"] if queue["oldest_pending"] != None else 0.0
+                },
+                "exports": {
+                    "workers": self.workers,
+                    "running": queue["running"],
+                    "longest_running_seconds": now - queue["oldest_running"] if queue["oldest_running"] != None else 0.0,
+                    "results": dict(self.results),
+                    "last": self.last_export,
+                    "latency": self.latency.Snapshot(),
+                    "duration": self.duration.Snapshot()
+                },
+                "memory": memory
+            }
+
+        return snapshot
+
+    # Formats a snapshot in the Prometheus text format
+    def Prometheus(self, snapshot):
+        lines = []
+
+        def Metric(name, kind, help, samples):
+            lines.append("# HELP blendyard_%s %s"%(name, help))
+            lines.append("# TYPE blendyard_%s %s"%(name, kind))
+            for suffix, labels, value in samples:
+                labelText = ",".join('%s="%s"'%(key, value) for key, value in labels)
+                lines.append("blendyard_%s%s%s %s"%(name, suffix, "{%s}"%labelText if len(labelText) > 0 else "", repr(float(value))))
+
+        def Gauge(name, help, value):
+            Metric(name, "gauge", help, [("", [], value)])
+
+        def Counter(name, help, value):
+            Metric(name, "counter", help, [("", [], value)])
+
+        def HistogramMetric(name, help, histogram):
+            samples = [("_bucket", [("le", bound)], count) for bound, count in histogram["buckets"].items()]
+            samples.append(("_sum", [], histogram["sum"]))
+            samples.append(("_count", [], histogram["count"]))
+            Metric(name, "histogram", help, samples)
+
+        events = snapshot["events"]
+        queue = snapshot["queue"]
+        exports = snapshot["exports"]
+
+        Gauge("uptime_seconds", "Seconds since the watchdog started", snapshot["uptime"])
+        Counter("events_total", "File change events received", events["total"])
+        Counter("events_coalesced_total", "Events merged with a pending event of the same file", events["coalesced"])
+        Gauge("last_event_timestamp_seconds", "Time of the last file change event", events["last"] or 0)
+        Gauge("debounce_pending", "Files waiting to stop changing", snapshot["debounce"]["pending"])
+        Gauge("queue_pending", "Files waiting to be exported", queue["pending"])
+        Counter("queue_deduplicated_total", "Files queued again while already waiting", queue["deduplicated"])
+        Gauge("queue_oldest_seconds", "Seconds the oldest waiting file was saved ago", queue["oldest_seconds"])
+
+        if exports["workers"] != None:
+            Gauge("export_workers", "Exports that can run at the same time", exports["workers"])
+
+        Gauge("exports_running", "Files being exported", exports["running"])
+        Gauge("export_longest_running_seconds", "Seconds the oldest running export has been running", exports["longest_running_seconds"])
+        Metric("exports_total", "counter", "Exported files by result", [("", [("result", result)], count) for result, count in exports["results"].items()])
+        Gauge("last_export_timestamp_seconds", "Time of the last successful export", exports["last"] or 0)
+        HistogramMetric("export_latency_seconds", "Seconds from saving a .blend file to its .fbx file being written", exports["latency"])
+        HistogramMetric("export_duration_seconds", "Seconds Blender took to export a file", exports["duration"])
+
+        memory = snapshot["memory"]
+        if memory != None:
+            Gauge("memory_budget_bytes", "Memory the exports may use", memory["budget"])
+            Gauge("memory_used_bytes", "Memory the running exports are expected to use", memory["used"])
+            Gauge("exports_waiting_for_memory", "Exports waiting for memory to be available", memory["waiting"])
+
+        return "\n".join(lines) + "\n"
+
+# Returns the telemetry of the watchdog when telemetry_port is set in the
+# settings, None otherwise
+def CreateWatchdogTelemetry(settings, queue, debouncer, scheduler=None, workers=None):
+
+    port = settings["watchdog"].get("telemetry_port", 0)
+    if port == None or port <= 0:
+        return None
+
+    return WatchdogTelemetry(   queue=queue,
+                                debouncer=debouncer,
+                                scheduler=scheduler,
+                                workers=workers,
+                                address=settings["watchdog"].get("telemetry_address", "127.0.0.1"),
+                                port=port
+                                )
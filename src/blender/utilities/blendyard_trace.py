@@ -0,0 +1,198 @@
+"""
+MIT License
+
+Copyright (c) 2020-2021 ossls
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Records how long each phase of an export took, one JSON object per line.
+#
+# Each record holds the source and target files, the result, the size of the
+# source and exported files, the number of objects, vertices and faces, and
+# the duration in seconds of these phases:
+#   spawn    starting the Blender process
+#   boot     Blender starting up until it begins loading the .blend file
+#   load     loading the .blend file
+#   cleanup  the mesh cleanup done by doExport in batch_export.py
+#   write    writing the .fbx file
+#   total    the whole export as seen by the caller
+# Phases that were not measured are null, when Blender exports several files
+# the spawn and boot time is recorded on the first file only.
+#
+# Running this script reports the slowest files and phases of a trace:
+#   python src/blender/utilities/blendyard_trace.py trace.jsonl --top 20
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+PHASES = ["spawn", "boot", "load", "cleanup", "write", "total"]
+
+class ExportTrace:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    # Appends a record for one export, phases holds the durations that were
+    # measured and response is the result returned by batch_export.py
+    def Write(self, sourceFile, targetFile, result, phases, response):
+        timings = dict.fromkeys(PHASES)
+        timings.update(phases)
+
+        if response != None:
+            for phase, duration in response.get("timings", {}).items():
+                if timings.get(phase) == None:
+                    timings[phase] = duration
+
+        record = {
+            "time": time.time(),
+            "source": os.path.abspath(sourceFile),
+            "target": os.path.abspath(targetFile),
+            "result": result,
+            "file_size": os.path.getsize(sourceFile) if os.path.exists(sourceFile) else None,
+            "fbx_size": os.path.getsize(targetFile) if os.path.exists(targetFile) else None,
+            "phases": timings
+        }
+
+        if response != None:
+            record.update(response.get("stats", {}))
+
+        with self.lock:
+            with open(self.path, "a") as write_file:
+                write_file.write(json.dumps(record) + "\n")
+
+# Returns a trace when a trace file is set in the settings, None otherwise
+def CreateExportTrace(settings, path=None):
+
+    if path == None:
+        path = settings["general"].get("trace_file", "")
+
+    if path == None or len(path) == 0:
+        return None
+
+    return ExportTrace(path)
+
+def ReadRecords(path):
+
+    records = []
+
+    with open(path, "r") as read_file:
+        for line in read_file:
+            line = line.strip()
+            if len(line) > 0:
+                records.append(json.loads(line))
+
+    return records
+
+def Percentile(values, fraction):
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def FormatSize(size):
+
+    if size == None:
+        return "-"
+
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return "%.1f%s"%(size, unit)
+        size /= 1024.0
+
+def FormatDuration(duration):
+
+    return "-" if duration == None else "%.2fs"%duration
+
+# Displays the slowest files and how the export time is split between phases
+def Report(records, top, latest):
+
+    if latest == True:
+        latestRecords = {}
+        for record in records:
+            latestRecords[record["source"]] = record
+        records = list(latestRecords.values())
+
+    print("--------------------------------------------------------")
+    print("Export Trace Report: %d exports"%len(records))
+    print("--------------------------------------------------------")
+
+    if len(records) == 0:
+        return
+
+    print("\nPhases:")
+    print("%-8s %8s %8s %8s %8s %10s %7s"%("phase", "count", "mean", "p50", "p95", "total", "share"))
+
+    totalTime = sum(record["phases"]["total"] or 0 for record in records)
+
+    for phase in PHASES:
+        durations = [record["phases"][phase] for record in records if record["phases"].get(phase) != None]
+        if len(durations) == 0:
+            continue
+
+        share = 100.0 * sum(durations) / totalTime if totalTime > 0 else 0
+        print("%-8s %8d %8.2f %8.2f %8.2f %10.2f %6.1f%%"%(phase, len(durations), sum(durations) / len(durations),
+            Percentile(durations, 0.5), Percentile(durations, 0.95), sum(durations), share))
+
+    print("\nSlowest files:")
+    print("%8s %8s %8s %8s %8s %9s %9s %9s  %s"%("total", "boot", "load", "cleanup", "write", "size", "vertices", "faces", "file"))
+
+    slowest = sorted(records, key=lambda record: record["phases"]["total"] or 0, reverse=True)
+
+    for record in slowest[:top]:
+        phases = record["phases"]
+        print("%8s %8s %8s %8s %8s %9s %9s %9s  %s"%(FormatDuration(phases["total"]), FormatDuration(phases["boot"]),
+            FormatDuration(phases["load"]), FormatDuration(phases["cleanup"]), FormatDuration(phases["write"]),
+            FormatSize(record.get("file_size")), record.get("vertices", "-"), record.get("faces", "-"), record["source"]))
+
+    failed = [record for record in records if record["result"] == "failed"]
+    if len(failed) > 0:
+        print("\n%d failed exports:"%len(failed))
+        for record in failed:
+            print("  %s"%record["source"])
+
+    # Exports cancelled because their file was saved again, see blendyard_process.py
+    cancelled = [record for record in records if record["result"] == "cancelled"]
+    if len(cancelled) > 0:
+        print("\n%d cancelled exports"%len(cancelled))
+
+    print("")
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Report the slowest files and phases recorded in an export trace')
+    parser.add_argument('trace', help='the .jsonl trace file, see trace_file in settings.json')
+    parser.add_argument('--top', help='number of files to list', type=int, default=20)
+    parser.add_argument('--latest', help='only use the latest export of each file', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.trace):
+        print("Trace file not found: %s"%args.trace)
+        sys.exit(1)
+
+    Report(ReadRecords(args.trace), args.top, args.latest)
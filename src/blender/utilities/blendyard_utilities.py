@@ -26,22 +26,215 @@ import os
 import json
 import subprocess
 import pathlib
+import time
+import tempfile
+import collections
+
+import blendyard_server
+import blendyard_process
 
 # Opens the settings JSON file and returns it in an easy to use
-# dictionary
+# dictionary. Without a file name the settings.json next to the
+# scripts is used
 def ReadSettings(settingsFileName):
 
+    current_folder = os.path.dirname(os.path.realpath(__file__))
+
     if settingsFileName == None or len(settingsFileName) == 0:
-        settingsFileName = os.path.join("%s.."%os.path.sep, 'settings.json')
+        settingsFile = current_folder + os.path.join("%s.."%os.path.sep, 'settings.json')
 
-    current_folder = os.path.dirname(os.path.realpath(__file__))
+    # A path to an existing file given on the command line, absolute or
+    # relative to the current folder
+    elif os.path.isfile(settingsFileName):
+        settingsFile = settingsFileName
+
+    else:
+        settingsFile = current_folder + settingsFileName
 
-    settingsFile = current_folder + settingsFileName
     with open(settingsFile, "r") as read_file:
         settings = json.load(read_file)
 
     return settings
 
+# Returns the export options sent to batch_export.py from the "exporter"
+# entry of the settings, these are also recorded in the export manifest.
+#
+# A profile from the exporter's "profiles" overrides the default options,
+# the profile given here takes precedence over the one in the settings
+def ExportOptions(settings, profile=None):
+
+    exporter = settings.get("exporter", {})
+
+    options = {
+        "cleanup": exporter.get("cleanup", "bmesh"),
+        "fbx": exporter.get("fbx", {})
+    }
+
+    if "textures" in exporter:
+        options["textures"] = exporter["textures"]
+
+    if profile == None:
+        profile = exporter.get("profile", "")
+
+    if profile != "":
+        profiles = exporter.get("profiles", {})
+        if profile not in profiles:
+            raise ValueError("Unknown export profile %s, available profiles: %s"%(profile, ", ".join(profiles)))
+
+        options.update(profiles[profile])
+
+    return options
+
+# Folder of the texture cache in the destination folder, used when the
+# "textures" export option does not set a "cache"
+TEXTURE_CACHE = ".blendyard_textures"
+
+# Returns the export options as sent to batch_export.py. The texture cache is
+# shared by every file exported to the destination, so an image used by
+# several files is stored once
+def BlenderOptions(options, destination):
+
+    textures = options.get("textures", {})
+    if textures.get("mode", "none") == "none" or len(textures.get("cache", "")) > 0:
+        return options
+
+    options = dict(options)
+    options["textures"] = dict(textures, cache=os.path.abspath(os.path.join(destination, TEXTURE_CACHE)))
+
+    return options
+
+# Passed to Blender with --python-expr before the .blend file when tracing
+# exports, see batch_export.py
+LOAD_START_EXPRESSION = "import os, time; os.environ['BLENDYARD_LOAD_START'] = repr(time.time())"
+
+# Reads and removes the --timings file written by batch_export.py
+def ReadTimings(timingsFileName):
+
+    try:
+        with open(timingsFileName, "r") as read_file:
+            return json.load(read_file)
+    except (OSError, ValueError):
+        return None
+    finally:
+        if os.path.exists(timingsFileName):
+            os.remove(timingsFileName)
+
+# Result of an export, InvokeBlenderExporter returns one of these
+EXPORT_OK = "ok"
+EXPORT_FAILED = "failed"
+EXPORT_SKIPPED = "skipped"
+EXPORT_CANCELLED = "cancelled"
+
+# Returns every .blend file found under the given folder, sorted so that
+# batch runs are reproducible. Blender's backup (.blend1) and temporary
+# save (@) files are ignored
+def FindBlendFiles(folder):
+
+    blendFiles = [filePath for filePath, statbuf in ScanBlendFiles(folder)]
+
+    blendFiles.sort()
+
+    return blendFiles
+
+# Walks the folder recursively and yields the path and os.stat() result of
+# each .blend file. os.scandir() returns the file information along with the
+# folder listing, so on Windows this needs no extra system call per file
+def ScanBlendFiles(folder):
+
+    return ScanFiles(folder, ".blend")
+
+# Same as ScanBlendFiles() for the files ending with the extension, or with
+# any of a tuple of extensions. With ignore_case the extensions are given in
+# lower case and match files such as Rock.FBX or Rock.Fbx
+def ScanFiles(folder, extensions, ignore_case=False):
+
+    if isinstance(extensions, str):
+        extensions = (extensions,)
+
+    folders = [folder]
+
+    while len(folders) > 0:
+        try:
+            entries = os.scandir(folders.pop())
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif (os.path.splitext(entry.name)[1].lower() in extensions if ignore_case else entry.name.endswith(extensions)) and entry.is_file():
+                        yield entry.path, entry.stat()
+                except OSError:
+                    # The file was removed while scanning
+                    continue
+
+# Written by batch_export.py next to the .fbx files of each collection when
+# the "split" export option is "collections", must match SPLIT_FINGERPRINTS
+SPLIT_FINGERPRINTS = ".blendyard_collections.json"
+
+# Returns the file every successful export of the target writes, the .fbx
+# file itself or, when each collection is exported to its own .fbx file in
+# a folder named after the target, the collection fingerprints in that folder
+def ExportedFile(targetFile, options):
+
+    if options.get("split") == "collections":
+        return os.path.join(os.path.splitext(targetFile)[0], SPLIT_FINGERPRINTS)
+
+    return targetFile
+
+# Returns the path of the .fbx file produced for the given source file, the
+# folder structure relative to the source path is replicated at the destination.
+# The importer uses ".blend" as the extension of the files it produces
+def TargetFileForSource(sourceFile, sourcePath, destination, extension=".fbx"):
+
+    relative_source_path = os.path.relpath(sourceFile, sourcePath)
+    target_file = os.path.join(destination, relative_source_path)
+
+    # potential cleanup, blender sometimes leaves these lying around
+    target_file = target_file.replace("@", "")
+
+    return os.path.splitext(target_file)[0] + extension
+
+# Returns whether the export that started at startTime wrote the file, or
+# found that the file already had the content it would have written, in
+# which case batch_export.py leaves it untouched and reports it unchanged
+def ExportWritten(exportedFile, startTime, response):
+
+    if not os.path.exists(exportedFile):
+        return False
+
+    if response != None and response.get("unchanged", False) == True:
+        return True
+
+    return os.path.getmtime(exportedFile) >= startTime - 1
+
+# Runs Blender in the background to export a single .blend file to .fbx
+# Returns EXPORT_OK when Blender exited cleanly and wrote the .fbx file,
+# EXPORT_SKIPPED when the manifest shows the .fbx file is up to date,
+# EXPORT_FAILED otherwise.
+#
+# Optional arguments:
+#   options         export options passed to batch_export.py, see the
+#                   "exporter" entry of settings.json
+#   manifest        an ExportManifest (see blendyard_manifest.py), files that
+#                   have not changed since their last export are skipped
+#   force           export even when the manifest shows the file is up to date
+#   capture_output  Blender's console output is only printed when the
+#                   export fails, useful when running many exports at once
+#   server          a BlenderExportServerPool (see blendyard_server.py), the
+#                   export is sent to an already running Blender instead of
+#                   starting a new one
+#   reload          Blender opens the .blend file a second time before
+#                   exporting, this is slower and only kept as a fallback
+#   trace           an ExportTrace (see blendyard_trace.py), the duration of
+#                   each phase of the export is recorded
+#   handle          an ExportHandle (see blendyard_process.py), lets another
+#                   thread cancel the export, which then returns
+#                   EXPORT_CANCELLED
+#   scheduler       an ExportScheduler (see blendyard_scheduler.py), the peak
+#                   memory Blender used is recorded for the file
 def InvokeBlenderExporter(**args):
 
     sourcePath = args["source_path"]
@@ -50,6 +243,15 @@ def InvokeBlenderExporter(**args):
     script = args["script"]
     destination = args["destination"]
     verbose = args["verbose"]
+    capture_output = args.get("capture_output", False)
+    server = args.get("server", None)
+    reload = args.get("reload", False)
+    options = args.get("options", {})
+    manifest = args.get("manifest", None)
+    force = args.get("force", False)
+    trace = args.get("trace", None)
+    handle = args.get("handle", None)
+    scheduler = args.get("scheduler", None)
     
     if verbose == True:
         print("-------------------------")
@@ -57,13 +259,26 @@ def InvokeBlenderExporter(**args):
         print(args)
         print("-------------------------")
     
-    relative_source_path = os.path.relpath(sourceFile, sourcePath)
-    target_file = os.path.join(destination, relative_source_path)
-
+    target_file = TargetFileForSource(sourceFile, sourcePath, destination)
     target_path = os.path.dirname(target_file)
+    exported_file = ExportedFile(target_file, options)
+    blenderOptions = BlenderOptions(options, destination)
 
-    # potential cleanup, blender sometimes leaves these lying around
-    target_file = target_file.replace("@", "")
+    fingerprint = None
+    if manifest != None:
+        try:
+            fingerprint = manifest.Fingerprint(sourceFile, exported_file)
+        except OSError as e:
+            print("Could not read %s: %s"%(sourceFile, e))
+            return EXPORT_FAILED
+
+        skipReason = manifest.SkipReason(sourceFile, exported_file, fingerprint)
+        if force == False and skipReason != None:
+            print("%s, skipping %s"%(skipReason, sourceFile))
+
+            # The new content hash saves hashing the file again next time
+            manifest.Record(sourceFile, exported_file, fingerprint)
+            return EXPORT_SKIPPED
 
     if not os.path.exists(target_path):
         if verbose == True:
@@ -82,58 +297,449 @@ def InvokeBlenderExporter(**args):
     print("->->->->->->->->->->->->->->->->->->->->->->->->->->->->->->")
     print("Exporting %s"%sourceFile)
 
+    startTime = time.time()
+    output = None
+    phases = {}
+    response = None
+
+    if handle != None:
+        handle.SetCurrent(sourceFile)
+
+    if server != None:
+        response = server.Export(sourceFile, target_file, blenderOptions, handle)
+        returncode = 0 if response != None and response["result"] == "ok" else 1
+
+        if response != None:
+            phases.update(response.get("startup", {}))
+    else:
+        scriptPath = os.path.join(os.getcwd(), script)
+
+        cmdLine = [
+        converter,
+        "-b",
+        sourceFile,
+        "--python-exit-code",
+        "1",
+        "--python",
+        scriptPath,
+        "--",
+        target_file
+        ]
+
+        if reload == True:
+            cmdLine.append("--reload")
+
+        if len(blenderOptions) > 0:
+            cmdLine.append("--options")
+            cmdLine.append(json.dumps(blenderOptions))
+
+        if trace != None:
+            # Blender runs its arguments in order, this runs before it loads
+            # the .blend file so batch_export.py can work out the load time
+            cmdLine[2:2] = ["--python-expr", LOAD_START_EXPRESSION]
+
+        # Also tells whether the .fbx file was left unchanged
+        timingsFile = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        timingsFile.close()
+        cmdLine.extend(["--timings", timingsFile.name])
+
+        # A cancelled export terminates Blender's whole process group
+        processGroup = blendyard_process.PROCESS_GROUP if handle != None else {}
+
+        spawnStartTime = time.time()
+
+        if capture_output == True:
+            process = subprocess.Popen(cmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors="replace", **processGroup)
+        else:
+            process = subprocess.Popen(cmdLine, **processGroup)
+
+        spawnEndTime = time.time()
+
+        if handle != None:
+            handle.Attach(process)
+
+        output = process.communicate()[0]
+        returncode = process.returncode
+
+        if handle != None:
+            handle.Detach()
+
+        response = ReadTimings(timingsFile.name)
+
+        if trace != None:
+            phases["spawn"] = spawnEndTime - spawnStartTime
+            if response != None and response.get("load_start", 0) > 0:
+                phases["boot"] = response["load_start"] - spawnEndTime
+
+    # Blender does not always report a failure through its exit code, make
+    # sure the .fbx file was actually written by this run
+    result = EXPORT_OK
+    if returncode != 0:
+        result = EXPORT_FAILED
+    elif not ExportWritten(exported_file, startTime, response):
+        result = EXPORT_FAILED
+
+    # An export cancelled after Blender wrote the .fbx file still succeeded
+    if result == EXPORT_FAILED and handle != None and handle.IsCancelled():
+        result = EXPORT_CANCELLED
+
+    if result == EXPORT_OK and manifest != None:
+        manifest.Record(sourceFile, exported_file, fingerprint)
+
+    if scheduler != None and response != None and response.get("peak_memory") != None:
+        scheduler.Record(sourceFile, response["peak_memory"])
+
+    if trace != None:
+        phases["total"] = time.time() - startTime
+        trace.Write(sourceFile, target_file, result, phases, response)
+
+    if result == EXPORT_OK:
+        print("%s EXPORT COMPLETE (%.2fs)"%(os.path.join(target_path, sourceFile), time.time() - startTime))
+    elif result == EXPORT_CANCELLED:
+        print("%s EXPORT CANCELLED (%.2fs)"%(sourceFile, time.time() - startTime))
+    else:
+        if output:
+            print(output)
+        print("%s EXPORT FAILED (exit code %d)"%(sourceFile, returncode))
+
+    print("->->->->->->->->->->->->->->->->->->->->->->->->->->->->->->\n\n")
+
+    return result
+
+
+# Exports several .blend files with a single Blender process, saving the
+# startup time of one process per file. Takes the same arguments as
+# InvokeBlenderExporter except for source_files, the list of files to export.
+#
+# Returns a dictionary with the result and duration of each file. If Blender
+# crashes, the file it was exporting is marked as failed and the files after
+# it are exported by a new Blender process. Cancelling the handle only
+# cancels the file being exported, the files after it are exported as well.
+def InvokeBlenderBatchExporter(**args):
+
+    sourcePath = args["source_path"]
+    sourceFiles = args["source_files"]
+    converter = args["converter"]
+    script = args["script"]
+    destination = args["destination"]
+    verbose = args["verbose"]
+    capture_output = args.get("capture_output", False)
+    server = args.get("server", None)
+    options = args.get("options", {})
+    manifest = args.get("manifest", None)
+    force = args.get("force", False)
+    trace = args.get("trace", None)
+    handle = args.get("handle", None)
+    scheduler = args.get("scheduler", None)
+
+    results = {}
+
+    # The export server already keeps Blender running between files
+    if server != None:
+        exporterArgs = dict(args)
+        del exporterArgs["source_files"]
+
+        for sourceFile in sourceFiles:
+            startTime = time.time()
+            result = InvokeBlenderExporter(source_file=sourceFile, **exporterArgs)
+            results[sourceFile] = { "result": result, "duration": time.time() - startTime }
+
+            if result == EXPORT_CANCELLED:
+                handle.Reset()
+
+        return results
+
+    jobs = []
+
+    for sourceFile in sourceFiles:
+        target_file = TargetFileForSource(sourceFile, sourcePath, destination)
+        exported_file = ExportedFile(target_file, options)
+
+        fingerprint = None
+        if manifest != None:
+            try:
+                fingerprint = manifest.Fingerprint(sourceFile, exported_file)
+            except OSError as e:
+                print("Could not read %s: %s"%(sourceFile, e))
+                results[sourceFile] = { "result": EXPORT_FAILED, "duration": 0 }
+                continue
+
+            skipReason = manifest.SkipReason(sourceFile, exported_file, fingerprint)
+            if force == False and skipReason != None:
+                print("%s, skipping %s"%(skipReason, sourceFile))
+                manifest.Record(sourceFile, exported_file, fingerprint)
+                results[sourceFile] = { "result": EXPORT_SKIPPED, "duration": 0 }
+                continue
+
+        pathlib.Path(os.path.dirname(target_file)).mkdir(parents=True, exist_ok=True)
+
+        jobs.append({ "source": sourceFile, "target": target_file, "exported": exported_file, "fingerprint": fingerprint })
+
     scriptPath = os.path.join(os.getcwd(), script)
 
-    cmdLine = [
-    converter,
-    sourceFile,
-    "-b",
-    "--python",
-    scriptPath,
-    "--",
-    target_file
-    ]
+    while len(jobs) > 0:
+        print("->->->->->->->->->->->->->->->->->->->->->->->->->->->->->->")
+        print("Exporting %d files"%len(jobs))
 
-    subprocess.call(cmdLine)
+        if verbose == True:
+            for job in jobs:
+                print("%s -> %s"%(job["source"], job["target"]))
 
-    print("%s EXPORT COMPLETE"%os.path.join(target_path, sourceFile))
-    print("->->->->->->->->->->->->->->->->->->->->->->->->->->->->->->\n\n")
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as jobs_file:
+            json.dump([{ "source": os.path.abspath(job["source"]), "target": os.path.abspath(job["target"]) } for job in jobs], jobs_file)
 
+        cmdLine = [
+        converter,
+        "-b",
+        "--python-exit-code",
+        "1",
+        "--python",
+        scriptPath,
+        "--",
+        "--batch",
+        jobs_file.name,
+        "--options",
+        json.dumps(BlenderOptions(options, destination))
+        ]
+
+        startTime = time.time()
+        responses = {}
+        output = collections.deque(maxlen=blendyard_server.OUTPUT_HISTORY)
 
-def InvokeBlenderImporter(file, sub_folder, relativePath, target_folder, converter_bin, blender_import_script):
+        processGroup = {}
+        if handle != None:
+            # batch_export.py exports the files in order
+            handle.SetCurrent(jobs[0]["source"])
+            processGroup = blendyard_process.PROCESS_GROUP
 
-    # Generate the absolute path using the target_folder
-    absolute_path = os.path.dirname("%s\\%s"%(target_folder, file.replace(".\\", "")))
-    target_path = os.path.dirname(absolute_path)
+        try:
+            process = subprocess.Popen(cmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors="replace", **processGroup)
+            spawnEndTime = time.time()
 
-    print("MAKING FOLDER: %s"%target_path)
-    if not os.path.exists(target_path):
-        pathlib.Path(target_path).mkdir(parents=True, exist_ok=True)
+            if handle != None:
+                handle.Attach(process)
+
+            for line in process.stdout:
+                line = line.rstrip("\n")
+
+                if line.startswith(blendyard_server.SERVER_RESULT):
+                    response = json.loads(line[len(blendyard_server.SERVER_RESULT):])
+                    responses[os.path.normcase(response["source"])] = response
+
+                    if handle != None and len(responses) < len(jobs):
+                        handle.SetCurrent(jobs[len(responses)]["source"])
+                    continue
+
+                output.append(line)
+                if capture_output == False:
+                    print(line)
+
+            process.wait()
+        finally:
+            os.remove(jobs_file.name)
+
+            if handle != None:
+                handle.Detach()
+
+        remaining = []
+
+        # Starting Blender is recorded on the first file it exported
+        startup = { "spawn": spawnEndTime - startTime }
+
+        for job in jobs:
+            response = responses.get(os.path.normcase(os.path.abspath(job["source"])))
+
+            if response == None:
+                remaining.append(job)
+                continue
+
+            result = EXPORT_OK
+            if response["result"] != "ok":
+                result = EXPORT_FAILED
+            elif not ExportWritten(job["exported"], startTime, response):
+                result = EXPORT_FAILED
+
+            if result == EXPORT_OK and manifest != None:
+                manifest.Record(job["source"], job["exported"], job["fingerprint"])
+
+            if scheduler != None and response.get("peak_memory") != None:
+                scheduler.Record(job["source"], response["peak_memory"])
+
+            if trace != None:
+                phases = { "total": response["duration"] }
+
+                if startup != None:
+                    startup["boot"] = response["script_start"] - spawnEndTime
+                    phases.update(startup)
+                    phases["total"] += startup["spawn"] + startup["boot"]
+                    startup = None
+
+                trace.Write(job["source"], job["target"], result, phases, response)
+
+            if result == EXPORT_OK:
+                print("%s EXPORT COMPLETE (%.2fs)"%(job["source"], response["duration"]))
+            else:
+                print("%s EXPORT FAILED"%job["source"])
+
+            results[job["source"]] = { "result": result, "duration": response["duration"] }
+
+        # Blender stopped before exporting every file, the first file without
+        # a result is the one it was working on
+        if len(remaining) > 0:
+            crashed = remaining.pop(0)
+
+            if handle != None and handle.IsCancelled():
+                print("%s EXPORT CANCELLED"%crashed["source"])
+                result = EXPORT_CANCELLED
+                handle.Reset()
+            else:
+                if capture_output == True:
+                    print("\n".join(output))
+
+                print("%s EXPORT FAILED (Blender exited with code %d)"%(crashed["source"], process.returncode))
+                result = EXPORT_FAILED
+
+            results[crashed["source"]] = { "result": result, "duration": 0 }
+
+            if trace != None:
+                trace.Write(crashed["source"], crashed["target"], result, {}, None)
+
+        print("->->->->->->->->->->->->->->->->->->->->->->->->->->->->->->\n\n")
 
-    print("-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<\n")
+        jobs = remaining
+
+    return results
 
-    absPath = os.path.join(os.getcwd(), sub_folder)
-    absPath = os.path.join(absPath, file)
-    absPath = absPath.replace(".\\", "")
-    
-    print("Importing: %s"%(absPath))
-
-    scriptPath = os.path.join(os.getcwd(), blender_import_script)
-
-    cmdLine = [
-    converter_bin,
-    "-b",
-    "--python",
-    scriptPath,
-    "--",
-    absolute_path,
-    absPath,
-    relativePath
-    ]
-
-    print(cmdLine)
-    subprocess.call(cmdLine)
-
-    print("Import and Save Blend Complete")
-    print("%s"%os.path.join(absolute_path, file))
-    print("-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<\n\n")
\ No newline at end of file
+# Imports .fbx files with a single Blender process and saves each one as a
+# .blend file, the folder structure relative to source_path is replicated at
+# the destination. Files whose .blend file is newer than the .fbx file are
+# skipped unless force is set.
+#
+# Arguments:
+#   source_path     the folder the .fbx files are relative to
+#   source_files    the .fbx files to import
+#   destination     the folder to save the .blend files into
+#   converter       path to the Blender executable
+#   script          path to batch_import.py, relative to the current folder
+#   verbose         displays the source and target of each file
+#   capture_output  Blender's console output is only printed when an
+#                   import fails
+#   force           import files even when their .blend file is newer
+#   options         options passed to Blender's FBX importer
+#
+# Returns a dictionary with the result and duration of each file. If Blender
+# crashes, the file it was importing is marked as failed and the files after
+# it are imported by a new Blender process.
+def InvokeBlenderImporter(**args):
+
+    sourcePath = args["source_path"]
+    sourceFiles = args["source_files"]
+    destination = args["destination"]
+    converter = args["converter"]
+    script = args["script"]
+    verbose = args["verbose"]
+    capture_output = args.get("capture_output", False)
+    force = args.get("force", False)
+    options = args.get("options", {})
+
+    results = {}
+    jobs = []
+
+    for sourceFile in sourceFiles:
+        target_file = TargetFileForSource(sourceFile, sourcePath, destination, ".blend")
+
+        if force == False and os.path.exists(target_file) and os.path.getmtime(target_file) >= os.path.getmtime(sourceFile):
+            print("Up to date, skipping %s"%sourceFile)
+            results[sourceFile] = { "result": EXPORT_SKIPPED, "duration": 0 }
+            continue
+
+        pathlib.Path(os.path.dirname(target_file)).mkdir(parents=True, exist_ok=True)
+
+        jobs.append({ "source": sourceFile, "target": target_file })
+
+    scriptPath = os.path.join(os.getcwd(), script)
+
+    while len(jobs) > 0:
+        print("-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<")
+        print("Importing %d files"%len(jobs))
+
+        if verbose == True:
+            for job in jobs:
+                print("%s -> %s"%(job["source"], job["target"]))
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as jobs_file:
+            json.dump([{ "source": os.path.abspath(job["source"]), "target": os.path.abspath(job["target"]) } for job in jobs], jobs_file)
+
+        cmdLine = [
+        converter,
+        "-b",
+        "--factory-startup",
+        "--python-exit-code",
+        "1",
+        "--python",
+        scriptPath,
+        "--",
+        "--batch",
+        jobs_file.name,
+        "--options",
+        json.dumps(options)
+        ]
+
+        responses = {}
+        output = collections.deque(maxlen=blendyard_server.OUTPUT_HISTORY)
+
+        try:
+            process = subprocess.Popen(cmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors="replace")
+
+            for line in process.stdout:
+                line = line.rstrip("\n")
+
+                if line.startswith(blendyard_server.SERVER_RESULT):
+                    response = json.loads(line[len(blendyard_server.SERVER_RESULT):])
+                    responses[os.path.normcase(response["source"])] = response
+                    continue
+
+                output.append(line)
+                if capture_output == False:
+                    print(line)
+
+            process.wait()
+        finally:
+            os.remove(jobs_file.name)
+
+        remaining = []
+
+        for job in jobs:
+            response = responses.get(os.path.normcase(os.path.abspath(job["source"])))
+
+            if response == None:
+                remaining.append(job)
+                continue
+
+            result = EXPORT_OK if response["result"] == "ok" and os.path.exists(job["target"]) else EXPORT_FAILED
+
+            if result == EXPORT_OK:
+                print("%s IMPORT COMPLETE (%.2fs)"%(job["target"], response["duration"]))
+            else:
+                if capture_output == True:
+                    print(response.get("error", ""))
+                print("%s IMPORT FAILED"%job["source"])
+
+            results[job["source"]] = { "result": result, "duration": response["duration"] }
+
+        # Blender stopped before importing every file, the first file without
+        # a result is the one it was working on
+        if len(remaining) > 0:
+            crashed = remaining.pop(0)
+
+            if capture_output == True:
+                print("\n".join(output))
+
+            print("%s IMPORT FAILED (Blender exited with code %d)"%(crashed["source"], process.returncode))
+            results[crashed["source"]] = { "result": EXPORT_FAILED, "duration": 0 }
+
+        print("-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<-<\n\n")
+
+        jobs = remaining
+
+    return results
@@ -29,7 +29,8 @@ SOFTWARE.
 # You may provide a path to watch as the first parameter of the script.
 # Example:
 #   python watchdog\\blendyard_watchdog "D:\MyProject"
-# If no path is provided, the watchdog will run on the script's current folder
+# If no path is provided, the watchdog will watch the watched_folder from
+# settings.json
 #
 # This script depends on batch_export.py in order to invoke Blender's export
 # process.
@@ -44,24 +45,37 @@ import time
 import pathlib
 import subprocess
 import argparse
+import threading
 
 from watchdog.observers import Observer
-from watchdog.events import PatternMatchingEventHandler
+from watchdog.events import PatternMatchingEventHandler, FileCreatedEvent, FileModifiedEvent, FileDeletedEvent
 
 sys.path.append(os.path.abspath('src/blender/utilities'))
 
 import blendyard_utilities
+import blendyard_server
+import blendyard_manifest
+import blendyard_dependencies
+import blendyard_debounce
+import blendyard_queue
+import blendyard_trace
+import blendyard_process
+import blendyard_poller
+import blendyard_scheduler
+import blendyard_telemetry
 
 parser = argparse.ArgumentParser(description='Recursively watch a folder with .blend files in order to convert them to .fbx if they are modified')
 parser.add_argument('--settings', help='The .json file that holds the configuration for exporting Blender files to FBX')
+parser.add_argument('folder', help='The folder to watch, same as --watchfolder', nargs='?')
 parser.add_argument('--watchfolder', help='The folder to watch')
+parser.add_argument('--profile', help='name of the export profile to use from the exporter profiles in the settings')
 parser.add_argument('--destination', help='destination path for the produced .FBX files')
 parser.add_argument('--verbose', help='Displays additional information', action='store_true', default=False)
+parser.add_argument('--force', help='export files even if they have not changed since their last export', action='store_true', default=False)
 
 args = parser.parse_args()
 
-
-previousTimeStamp = 0
+forceExport = args.force
 
 settings = {}
 if args.settings == None:
@@ -76,15 +90,109 @@ if settings["watchdog"]["verbose"] != 0:
 # any changes in files will prompt an export
 source_folder = settings["watchdog"]["watched_folder"]
 
+if args.watchfolder != None:
+    source_folder = args.watchfolder
+elif args.folder != None:
+    source_folder = args.folder
+
 # Target folder is the first level folder to export into, this exporter will
 # use the relative path for files being watched and replicate the folder
 # structure at the destination
 target_folder = settings["models"]["target_folder"]
 
+if args.destination != None:
+    target_folder = args.destination
+
 # Path to the Blender executable
 converter_bin = settings["general"]["blender_exe"]
 
-running_tasks = []
+exportScript = os.path.join("src/blender/exporters", "batch_export.py")
+
+# Keeps Blender running between exports when enabled in the settings
+exportServer = blendyard_server.CreateExportServer(settings, exportScript, settings["watchdog"]["verbose"] > 0)
+
+# Makes Blender load each .blend file twice before exporting (legacy behavior)
+reloadFile = settings.get("exporter", {}).get("reload_file", 0) != 0
+
+exportOptions = blendyard_utilities.ExportOptions(settings, args.profile)
+
+# Knows which files link each library, when a library is saved the files
+# that link it are exported as well
+dependencyIndex = blendyard_dependencies.DependencyIndex(target_folder, settings["watchdog"]["verbose"] > 0)
+
+# Files whose content, libraries and export options did not change since
+# their last export are skipped, unless --force is used
+exportManifest = blendyard_manifest.ExportManifest(target_folder, exportScript, exportOptions, dependencyIndex)
+
+# Records the duration of each export phase when trace_file is set
+exportTrace = blendyard_trace.CreateExportTrace(settings)
+
+# Up to export_workers exports run at the same time (one per core when 0),
+# as long as the memory they are expected to need fits in memory_budget_mb
+exportWorkers = settings["watchdog"].get("export_workers", 2)
+if exportWorkers <= 0:
+    exportWorkers = os.cpu_count()
+
+exportScheduler = blendyard_scheduler.CreateExportScheduler(settings, target_folder, exportWorkers, settings["watchdog"]["verbose"] > 0)
+
+# The handle of the export running for each file, and how long Blender took to
+# export each file last time, used to tell how far along a running export is
+runningExports = {}
+exportDurations = {}
+runningLock = threading.Lock()
+
+# Registers the handle of an export while it runs
+def StartTracking(filePaths, handle):
+
+    with runningLock:
+        for filePath in filePaths:
+            runningExports[os.path.abspath(filePath)] = handle
+
+def StopTracking(filePaths, durations):
+
+    with runningLock:
+        for filePath in filePaths:
+            del runningExports[os.path.abspath(filePath)]
+
+        for filePath, duration in durations.items():
+            exportDurations[os.path.abspath(filePath)] = duration
+
+# Exports that were cancelled go back through the debouncer, which already
+# holds the save that cancelled them
+def RescheduleCancelled(filePaths):
+
+    for filePath in filePaths:
+        debouncer.Touch(filePath)
+
+# Called when a file changes, if Blender is exporting it the export is out of
+# date and is cancelled, unless it is at least supersede_finish_percent done
+def SupersedeExport(filePath):
+
+    if settings["watchdog"].get("supersede", 1) == 0:
+        return
+
+    key = os.path.abspath(filePath)
+
+    with runningLock:
+        handle = runningExports.get(key)
+        expectedDuration = exportDurations.get(key)
+
+    if handle == None:
+        return
+
+    # A batch export may not have reached this file yet
+    current, elapsed = handle.Current()
+    if current == None or os.path.abspath(current) != key:
+        return
+
+    finishPercent = settings["watchdog"].get("supersede_finish_percent", 90)
+    if expectedDuration != None and expectedDuration > 0 and 100.0 * elapsed / expectedDuration >= finishPercent:
+        if settings["watchdog"]["verbose"] != 0:
+            print("%s changed, letting its export finish (%d%% done)"%(filePath, min(100, 100.0 * elapsed / expectedDuration)))
+        return
+
+    print("%s changed, cancelling its export"%filePath)
+    handle.Cancel()
 
 def PrintHeader():
     global target_folder
@@ -102,34 +210,170 @@ def PrintHeader():
     "'`._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'   `._.'  \n\n")
 
 # This invokes batch_export.py in order to perform the Blender to FBX export procedure
+# It runs on one of the export queue's workers
 def RunFBXExport(filePath):
     
     global converter_bin
     global source_folder
     global target_folder
-    global running_tasks
 
     if settings["watchdog"]["verbose"] > 0:
         print("Running FBX Export: %s"%filePath)
 
-    if filePath in running_tasks:
-        print ("SKIPPING")
-        return
+    handle = blendyard_process.ExportHandle()
+    StartTracking([filePath], handle)
+    durations = {}
+
+    try:
+        result = blendyard_utilities.InvokeBlenderExporter(
+                                                converter=converter_bin,
+                                                source_path=source_folder,
+                                                source_file=filePath,
+                                                destination=target_folder,
+                                                script=exportScript,
+                                                verbose=False,
+                                                server=exportServer,
+                                                reload=reloadFile,
+                                                options=exportOptions,
+                                                manifest=exportManifest,
+                                                force=forceExport,
+                                                trace=exportTrace,
+                                                handle=handle,
+                                                scheduler=exportScheduler
+                                                )
+
+        if result == blendyard_utilities.EXPORT_OK:
+            durations[filePath] = handle.Current()[1]
+    finally:
+        StopTracking([filePath], durations)
+
+    if exportTelemetry != None:
+        exportTelemetry.RecordExport(filePath, result, durations.get(filePath))
+
+    if result == blendyard_utilities.EXPORT_CANCELLED:
+        RescheduleCancelled([filePath])
+
+# Exports several files with a single Blender process
+def RunFBXBatchExport(filePaths):
 
-    running_tasks.append(filePath)
+    if settings["watchdog"]["verbose"] > 0:
+        print("Running FBX Export of %d files"%len(filePaths))
+
+    handle = blendyard_process.ExportHandle()
+    StartTracking(filePaths, handle)
+    results = {}
 
-    blendyard_utilities.InvokeBlenderExporter(
-                                            converter=converter_bin,
-                                            source_path=source_folder,
-                                            source_file=filePath,
-                                            destination=target_folder,
-                                            script=os.path.join("src/blender/exporters", "batch_export.py"),
-                                            verbose=False
+    try:
+        results = blendyard_utilities.InvokeBlenderBatchExporter(
+                                                converter=converter_bin,
+                                                source_path=source_folder,
+                                                source_files=filePaths,
+                                                destination=target_folder,
+                                                script=exportScript,
+                                                verbose=False,
+                                                server=exportServer,
+                                                options=exportOptions,
+                                                manifest=exportManifest,
+                                                force=forceExport,
+                                                trace=exportTrace,
+                                                handle=handle,
+                                                scheduler=exportScheduler
+                                                )
+    finally:
+        StopTracking(filePaths, { filePath: result["duration"] for filePath, result in results.items() if result["result"] == blendyard_utilities.EXPORT_OK })
+
+    if exportTelemetry != None:
+        for filePath, result in results.items():
+            exportTelemetry.RecordExport(filePath, result["result"], result.get("duration"))
+
+    RescheduleCancelled([filePath for filePath, result in results.items() if result["result"] == blendyard_utilities.EXPORT_CANCELLED])
+
+# Runs on one of the export queue's workers, receives up to export_batch_size
+# files at once
+def RunFBXExports(filePaths):
+
+    # The files may have been deleted or renamed while they were waiting
+    filePaths = [filePath for filePath in filePaths if os.path.exists(filePath)]
+
+    if len(filePaths) == 1:
+        RunFBXExport(filePaths[0])
+    elif len(filePaths) > 1:
+        RunFBXBatchExport(filePaths)
+
+    exportManifest.Save()
+    exportScheduler.Save()
+    dependencyIndex.Save()
+
+    if exportQueue.IsIdle():
+        PrintHeader()
+
+# Exports run on export_workers threads so the watchdog keeps handling
+# events while Blender is running, the most recently saved file goes first.
+# When many files are waiting, each worker exports up to export_batch_size
+# of them with a single Blender process
+exportQueue = blendyard_queue.ExportQueue(  workers=exportWorkers,
+                                            export=RunFBXExports,
+                                            batch_size=settings["watchdog"].get("export_batch_size", 8),
+                                            scheduler=exportScheduler
                                             )
 
-    running_tasks.remove(filePath)
+# Receives the files from the debounce scheduler once they stopped changing,
+# each file appears only once per batch
+def ExportBatch(filePaths):
 
-    PrintHeader()
+    if settings["watchdog"]["verbose"] > 0 and len(filePaths) > 1:
+        print("Queuing a batch of %d files"%len(filePaths))
+
+    # The saved files may link new libraries
+    for filePath in filePaths:
+        dependencyIndex.Update(filePath)
+
+    exportQueue.PutMany(filePaths)
+
+# Holds the events of each file until it has been quiet for debounce_window
+# seconds, bursts of changes are grouped into one batch
+debouncer = blendyard_debounce.DebounceScheduler(   window=settings["watchdog"].get("debounce_window", 1.0),
+                                                    max_delay=settings["watchdog"].get("burst_max_delay", 10.0),
+                                                    burst_size=settings["watchdog"].get("burst_size", 10),
+                                                    callback=ExportBatch
+                                                    )
+
+# Serves the queue depth, export results and latencies over HTTP when
+# telemetry_port is set
+exportTelemetry = blendyard_telemetry.CreateWatchdogTelemetry(  settings,
+                                                                queue=exportQueue,
+                                                                debouncer=debouncer,
+                                                                scheduler=exportScheduler,
+                                                                workers=exportWorkers
+                                                                )
+
+# Walks the watched folder once and queues the files that changed while the
+# watchdog was not running. The export manifest and the dependency index are
+# kept in the target folder, so only files that changed since are read
+# Returns the listing of the folder so the polling observer can start from it
+def ReconcileFolder():
+
+    scanStartTime = time.time()
+
+    entries = list(blendyard_utilities.ScanBlendFiles(source_folder))
+    filesRead = dependencyIndex.Scan(source_folder, entries)
+    dependencyIndex.Save()
+
+    staleFiles = []
+    for filePath, statbuf in entries:
+        target_file = blendyard_utilities.TargetFileForSource(filePath, source_folder, target_folder)
+        exported_file = blendyard_utilities.ExportedFile(target_file, exportOptions)
+
+        if forceExport == True or exportManifest.IsStale(filePath, exported_file, statbuf):
+            staleFiles.append(filePath)
+
+    if settings["watchdog"]["verbose"] > 0:
+        print("Scanned %d files in %.2f seconds, read the libraries of %d files, %d files to export"%(len(entries), time.time() - scanStartTime, filesRead, len(staleFiles)))
+
+    if len(staleFiles) > 0:
+        exportQueue.PutMany(staleFiles)
+
+    return entries
 
 # When the watchdog detects a change (new or modified) blender file
 # it will invoke the process function of this handler
@@ -151,36 +395,36 @@ class ChangeHandler(PatternMatchingEventHandler):
         if event.is_directory is True:
             return
 
-        if str.endswith(event.src_path, "@"):
+        filePath = event.src_path
+
+        # Blender saves into a temporary file@ then renames it, the
+        # renamed file is the one to export
+        if event.event_type == 'moved':
+            filePath = event.dest_path
+
+        if str.endswith(filePath, "@") or not str.endswith(filePath, ".blend"):
             return
 
         if settings["watchdog"]["verbose"] != 0:
             print("EVENT %s"%str(event))
 
-        # A valid change has been detected in a Blender file, export it as FBX
-        # if event.event_type == 'moved':
-        #     if not str.endswith(event.dest_path, "blend"):
-        #         if settings["watchdog"]["verbose"] != 0:
-        #             print("Not running")
-        #         return
-
+        # A valid change has been detected in a Blender file, it will be exported
+        # as FBX once it stops changing. A single save fires several events, the
+        # debouncer makes sure they only produce one export
         if event.event_type == 'modified' or event.event_type == 'created' or event.event_type == 'moved':
-            RunFBXExport(event.src_path)
+            SupersedeExport(filePath)
+            debouncer.Touch(filePath)
 
-    # A Blender file has been modified
-    def on_modified(self, event):
-        global previousTimeStamp
+            # Files linking this one are exported again along with it
+            for dependent in dependencyIndex.Dependents(filePath):
+                if settings["watchdog"]["verbose"] != 0:
+                    print("%s links %s"%(dependent, filePath))
 
-        statbuf = os.stat(event.src_path)
-        timeStamp = statbuf.st_mtime
+                debouncer.Touch(dependent)
 
-        # The watchdog sometimes invokes two on_modified handler so this will gate it to make
-        # sure only one is processed
-        timeDelta = timeStamp - previousTimeStamp
-        
-        if (timeDelta) > settings["watchdog"]["delta_throttle"]:
-            previousTimeStamp = timeStamp
-            self.process(event)
+    # A Blender file has been modified
+    def on_modified(self, event):
+        self.process(event)
 
     # A Blender file has been created
     def on_created(self, event):
@@ -189,25 +433,81 @@ class ChangeHandler(PatternMatchingEventHandler):
     def on_moved(self, event):
         self.process(event)
 
+# Used instead of watchdog's Observer when the watchdog observer setting is
+# "polling", for folders on network shares or in containers that don't
+# deliver file system events. The changes found by polling are handed to the
+# ChangeHandler as watchdog events
+class PollingObserver:
+
+    EVENTS = {
+        blendyard_poller.CREATED: FileCreatedEvent,
+        blendyard_poller.MODIFIED: FileModifiedEvent,
+        blendyard_poller.DELETED: FileDeletedEvent
+    }
+
+    def __init__(self, handler, folder):
+        self.handler = handler
+        self.poller = blendyard_poller.BlendFilePoller( folder=folder,
+                                                        callback=self.Dispatch,
+                                                        min_interval=settings["watchdog"].get("poll_interval_min", 1.0),
+                                                        max_interval=settings["watchdog"].get("poll_interval_max", 30.0),
+                                                        cpu_percent=settings["watchdog"].get("poll_cpu_percent", 1.0)
+                                                        )
+
+    def Dispatch(self, eventType, filePath):
+        self.handler.dispatch(self.EVENTS[eventType](filePath))
+
+    # entries are the .blend files of the folder from the startup scan,
+    # changes made after it are reported by the first poll
+    def start(self, entries=None):
+        self.poller.Start(entries)
+
+        if settings["watchdog"]["verbose"] > 0:
+            print("Polling %d .blend files"%self.poller.FileCount())
+
+    def stop(self):
+        self.poller.Stop()
+
+    def join(self):
+        pass
+
 if __name__ == '__main__':
 
     PrintHeader()
-   
-    # You may pass the path to watch, if no path is provided it will watch
-    # the current folder
-    args = sys.argv[1:]
-    override_source_folder = args[0] if args else '.'
-    if override_source_folder != ".":
-        source_folder = override_source_folder
-    else:
-        source_folder = settings["watchdog"]["watched_folder"]
 
     if settings["watchdog"]["verbose"] > 0:
         print("Watching folder: %s"%source_folder)
 
-    observer = Observer()
-    observer.schedule(ChangeHandler(), source_folder, recursive=True)
-    observer.start()
+    exportQueue.Start()
+
+    if exportTelemetry != None:
+        exportTelemetry.Start()
+        print("Telemetry available at http://%s:%d/metrics"%(exportTelemetry.address, exportTelemetry.port))
+
+    # Changes made during the startup scan are held by the debouncer until
+    # it starts, so the files found by the scan are queued first
+    polling = settings["watchdog"].get("observer", "native") == "polling"
+
+    if polling == True:
+        observer = PollingObserver(ChangeHandler(), source_folder)
+    else:
+        observer = Observer()
+        observer.schedule(ChangeHandler(), source_folder, recursive=True)
+        observer.start()
+
+    if settings["watchdog"].get("startup_scan", 1) != 0:
+        entries = ReconcileFolder()
+    else:
+        entries = list(blendyard_utilities.ScanBlendFiles(source_folder))
+        dependencyIndex.Scan(source_folder, entries)
+        dependencyIndex.Save()
+
+    # The polling observer starts from the listing of the startup scan
+    # instead of scanning the folder a second time
+    if polling == True:
+        observer.start(entries)
+
+    debouncer.Start()
 
     try:
         while True:
@@ -215,4 +515,13 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         observer.stop()
 
-    observer.join()
\ No newline at end of file
+    observer.join()
+
+    debouncer.Stop()
+    exportQueue.Stop()
+
+    if exportTelemetry != None:
+        exportTelemetry.Stop()
+
+    if exportServer != None:
+        exportServer.Stop()